@@ -0,0 +1,114 @@
+##################################################
+# bench_startup.py                               #
+#                                                #
+# Benchmark of the startup time of the compiler: #
+# building the parser and running uc.py.         #
+#                                                #
+# Authors: Luiz Cartolano && Erico Faustino      #
+##################################################
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# the inputs and the compiler are found from the package,
+# so the benchmark runs from any directory
+package_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def best_of(runs, func):
+    """
+        Runs func runs times and returns the best time, in ms.
+
+        :param runs: int
+        :param func: function
+        :return: float
+    """
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return 1000 * best
+
+
+def cold_time(code):
+    """
+        Runs the code in a new python process and returns the time
+        (in ms) it prints, so nothing is cached by the imports.
+
+        :param code: str
+        :return: float
+    """
+    return float(subprocess.check_output([sys.executable, '-c', code], cwd=package_dir))
+
+
+def bench_parser(runs, filename):
+    """
+        Time to build the parser, in a new process, with the tables
+        checked against the grammar (as before) and loaded from the
+        cache, and to parse a file with the warm parser shared by
+        the compiles.
+
+        :param runs: int
+        :param filename: str
+        :return: None
+    """
+    from uc_parser import get_parser
+
+    build = "import time, uc_parser\n" \
+            "start = time.perf_counter()\n" \
+            "uc_parser.UCParser(cached_tables=%s)\n" \
+            "print(1000 * (time.perf_counter() - start))"
+    for cached, name in ((False, "checked"), (True, "cached")):
+        best = min(cold_time(build % cached) for _ in range(runs))
+        print("build parser (%s tables)  %8.2f ms" % (name, best))
+
+    with open(filename) as source:
+        code = source.read()
+    parser = get_parser()
+    print("parse with the warm parser     %8.2f ms" % best_of(runs, lambda: parser.parse(code, '', False)))
+
+
+def bench_cold(runs, filename):
+    """
+        Time of a new process that compiles the file, without running
+        it, with the flags of each path of the driver, and the heavy
+        backends (llvmlite & graphviz) that the path has imported.
+
+        :param runs: int
+        :param filename: str
+        :return: None
+    """
+    start = "import runpy, sys, time\n" \
+            "sys.argv = ['uc.py', %r, '-s', '-n'] + %r\n" \
+            "start = time.perf_counter()\n" \
+            "try:\n" \
+            "    runpy.run_path(%r, run_name='__main__')\n" \
+            "except (SystemExit, Exception):\n" \
+            "    # only the startup is timed, a failure of the backend doesn't matter\n" \
+            "    pass\n" \
+            "print(1000 * (time.perf_counter() - start), file=sys.__stderr__)\n" \
+            "print(' '.join(m for m in ('llvmlite', 'graphviz') if m in sys.modules), file=sys.__stderr__)"
+    for flags in ([], ['-o'], ['-l']):
+        code = start % (filename, flags, os.path.join(package_dir, 'uc.py'))
+        best = float('inf')
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, '-c', code], cwd=package_dir,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            lines = result.stderr.decode().splitlines()
+            best = min(best, float(lines[-2]))
+        print("cold start of 'uc.py -n %-3s'   %8.2f ms  (imports: %s)" %
+              (' '.join(flags), best, lines[-1] or 'no backend'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filename", nargs='?', default=os.path.join(package_dir, 'tests', 'cases-proj3', 't1.uc'))
+    parser.add_argument("-r", "--runs", type=int, default=10, help="number of runs of each benchmark")
+    args = parser.parse_args()
+    args.filename = os.path.abspath(args.filename)
+
+    bench_parser(args.runs, args.filename)
+    bench_cold(args.runs, args.filename)
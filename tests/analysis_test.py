@@ -0,0 +1,316 @@
+# imports
+import io
+import unittest
+from types import SimpleNamespace
+from uc_parser import UCParser
+from uc_sema import Visitor
+from uc_codegen import GenerateCode
+from uc_blocks_control import ControlBlocks
+from uc_analysis import BitVectorSolver, DataFlow, intersection
+from uc_interpreter import Interpreter
+from uc_ssa import to_ssa, from_ssa
+
+
+def make_blocks(edges):
+    # blocks with only the labels and the edges of the cfg
+    blocks = {label: SimpleNamespace(label=label, predecessors=[], successors=[]) for label in edges}
+    for label, successors in edges.items():
+        for successor in successors:
+            blocks[label].successors.append(blocks[successor])
+            blocks[successor].predecessors.append(blocks[label])
+    return list(blocks.values())
+
+
+def loop_code(code):
+    # the instructions of each loop, from its header to the jump back
+    labels = {}
+    loops = []
+    for pos, inst in enumerate(code):
+        if len(inst) == 1:
+            labels['%' + inst[0]] = pos
+        elif inst[0] == 'jump' and inst[1] in labels:
+            loops.append(code[labels[inst[1]]:pos + 1])
+    return loops
+
+
+class ucAnalysisTestSuite(unittest.TestCase):
+    """ Runs the passes of the optimizer, checks that they were
+        applied and that the program prints the same output. """
+
+
+    def setUp(self):
+        """ Executed before every test case """
+        self.parser = UCParser()
+
+
+    def generate_blocks(self, source):
+        ast = self.parser.parse(source, '', False)
+        Visitor().visit(ast)
+        gen = GenerateCode()
+        gen.visit(ast)
+        blocks = ControlBlocks(ir_list=gen.code)
+        blocks.create_basic_blocks()
+        return gen.code, blocks
+
+
+    def run_code(self, code, input_data=None):
+        output = io.StringIO()
+        exit_code = Interpreter(input_data=input_data, stdout=output).run(code)
+        return exit_code, output.getvalue()
+
+
+    def optimize(self, source, input_data=None, inline_budget=0):
+        # the stats of main, after checking the output of the optimized code
+        code, blocks = self.generate_blocks(source)
+        dataflow = DataFlow(blocks, inline_budget=inline_budget)
+        dataflow.optimize_code()
+        self.assertEqual(self.run_code(dataflow.code, input_data), self.run_code(code, input_data))
+        return dataflow.stats['main'], [inst for inst in dataflow.code]
+
+
+    def check_reduced(self, code):
+        # no multiplication is left in the loops, and the loop test
+        # compares the reduced value with a * bound + b (computed
+        # before the loop) instead of the counter with the bound
+        loops = loop_code(code)
+        products = {inst[3] for inst in code if inst[0] in ('mul_int', 'add_int')
+                    and not any(inst in loop for loop in loops)}
+        for loop in loops:
+            self.assertFalse([inst for inst in loop if inst[0] == 'mul_int'])
+            tests = [inst for inst in loop if inst[0] == 'lt_int']
+            self.assertEqual(len(tests), 1)
+            self.assertIn(tests[0][2], products)
+
+
+    def test_bit_vector_solver(self):
+        # a loop: entry -> head <-> body, head -> exit
+        blocks = make_blocks({'entry': ['head'], 'head': ['body', 'exit'], 'body': ['head'], 'exit': []})
+        # reaching definitions: entry defines d0, the body d1 (both of the same var)
+        gen = [0b01, 0, 0b10, 0]
+        kill = [0b10, 0, 0b01, 0]
+        ins, outs = BitVectorSolver(forward=True).solve(blocks, gen, kill)
+        self.assertEqual(ins, [0, 0b11, 0b11, 0b11])
+        self.assertEqual(outs, [0b01, 0b11, 0b10, 0b11])
+        # liveness: the body uses the var defined by the entry
+        ins, outs = BitVectorSolver(forward=False).solve(blocks, [0, 0, 0b1, 0], [0b1, 0, 0, 0])
+        self.assertEqual(ins, [0, 0b1, 0b1, 0])
+        self.assertEqual(outs, [0b1, 0b1, 0b1, 0])
+        # a must problem starts from the top, but the entry gets the boundary:
+        # d0 reaches the loop on every path, d1 only through the body
+        solver = BitVectorSolver(forward=True, meet=intersection, top=0b11, boundary=0)
+        ins, outs = solver.solve(blocks, [0b01, 0, 0b10, 0], [0, 0, 0, 0])
+        self.assertEqual(ins, [0, 0b01, 0b01, 0b01])
+        self.assertEqual(outs, [0b01, 0b01, 0b11, 0b01])
+
+
+    def test_reverse_postorder(self):
+        # in reverse postorder each block of a chain is visited once
+        edges = {'b%d' % n: ['b%d' % (n + 1)] for n in range(9)}
+        edges['b9'] = []
+        blocks = make_blocks(edges)
+        solver = BitVectorSolver(forward=True)
+        solver.solve(list(reversed(blocks)), [1 << n for n in range(10)], [0] * 10,
+                     order=['b%d' % n for n in range(10)])
+        self.assertEqual(solver.iterations, 10)
+        solver.solve(list(reversed(blocks)), [1 << n for n in range(10)], [0] * 10)
+        self.assertGreater(solver.iterations, 10)
+
+
+    def test_unused_allocs(self):
+        source = """
+            int main() {
+                int unused, x;
+                float f;
+                x = 2;
+                print(x);
+                return 0;
+            }
+        """
+        _, code = self.optimize(source)
+        self.assertFalse([inst for inst in code if inst[0].startswith('alloc')])
+
+
+    def test_constant_propagation(self):
+        source = """
+            int main() {
+                int k, n, i, s;
+                k = 3;
+                n = k * 4;
+                if (n > 20) print("never");
+                s = 0;
+                for (i = 0; i < n; i++) s = s + k;
+                print(s);
+                return 0;
+            }
+        """
+        stats, code = self.optimize(source)
+        self.assertGreater(stats['sccp_folded'], 0)
+        self.assertEqual(stats['sccp_unreachable'], 1)
+        self.assertEqual([inst[0] for inst in code if inst[0].startswith('print')], ['print_int'])
+
+
+    def test_ssa_round_trip(self):
+        source = """
+            int main() {
+                int i, a, b;
+                a = 1;
+                b = 0;
+                for (i = 0; i < 10; i++) {
+                    if (i % 3 == 0) a = a + i;
+                    else b = b + a;
+                }
+                print(a, " ", b);
+                return 0;
+            }
+        """
+        code, blocks = self.generate_blocks(source)
+        ssa = to_ssa(blocks, 'main')
+        self.assertEqual(set(ssa.variables), {'%1', '%i', '%a', '%b'})
+        phis = [inst for block in blocks.functions['main'].values()
+                for inst in block.instructions if inst[0].startswith('phi')]
+        self.assertTrue(phis)
+        from_ssa(blocks, 'main')
+        dataflow = DataFlow(blocks)
+        dataflow.generate_opt_code()
+        self.assertEqual(self.run_code(dataflow.code), self.run_code(code))
+
+
+    def test_promote_variables(self):
+        source = """
+            int main() {
+                int i, s, v[4];
+                s = 0;
+                for (i = 0; i < 4; i++) {
+                    v[i] = i;
+                    s = s + v[i];
+                }
+                print(s);
+                return 0;
+            }
+        """
+        stats, code = self.optimize(source)
+        # i, s and the var of the return value
+        self.assertEqual(stats['promoted_vars'], 3)
+        # the array keeps its memory, the phis are lowered to vars of their own
+        allocs = [inst[1] for inst in code if inst[0].startswith('alloc')]
+        self.assertEqual([var for var in allocs if not var.endswith('.phi')], ['%v'])
+
+
+    def test_value_numbering(self):
+        source = """
+            int main() {
+                int a, b, c;
+                read(a, b);
+                c = (a * b + 1) * (a * b + 1);
+                print(c, " ", a * b);
+                return 0;
+            }
+        """
+        stats, code = self.optimize(source, "3 4")
+        self.assertGreater(stats['gvn_removed'], 0)
+        self.assertEqual(len([inst for inst in code if inst[0] == 'mul_int']), 2)
+
+
+    def test_loop_invariant_code_motion(self):
+        source = """
+            int main() {
+                int i, n, k, s;
+                read(n, k);
+                s = 0;
+                for (i = 0; i < n; i++) s = s + (k * k + 3);
+                print(s);
+                return 0;
+            }
+        """
+        stats, _ = self.optimize(source, "5 3")
+        self.assertEqual(stats['loops'], 1)
+        self.assertGreater(stats['licm_hoisted'], 0)
+        # a loop that never runs
+        self.optimize(source, "0 3")
+
+
+    def test_strength_reduction(self):
+        source = """
+            int main () {
+                int i, j;
+                i = 1;
+                j = 2;
+                for (int k = 1; k < 10; k++)
+                    i += j * k;
+                print(i);
+                return 0;
+            }
+        """
+        stats, code = self.optimize(source)
+        self.assertGreater(stats['sr_reduced'], 0)
+        self.check_reduced(code)
+
+
+    def test_strength_reduction_arrays(self):
+        # the elems of a row are indexed by i * 5 + 2
+        source = """
+            int m[8][5];
+            int main() {
+                int i, s;
+                for (i = 0; i < 8; i++) m[i][2] = i * 3;
+                s = 0;
+                for (i = 0; i < 8; i++) s = s + m[i][2];
+                print(s);
+                return 0;
+            }
+        """
+        stats, code = self.optimize(source)
+        self.assertGreater(stats['sr_reduced'], 0)
+        self.check_reduced(code)
+        # the elems take the reduced value as their index
+        phis = {inst[2] for inst in code if inst[0] == 'load_int' and inst[1].endswith('.phi')}
+        elems = [inst for inst in code if inst[0] == 'elem_int']
+        self.assertEqual(len(elems), 2)
+        self.assertTrue(all(inst[2] in phis for inst in elems))
+
+
+    def test_strength_reduction_read_bound(self):
+        # the bound is known only at run time, the tests keep the counter
+        source = """
+            int main() {
+                int i, n, s;
+                read(n);
+                s = 0;
+                for (i = 0; i < n; i++) s = s + i * 7;
+                for (i = 0; i < n; i++) s = s + (i * 7 + 3) * 5;
+                print(s);
+                return 0;
+            }
+        """
+        stats, code = self.optimize(source, "10")
+        self.assertGreater(stats['sr_reduced'], 0)
+        reads = {inst[1] for inst in code if inst[0] == 'read_int'}
+        loops = loop_code(code)
+        tests = [inst for loop in loops for inst in loop if inst[0] == 'lt_int']
+        self.assertEqual([inst[2] in reads for inst in tests], [True, True])
+        self.assertFalse([inst for inst in loops[1] if inst[0] == 'mul_int'])
+
+
+    def test_inline_functions(self):
+        source = """
+            int sq(int x) { return x * x; }
+            int fat(int n) { if (n <= 1) return 1; return n * fat(n - 1); }
+            int main() {
+                int i, s;
+                s = 0;
+                for (i = 0; i < 5; i++) s = s + sq(i);
+                print(s, " ", fat(5));
+                return 0;
+            }
+        """
+        stats, code = self.optimize(source, inline_budget=40)
+        self.assertEqual(stats['inlined'], 1)
+        # the recursive function is kept and sq is removed
+        calls = [inst[1] for inst in code if inst[0].startswith('call')]
+        self.assertEqual(calls, ['@fat', '@fat'])
+        self.assertFalse([inst for inst in code if inst[:2] == ('define_int', '@sq')])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+# imports
+import io
+import unittest
+from uc_parser import UCParser
+from uc_sema import Visitor
+from uc_codegen import GenerateCode
+from uc_blocks_control import ControlBlocks
+from uc_interpreter import Interpreter, FrameInterpreter, InputReader, TypedMemory, MemoryOverflow
+from uc_pyjit import PyJIT
+
+
+class ucInterpreterTestSuite(unittest.TestCase):
+
+
+    def setUp(self):
+        """ Executed before every test case """
+        self.parser = UCParser()
+
+
+    def generate_code(self, source):
+        ast = self.parser.parse(source, '', False)
+        Visitor().visit(ast)
+        gen = GenerateCode()
+        gen.visit(ast)
+        return gen.code
+
+
+    def run_program(self, source, input_data=None, engine=Interpreter, memory=None):
+        # run the program in this process, with its own memory and streams
+        output = io.StringIO()
+        vm = engine(memory, input_data=input_data, stdout=output)
+        if engine is PyJIT:
+            # the pyjit engine runs the basic blocks
+            blocks = ControlBlocks(ir_list=self.generate_code(source))
+            blocks.create_basic_blocks()
+            exit_code = vm.run(blocks)
+        else:
+            exit_code = vm.run(self.generate_code(source))
+        return exit_code, output.getvalue()
+
+
+    def test_exit_code(self):
+        source = "int main() { print(\"ok\"); print(); return 3; }"
+        for engine in (Interpreter, FrameInterpreter):
+            self.assertEqual(self.run_program(source, engine=engine), (3, "ok\n"))
+
+
+    def test_void_main(self):
+        source = "void main() { print(1, 2); return; }"
+        self.assertEqual(self.run_program(source), (0, "12"))
+
+
+    def test_void_callee(self):
+        source = """
+            int g = 0;
+            void bump() { g = g + 1; }
+            int main() { bump(); bump(); print(g); return 0; }
+        """
+        for engine in (Interpreter, FrameInterpreter):
+            self.assertEqual(self.run_program(source, engine=engine), (0, "2"))
+
+
+    def test_typed_memory_big_int(self):
+        # an int out of 64 bits doesn't fit in the typed region of the array
+        source = """
+            int main() {
+                int v[4];
+                int i;
+                v[0] = 3;
+                for (i = 1; i < 4; i++) v[i] = v[i - 1] * 1000000000000;
+                print(v[3], " ", v[0]);
+                return 0;
+            }
+        """
+        for engine in (Interpreter, FrameInterpreter):
+            self.assertEqual(self.run_program(source, engine=engine, memory=TypedMemory()),
+                             (0, "3" + 36 * "0" + " 3"))
+
+
+    def test_typed_memory_regions(self):
+        memory = TypedMemory(size=16, limit=64)
+        mark = memory.mark()
+        ints = memory.alloc_array(8, 'int')
+        floats = memory.alloc_array(4, 'float')
+        self.assertEqual(memory.alloc_array(4, 'char'), None)
+        memory[ints + 7] = 5
+        memory[floats:floats + 2] = [1.5, 2.5]
+        self.assertEqual((memory[ints], memory[ints + 7], memory[floats + 1]), (0, 5, 2.5))
+        self.assertEqual(list(memory[floats:floats + 3]), [1.5, 2.5, 0.0])
+        # the regions of a function are released when it returns
+        memory.release(mark)
+        self.assertEqual(memory.alloc_array(8, 'int'), ints)
+        self.assertEqual(memory[ints + 7], 0)
+        with self.assertRaises(MemoryOverflow):
+            memory.alloc_array(64, 'int')
+
+
+    def test_typed_memory_arrays(self):
+        # arrays of recursive calls, initialized arrays and float arrays
+        source = """
+            float m[2][3] = {{1.5, 2.0, 0.5}, {3.0, 1.0, 4.0}};
+            int sum(int n) {
+                int v[3];
+                if (n == 0) return 0;
+                v[n % 3] = n;
+                return v[n % 3] + sum(n - 1);
+            }
+            int main() {
+                int i;
+                int a[4] = {1, 2, 3, 4};
+                float s;
+                s = 0.0;
+                for (i = 0; i < 3; i++) s = s + m[1][i] * m[0][i];
+                print(sum(50), " ", a[3], " ", s);
+                return 0;
+            }
+        """
+        expected = self.run_program(source)
+        self.assertEqual(expected, (0, "1275 4 8.5"))
+        for engine in (Interpreter, FrameInterpreter):
+            self.assertEqual(self.run_program(source, engine=engine, memory=TypedMemory()), expected)
+        with self.assertRaises(MemoryOverflow):
+            self.run_program(source, memory=TypedMemory(limit=100))
+
+
+    def test_function_pointer(self):
+        source = """
+            int (operation)(int x, int y);
+            int add(int x, int y) { return x + y; }
+            int sub(int x, int y) { return x - y; }
+            int main() {
+                int a = 2, b = 3;
+                operation = add;
+                print(operation(a, b), " ");
+                operation = sub;
+                print(operation(a, b));
+                return 0;
+            }
+        """
+        for engine in (Interpreter, FrameInterpreter, PyJIT):
+            self.assertEqual(self.run_program(source, engine=engine), (0, "5 -1"))
+
+
+    def test_pyjit(self):
+        # the pyjit engine prints what the interpreter prints
+        sources = [
+            """
+            int fib(int n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+            int main() { int n; read(n); print(fib(n)); return n; }
+            """,
+            """
+            int v[5] = {4, 1, 3, 0, 2};
+            int main() {
+                int i, j, t;
+                for (i = 0; i < 5; i++)
+                    for (j = i + 1; j < 5; j++)
+                        if (v[j] < v[i]) { t = v[i]; v[i] = v[j]; v[j] = t; }
+                for (i = 0; i < 5; i++) print(v[i], " ");
+                return 0;
+            }
+            """,
+            """
+            float half(float x) { return x / 2.0; }
+            int main() {
+                float a[3] = {1.0, 2.5, 4.0};
+                float s;
+                char c;
+                int i, k;
+                s = 0.0;
+                for (i = 0; i < 3; i++) s = s + half(a[i]);
+                c = 'x';
+                for (k = 0; k < 10; k++) if (k * k > 10) break;
+                print(s, c, k, 7 / 2, 7 % 3, (float) k);
+                return 0;
+            }
+            """,
+        ]
+        for source in sources:
+            self.assertEqual(self.run_program(source, "10", engine=PyJIT), self.run_program(source, "10"))
+
+
+    def test_pyjit_deep_recursion(self):
+        source = """
+            int f(int n) { if (n == 0) return 0; return 1 + f(n - 1); }
+            int main() { print(f(1000)); print(f(100000000)); return 0; }
+        """
+        with self.assertRaises(MemoryOverflow):
+            self.run_program(source, engine=PyJIT)
+
+
+    def test_input_data(self):
+        source = """
+            int main() {
+                int n, i, s, x;
+                read(n);
+                s = 0;
+                for (i = 0; i < n; i++) {
+                    read(x);
+                    s = s + x;
+                }
+                print(s);
+                return 0;
+            }
+        """
+        for engine in (Interpreter, FrameInterpreter):
+            self.assertEqual(self.run_program(source, "4 1 2\n3 4", engine), (0, "10"))
+
+
+    def test_input_chunks(self):
+        # tokens cut at the end of the chunks, and the last one without a new line
+        data = b"12 345\n6  78901 x\n\n  -4"
+        for chunk_size in (1, 2, 3, 4, 7, 64):
+            reader = InputReader(stream=io.BytesIO(data), chunk_size=chunk_size)
+            tokens = [reader.next_token() for _ in range(6)]
+            self.assertEqual(tokens, ['12', '345', '6', '78901', 'x', '-4'])
+            self.assertTrue(reader.empty())
+            with self.assertRaises(EOFError):
+                reader.next_token()
+        # a stream of text, as sys.stdin without its buffer
+        reader = InputReader(stream=io.StringIO("7 8"), chunk_size=2)
+        self.assertEqual([reader.next_token(), reader.next_token()], ['7', '8'])
+
+
+    def test_reentrant(self):
+        # many programs run in the same process without sharing their state
+        source = """
+            int fat(int n) {
+                if (n <= 1) return 1;
+                return n * fat(n - 1);
+            }
+            int main() {
+                int n;
+                read(n);
+                print(fat(n));
+                return n;
+            }
+        """
+        code = self.generate_code(source)
+        for n, result in ((3, "6"), (5, "120"), (1, "1")):
+            output = io.StringIO()
+            vm = Interpreter(input_data=str(n), stdout=output)
+            self.assertEqual(vm.run(code), n)
+            self.assertEqual(output.getvalue(), result)
+
+
+if __name__ == '__main__':
+    unittest.main()
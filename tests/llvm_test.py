@@ -0,0 +1,154 @@
+# imports
+import io
+import os
+import tempfile
+import unittest
+from uc_parser import UCParser
+from uc_sema import Visitor
+from uc_codegen import GenerateCode
+from uc_blocks_control import ControlBlocks
+
+# the LLVM backend is optional
+try:
+    from uc_llvm import LLVMCodeGenerator, JITCache
+except ImportError:
+    LLVMCodeGenerator = None
+
+
+@unittest.skipIf(LLVMCodeGenerator is None, "needs llvmlite")
+class ucLLVMTestSuite(unittest.TestCase):
+    """ Checks the LLVM IR built for the programs and the cache
+        of the objects compiled by the JIT. """
+
+
+    def setUp(self):
+        """ Executed before every test case """
+        self.parser = UCParser()
+        self.tmp = tempfile.TemporaryDirectory()
+
+
+    def tearDown(self):
+        """ Executed after every test case """
+        self.tmp.cleanup()
+
+
+    def generate_llvm(self, source, opt_level=0, ssa=False):
+        ast = self.parser.parse(source, '', False)
+        Visitor().visit(ast)
+        gen = GenerateCode()
+        gen.visit(ast)
+        blocks = ControlBlocks(ir_list=gen.code)
+        blocks.create_basic_blocks()
+        llvm = LLVMCodeGenerator(blocks, False, opt_level, ssa)
+        llvm.build()
+        return llvm
+
+
+    def ir_of(self, llvm):
+        ir_file = io.StringIO()
+        llvm.save_ir(ir_file)
+        return ir_file.getvalue()
+
+
+    def optimized_ir_of(self, llvm):
+        # the IR optimized for the object, without running it
+        opt_file = io.StringIO()
+        llvm.emit_object(None, opt_file, os.path.join(self.tmp.name, 'program.o'))
+        return opt_file.getvalue()
+
+
+    def test_opt_levels(self):
+        source = """
+            int sq(int x) { return x * x; }
+            int main() {
+                int i, s;
+                s = 0;
+                for (i = 0; i < 10; i++) s = s + sq(i);
+                print(s);
+                return 0;
+            }
+        """
+        self.assertIn('alloca', self.ir_of(self.generate_llvm(source)))
+        self.assertEqual(self.optimized_ir_of(self.generate_llvm(source)), '')
+        for opt_level in (1, 2, 3):
+            optimized = self.optimized_ir_of(self.generate_llvm(source, opt_level))
+            # the vars are promoted to registers
+            self.assertIn('define', optimized)
+            self.assertNotIn('alloca', optimized)
+        self.assertTrue(os.path.getsize(os.path.join(self.tmp.name, 'program.o')) > 0)
+
+
+
+    def test_print_merging(self):
+        source = """
+            int main() {
+                int i, n;
+                n = 3;
+                for (i = 0; i < n; i++) print("i = ", i, " of ", n);
+                print();
+                print("done");
+                print('c');
+                for (i = 0; i < n; i++) print("i = ", i, " of ", n);
+                print(n % 2);
+                return 0;
+            }
+        """
+        ir = self.ir_of(self.generate_llvm(source))
+        # the prints of a block are one call, and
+        # the same format string is defined once
+        self.assertEqual(ir.count('call i32 (i8*, ...) @"printf"'), 4)
+        self.assertEqual(ir.count('c"i = %d of %d\\00"'), 1)
+        self.assertIn('c"\\0adonec\\00"', ir)
+
+
+    def test_ssa_registers(self):
+        source = """
+            int main() {
+                int i, s, v[4];
+                char c;
+                s = 0;
+                for (i = 0; i < 4; i++) {
+                    v[i] = i;
+                    s = s + v[i];
+                }
+                print(s);
+                return 0;
+            }
+        """
+        ir = self.ir_of(self.generate_llvm(source, ssa=True))
+        # only the array keeps its alloca, the vars are phis
+        self.assertEqual(ir.count('alloca'), 1)
+        self.assertIn('alloca [4 x i32]', ir)
+        self.assertIn('phi  i32', ir)
+
+
+    def test_jit_cache(self):
+        cache = JITCache(250, directory=os.path.join(self.tmp.name, 'cache'))
+        key = JITCache.signature("int main() { return 0; }", True, 40)
+        self.assertNotEqual(key, JITCache.signature("int main() { return 0; }", False, 40))
+        self.assertEqual(cache.load(key), None)
+        cache.save(key, b'a' * 100)
+        self.assertEqual(cache.load(key), b'a' * 100)
+        # the least recently used object is evicted
+        cache.save('b', b'b' * 100)
+        os.utime(os.path.join(cache.directory, key + '.o'), (1, 1))
+        os.utime(os.path.join(cache.directory, 'b.o'), (2, 2))
+        cache.load(key)
+        cache.save('c', b'c' * 100)
+        self.assertEqual(cache.load('b'), None)
+        self.assertEqual((cache.load(key), cache.load('c')), (b'a' * 100, b'c' * 100))
+        self.assertEqual(sorted(os.listdir(cache.directory)), sorted([key + '.o', 'c.o']))
+
+
+    def test_jit_cache_object(self):
+        # the object saved by the JIT runs again without the IR
+        source = "int main() { int x; x = 6; print(x * 7); return 0; }"
+        cache = JITCache(1 << 20, directory=self.tmp.name)
+        self.generate_llvm(source, 2).execute_ir(None, None, cache, 'key')
+        object_code = cache.load('key')
+        self.assertTrue(object_code)
+        LLVMCodeGenerator(None, False, 2).execute_object(object_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
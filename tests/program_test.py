@@ -0,0 +1,250 @@
+# imports
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# the package (uc.py) is the parent directory of the tests
+package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the LLVM backend (-l and --aot) is optional
+try:
+    import llvmlite
+except ImportError:
+    llvmlite = None
+
+# programs run by every engine and mode: (source, input)
+programs = {
+    'void_callee': ("""
+        int g = 0;
+        void bump() { g = g + 1; }
+        int main() {
+            int i;
+            for (i = 0; i < 3; i++) bump();
+            print(g);
+            return 0;
+        }
+    """, None),
+    'global_read_by_callee': ("""
+        int g = 0;
+        void show() { print(g, " "); }
+        int main() { g = 1; show(); g = 2; show(); return 0; }
+    """, None),
+    'inlined_calls': ("""
+        int sq(int x) { return x * x; }
+        int add(int a, int b) { return a + sq(b); }
+        int main() {
+            int i, s;
+            s = 0;
+            for (i = 0; i < 10; i++) s = add(s, i);
+            print(s);
+            return 0;
+        }
+    """, None),
+    'loops_and_arrays': ("""
+        int v[10] = {5, 3, 8, 1, 9, 2, 7, 4, 6, 0};
+        int main() {
+            int i, j, t, n, s;
+            n = 10;
+            for (i = 0; i < n; i++)
+                for (j = 0; j < n - 1 - i; j++)
+                    if (v[j] > v[j + 1]) {
+                        t = v[j]; v[j] = v[j + 1]; v[j + 1] = t;
+                    }
+            s = 0;
+            for (i = 0; i < n; i++) {
+                s = s + v[i] * 3 + i * 2;
+                print(v[i], " ");
+            }
+            print(s);
+            return 0;
+        }
+    """, None),
+    'void_main': ("""
+        void show(int n) { print(n, " "); }
+        void main() {
+            int i;
+            for (i = 0; i < 5; i++) show(i * i);
+            return;
+        }
+    """, None),
+    'one_char_strings': ("""
+        int main() {
+            int i;
+            for (i = 0; i < 3; i++) print(i, "|");
+            print("ab", "c");
+            return 0;
+        }
+    """, None),
+    'char_locals': ("""
+        int main() {
+            char t, c;
+            int x;
+            x = 1;
+            c = 'a';
+            if (x > 0) t = 'b';
+            print(x, c, t);
+            return 0;
+        }
+    """, None),
+    'reduced_test_overflow': ("""
+        int main() {
+            int n, j, k, s;
+            n = 2048;
+            j = 1048576;
+            s = 0;
+            for (k = 0; k < n; k++) s = s + j * k / 1048576;
+            print(s);
+            return 0;
+        }
+    """, None),
+    'read_input': ("""
+        int main() {
+            int n, i, x, s;
+            read(n);
+            s = 0;
+            for (i = 0; i < n; i++) {
+                read(x);
+                s = s + x;
+            }
+            print(s);
+            return 0;
+        }
+    """, "4 1 2\n3 4\n"),
+}
+
+# programs that the LLVM backend doesn't run: it has no function
+# pointers and, like C, doesn't zero the local arrays
+interp_programs = {
+    'local_array_in_loop': ("""
+        int cnt(int k) { int c[5]; c[k] = c[k] + 1; return c[k]; }
+        int main() {
+            int i;
+            for (i = 0; i < 3; i++) print(cnt(0), " ");
+            return 0;
+        }
+    """, None),
+    'function_pointer': ("""
+        int (operation)(int x, int y);
+        int add(int x, int y) { return x + y; }
+        int sub(int x, int y) { return x - y; }
+        int main() {
+            int a = 2, b = 3;
+            operation = add;
+            print(operation(a, b), " ");
+            operation = sub;
+            print(operation(a, b));
+            return 0;
+        }
+    """, None),
+}
+
+# modes of the engines of the interpreter and of the optimizer
+interp_modes = [
+    ['-e', 'frame'],
+    ['-e', 'pyjit'],
+    ['--typed-mem'],
+    ['-o'],
+    ['-o', '--inline-budget', '0'],
+    ['-o', '-e', 'frame'],
+    ['-o', '-e', 'pyjit'],
+]
+
+# modes of the LLVM backend
+llvm_modes = [
+    ['-l'],
+    ['-l', '-O', '1'],
+    ['-l', '-O', '2'],
+    ['-l', '-O', '3'],
+    ['-l', '-p', 'all'],
+    ['-o', '-l'],
+    ['-o', '-l', '-O', '2'],
+    ['-l', '--llvm-ssa'],
+    ['-o', '-l', '--llvm-ssa', '-O', '1'],
+]
+
+
+class ucProgramTestSuite(unittest.TestCase):
+    """ Runs the programs with uc.py in each mode and compares
+        their output with the one of the reference interpreter. """
+
+
+    def setUp(self):
+        """ Executed before every test case """
+        self.tmp = tempfile.TemporaryDirectory()
+
+
+    def tearDown(self):
+        """ Executed after every test case """
+        self.tmp.cleanup()
+
+
+    def run_uc(self, name, source, input_data, flags):
+        filename = os.path.join(self.tmp.name, name + '.uc')
+        with open(filename, 'w') as f:
+            f.write(source)
+        result = subprocess.run([sys.executable, os.path.join(package_dir, 'uc.py'), filename, '-s'] + flags,
+                                input=(input_data or '').encode(), capture_output=True, timeout=120)
+        return result.returncode, result.stdout.decode()
+
+
+    def run_executable(self, name, input_data):
+        result = subprocess.run([os.path.join(self.tmp.name, name)],
+                                input=(input_data or '').encode(), capture_output=True, timeout=120)
+        return result.returncode, result.stdout.decode()
+
+
+    def check_modes(self, programs, modes):
+        for name, (source, input_data) in programs.items():
+            expected = self.run_uc(name, source, input_data, [])
+            self.assertEqual(expected[0], 0, name)
+            for flags in modes:
+                with self.subTest(program=name, flags=' '.join(flags)):
+                    self.assertEqual(self.run_uc(name, source, input_data, flags), expected)
+
+
+    def test_reference(self):
+        # the outputs of the reference interpreter
+        self.assertEqual(self.run_uc('void_callee', *programs['void_callee'], []), (0, "3"))
+        self.assertEqual(self.run_uc('local_array_in_loop', *interp_programs['local_array_in_loop'], []),
+                         (0, "1 1 1 "))
+        self.assertEqual(self.run_uc('function_pointer', *interp_programs['function_pointer'], []),
+                         (0, "5 -1"))
+        # j * 2048 doesn't fit in the i32 of the LLVM backend
+        self.assertEqual(self.run_uc('reduced_test_overflow', *programs['reduced_test_overflow'], ['-o', '-l']),
+                         (0, "2096128"))
+
+
+    def test_interp_modes(self):
+        self.check_modes(dict(programs, **interp_programs), interp_modes)
+
+
+
+    @unittest.skipIf(llvmlite is None, "needs llvmlite")
+    def test_llvm_modes(self):
+        self.check_modes(programs, llvm_modes)
+
+
+    @unittest.skipIf(llvmlite is None or shutil.which('cc') is None, "needs llvmlite and cc")
+    def test_aot(self):
+        for name, (source, input_data) in programs.items():
+            expected = self.run_uc(name, source, input_data, [])
+            for flags in [['--aot', 'exe'], ['-O', '2', '--aot', 'exe']]:
+                with self.subTest(program=name, flags=' '.join(flags)):
+                    self.assertEqual(self.run_uc(name, source, input_data, flags)[0], 0)
+                    # a void main exits with 0 too
+                    self.assertEqual(self.run_executable(name, input_data), expected)
+
+
+    @unittest.skipIf(llvmlite is None, "needs llvmlite")
+    def test_aot_error(self):
+        # a program with errors leaves no object
+        self.run_uc('error', "int main() { return j; }", None, ['--aot', 'obj'])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'error.o')))
+        self.assertEqual(os.listdir(self.tmp.name), ['error.uc'])
+
+
+if __name__ == '__main__':
+    unittest.main()
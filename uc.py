@@ -10,13 +10,14 @@
 import argparse
 import sys
 from contextlib import contextmanager
-from uc_parser import UCParser
+from subprocess import CalledProcessError
+from uc_parser import get_parser
 from uc_sema import Visitor
-from uc_interpreter import Interpreter
+from uc_interpreter import Interpreter, FrameInterpreter, Memory, TypedMemory, MemoryOverflow
+from uc_pyjit import PyJIT
 from uc_codegen import GenerateCode
 from uc_blocks_control import ControlBlocks
 from uc_analysis import DataFlow
-from uc_llvm import LLVMCodeGenerator
 
 """
 One of the most important (and difficult) parts of writing a compiler
@@ -130,7 +131,7 @@ class Compiler:
         """ Parses the source code. If ast_file != None,
             prints out the abstract syntax tree.
         """
-        self.parser = UCParser()
+        self.parser = get_parser()
         self.ast = self.parser.parse(self.code, '', False)
 
     def _sema(self):
@@ -157,11 +158,16 @@ class Compiler:
 
     def _opt(self, blocks):
 
-        self.dataflow = DataFlow(blocks)
+        self.dataflow = DataFlow(blocks, inline_budget=self.args.inline_budget)
         self.dataflow.optimize_code()
 
         self.optcode = self.dataflow.code
 
+        if self.args.debug:
+            for func, stats in self.dataflow.stats.items():
+                _stats = ", ".join(f"{name} = {value}" for name, value in stats.items())
+                sys.stderr.write(f"{func}: {_stats}\n")
+
         _str = ""
         if not self.args.susy and self.opt_file is not None:
             for _code in self.optcode:
@@ -169,13 +175,39 @@ class Compiler:
             self.opt_file.write(_str)
 
     def _llvm(self, blocks, opt):
-        self.llvm = LLVMCodeGenerator(blocks, opt)
+        # llvmlite (and its shared library) is loaded only by the LLVM backend (-l)
+        from uc_llvm import LLVMCodeGenerator
+
+        self.llvm = LLVMCodeGenerator(blocks, opt, self.args.opt_level, self.args.llvm_ssa)
         self.llvm.build()
 
         if not self.args.susy and self.llvm_file is not None:
             self.llvm.save_ir(self.llvm_file)
-        if self.run:
-            self.llvm.execute_ir(self.args.llvm_opt, self.llvm_opt_file)
+        if self.args.aot:
+            try:
+                self.llvm.emit_object(self.args.llvm_opt, self.llvm_opt_file, self.object_filename)
+                if self.args.aot == 'exe':
+                    self.llvm.link_executable(self.object_filename, self.executable_filename)
+            except (OSError, CalledProcessError) as e:
+                error(None, e)
+        elif self.run:
+            self.llvm.execute_ir(self.args.llvm_opt, self.llvm_opt_file, self.jit_cache, self.jit_cache_key)
+
+    def _llvm_cached(self):
+        """ Looks for the program in the cache of the JIT. If found,
+            runs its object without compiling it again.
+        """
+        from uc_llvm import LLVMCodeGenerator, JITCache
+
+        self.jit_cache = JITCache(self.args.jit_cache_size << 20)
+        self.jit_cache_key = JITCache.signature(self.code, self.args.opt, self.args.inline_budget,
+                                                self.args.llvm_opt, self.args.opt_level, self.args.llvm_ssa)
+        object_code = self.jit_cache.load(self.jit_cache_key)
+        if object_code is None:
+            return False
+
+        LLVMCodeGenerator(None, self.args.opt, self.args.opt_level).execute_object(object_code)
+        return True
 
     def _do_compile(self):
         """ Compiles the code to the given file object. """
@@ -188,7 +220,7 @@ class Compiler:
             self.create_blocks.create_basic_blocks()
             if self.args.opt:
                 self._opt(self.create_blocks)
-            if self.args.llvm:
+            if self.args.llvm or self.args.aot:
                 self._llvm(self.create_blocks, self.args.opt)
 
     def compile(self):
@@ -199,6 +231,18 @@ class Compiler:
         else:
             filename = self.args.filename + '.uc'
 
+        source = open(filename, 'r')
+        self.code = source.read()
+        source.close()
+
+        self.run = not self.args.no_run
+
+        self.jit_cache = None
+        self.jit_cache_key = None
+        if self.args.jit_cache and self.args.llvm and not self.args.aot and self.run:
+            if self._llvm_cached():
+                return 0
+
         open_files = []
 
         self.ast_file = None
@@ -230,36 +274,57 @@ class Compiler:
             open_files.append(self.llvm_file)
 
         self.llvm_opt_file = None
-        if self.args.llvm_opt and not self.args.susy:
+        if (self.args.llvm_opt or self.args.opt_level) and (self.args.llvm or self.args.aot) \
+                and not self.args.susy:
             llvm_opt_filename = filename[:-3] + '.opt.ll'
             sys.stderr.write("Outputting the optimized LLVM IR to %s.\n" % llvm_opt_filename)
             self.llvm_opt_file = open(llvm_opt_filename, 'w')
             open_files.append(self.llvm_opt_file)
 
-        source = open(filename, 'r')
-        self.code = source.read()
-        source.close()
+        self.object_filename = None
+        if self.args.aot:
+            # written by the backend only when the compilation succeeds
+            self.object_filename = filename[:-3] + '.o'
+            sys.stderr.write("Outputting the native object to %s.\n" % self.object_filename)
+            if self.args.aot == 'exe':
+                self.executable_filename = filename[:-3]
+                sys.stderr.write("Outputting the executable to %s.\n" % self.executable_filename)
 
-        self.run = not self.args.no_run
+        retval = 0
         with subscribe_errors(lambda msg: sys.stderr.write(msg + "\n")):
             self._do_compile()
             if errors_reported():
                 sys.stderr.write("{} error(s) encountered.".format(errors_reported()))
-            elif not self.args.llvm:
+            elif not self.args.llvm and not self.args.aot:
                 if self.args.opt:
                     speedup = len(self.gencode) / len(self.optcode)
                     sys.stderr.write("original = %d, otimizado = %d, speedup = %.2f\n" %
                                      (len(self.gencode), len(self.optcode), speedup))
                 if self.run and not self.args.cfg:
-                    vm = Interpreter()
-                    if self.args.opt:
-                        vm.run(self.optcode)
+                    if self.args.typed_mem:
+                        memory = TypedMemory(limit=self.args.mem_limit)
+                    else:
+                        memory = Memory(limit=self.args.mem_limit)
+                    if self.args.engine == 'frame':
+                        vm = FrameInterpreter(memory, self.args.interactive)
+                    elif self.args.engine == 'pyjit':
+                        vm = PyJIT(memory, self.args.interactive)
                     else:
-                        vm.run(self.gencode)
+                        vm = Interpreter(memory, self.args.interactive)
+                    try:
+                        if self.args.engine == 'pyjit':
+                            retval = vm.run(self.create_blocks)
+                        elif self.args.opt:
+                            retval = vm.run(self.optcode)
+                        else:
+                            retval = vm.run(self.gencode)
+                    except (MemoryOverflow, EOFError) as e:
+                        error(None, e)
+                        retval = 1
 
         for f in open_files:
             f.close()
-        return 0
+        return retval
 
 
 if __name__ == '__main__':
@@ -272,9 +337,37 @@ if __name__ == '__main__':
     parser.add_argument("-c", "--cfg", help="show the CFG for each function in pdf format", action='store_true')
     parser.add_argument("-o", "--opt", help="optimize the uCIR with const prop and dce", action='store_true')
     parser.add_argument("-d", "--debug", help="print in the stderr some debug informations", action='store_true')
+    parser.add_argument("--inline-budget", type=int, default=40,
+                        help="max number of uCIR instructions of a function inlined "
+                             "by the optimizer (-o), 0 disables the inlining")
     parser.add_argument("-l", "--llvm", help="generate LLVM IR code in the 'filename'.ll", action='store_true')
     parser.add_argument("-p", "--llvm-opt", choices=['ctm', 'dce', 'cfg', 'all'],
                         help="specify which llvm pass optimizations is enabled")
+    parser.add_argument("--llvm-ssa", help="lower the scalar vars of the uCIR to LLVM registers "
+                        "(with phis) instead of allocas, loads and stores", action='store_true')
+    parser.add_argument("-O", "--opt-level", type=int, choices=range(4), default=0,
+                        help="optimize the LLVM IR with the -O0..-O3 pipeline of LLVM "
+                             "before the JIT compiles it")
+    parser.add_argument("--jit-cache", help="cache on disk the objects compiled by the JIT (-l), the "
+                        "programs found in the cache run without compiling them again (and "
+                        "without dumping their IR)", action='store_true')
+    parser.add_argument("--jit-cache-size", type=int, default=64,
+                        help="max size (in MB) of the JIT cache, the least recently used "
+                             "objects are evicted")
+    parser.add_argument("--aot", choices=['obj', 'exe'],
+                        help="compile the LLVM IR ahead of time to the native object 'filename'.o "
+                             "(obj) or also link it with the system cc in the executable "
+                             "'filename' (exe), instead of running it on the JIT")
+    parser.add_argument("-e", "--engine", choices=['interp', 'frame', 'pyjit'], default='interp',
+                        help="select how the uCIR is executed: by name (interp), with "
+                             "the names resolved to frame slots at load time (frame) or "
+                             "compiled to Python functions (pyjit)")
+    parser.add_argument("--mem-limit", type=int, default=1 << 24,
+                        help="max number of memory cells of the interpreter")
+    parser.add_argument("--typed-mem", help="store the int & float arrays of the interpreter "
+                        "in typed regions", action='store_true')
+    parser.add_argument("--interactive", help="flush the output of the program at each print, "
+                        "instead of buffering it", action='store_true')
     args = parser.parse_args()
 
     retval = Compiler(args).compile()
@@ -5,17 +5,177 @@
 #                                                #
 # Authors: Luiz Cartolano && Erico Faustino      #
 ##################################################
+import re
+from heapq import heappush, heappop
 from uc_block import Block, ConditionBlock, CFG
+from uc_ssa import SSAForm, Phi, terminators, block_code, last_temp, to_ssa, from_ssa, \
+    dominators, dominator_tree
+
+
+# lattice values of the constant propagation,
+# besides the constants
+TOP = object()
+BOTTOM = object()
+
+# range of the ints of the LLVM backend (i32),
+# the values out of it wrap around
+INT_MIN = -(1 << 31)
+INT_MAX = (1 << 31) - 1
+
+
+def union(left, right):
+    return left | right
+
+
+def intersection(left, right):
+    return left & right
+
+
+def iter_bits(bits):
+    """
+        Positions of the bits set in a bitset
+        (python int), in increasing order.
+
+        :param bits: int
+        :return: generator
+    """
+    # the binary string is scanned in C, that is much faster
+    # than isolating the lowest bit of a big int in each step
+    digits = bin(bits)[:1:-1]
+    pos = digits.find('1')
+    while pos >= 0:
+        yield pos
+        pos = digits.find('1', pos + 1)
+
+
+def to_set(bits, items):
+    """
+        Set of the items of a bitset, where
+        items[i] is the item of the bit i.
+
+        :param bits: int
+        :param items: list
+        :return: set
+    """
+    return {items[pos] for pos in iter_bits(bits)}
+
+
+class BitVectorSolver():
+    """
+        Generic solver for the bit-vector dataflow problems.
+
+        The facts of a problem (definitions, variables, ...) are numbered
+        once and a set of facts is a python int, where the bit i is set
+        if the fact i is in the set, so the union, intersection and
+        difference of the sets are just |, & and & ~ of ints.
+
+        For each block n the solver computes the fix point of:
+
+            forward:  in[n]  = meet_{p in predecessors[n]} out[p]
+                      out[n] = gen[n] | (in[n] & ~kill[n])
+
+            backward: out[n] = meet_{s in successors[n]} in[s]
+                      in[n]  = gen[n] | (out[n] & ~kill[n])
+
+        where meet is union (may problems, starting from the empty
+        set) or intersection (must problems, starting from top, the
+        set of all facts). A block without predecessors (forward) or
+        successors (backward) gets the boundary set.
+
+        The blocks are taken from a worklist in the given order, that
+        should be the reverse postorder for the forward problems and
+        the postorder for the backward ones, so a block is usually
+        visited after the blocks that flow into it.  When the value of
+        a block changes only the blocks that depend on it go back to
+        the worklist.  The number of visits is kept in iterations.
+    """
+    def __init__(self, forward, meet=union, top=0, boundary=0):
+        self.forward = forward
+        self.meet = meet
+        self.top = top
+        self.boundary = boundary
+        self.iterations = 0
+
+
+    def solve(self, blocks, gen, kill, order=None):
+        """
+            Solve the problem for the blocks, with gen[i]
+            and kill[i] as the bitsets of blocks[i].  The
+            order is the list of the block labels in the
+            order they are visited (the blocks order if None).
+
+            :param blocks: list
+            :param gen: list
+            :param kill: list
+            :param order: list
+            :return: list, list (ins and outs)
+        """
+        index = {block.label: pos for pos, block in enumerate(blocks)}
+
+        # the blocks that flow into each block (predecessors
+        # if forward, else successors) and the blocks that
+        # depend on each block (the other way round)
+        edges = []
+        dependents = [[] for _ in blocks]
+        for pos, block in enumerate(blocks):
+            neighbours = block.predecessors if self.forward else block.successors
+            edges.append([index[bb.label] for bb in neighbours if bb.label in index])
+            for neighbour in edges[pos]:
+                dependents[neighbour].append(pos)
+
+        # the priority of each block in the worklist
+        rank = list(range(len(blocks)))
+        if order is not None:
+            for position, label in enumerate(order):
+                rank[index[label]] = position
+
+        # the value that flows into the block (before)
+        # and the value after the transfer function (after)
+        before = [self.top] * len(blocks)
+        after = [self.top] * len(blocks)
+
+        # start with all the blocks in the worklist
+        worklist = [(rank[pos], pos) for pos in range(len(blocks))]
+        worklist.sort()
+        in_worklist = [True] * len(blocks)
+        self.iterations = 0
+
+        while worklist:
+            _, pos = heappop(worklist)
+            in_worklist[pos] = False
+            self.iterations += 1
+
+            if edges[pos]:
+                value = after[edges[pos][0]]
+                for neighbour in edges[pos][1:]:
+                    value = self.meet(value, after[neighbour])
+            else:
+                value = self.boundary
+            before[pos] = value
+
+            value = gen[pos] | (value & ~kill[pos])
+            if value != after[pos]:
+                after[pos] = value
+                for dependent in dependents[pos]:
+                    if not in_worklist[dependent]:
+                        in_worklist[dependent] = True
+                        heappush(worklist, (rank[dependent], dependent))
+
+        if self.forward:
+            return before, after
+        return after, before
 
 
 class DataFlow():
     """
         Class to implement DataFlow analysis.
     """
-    def __init__(self, blocks_control):
+    def __init__(self, blocks_control, inline_budget=0):
         self.all_blocks = []
         self.before_opt_blocks = None
         self.blocks_control = blocks_control
+        # the globals, a callee may read any of them
+        self.global_vars = {inst[1] for inst in blocks_control.globals}
         self.code_to_eliminate = set()
         self.code = []
         self.variable_ops = ['load', 'store', 'get']
@@ -27,14 +187,28 @@ class DataFlow():
                               'le', 'ge', 'gt', 'eq', 'ne', 'and', 'or',
                               'not', 'call', 'read')
         self.comparison_ops = {'and', 'or', 'ne', 'eq', 'lt', 'le', 'gt', 'ge'}
+        self.commutative_ops = {'add', 'mul', 'eq', 'ne'}
+
+        # numbering of the facts of the bit-vector analyses
+        # for the function being analysed
+        self.definitions = []   # (block_pos, inst_pos) of each RD definition
+        self.variables = []     # name of each LV variable
+        self.var_index = {}     # number of each LV variable
+        self.use_counts = {}    # number of uses of each name
+
+        # statistics of the analyses & passes of each function
+        self.stats = {}
+
+        # max number of instructions of a function inlined
+        self.inline_budget = inline_budget
 
         self.binary_fold = {'add': lambda l, r: l + r,
                             'sub': lambda l, r: l - r,
                             'mul': lambda l, r: l * r,
                             'div': lambda l, r: l // r,
                             'mod': lambda l, r: l % r,
-                            'and': lambda l, r: l & r,
-                            'or': lambda l, r: l | r,
+                            'and': lambda l, r: l and r,
+                            'or': lambda l, r: l or r,
                             'ne': lambda l, r: l != r,
                             'eq': lambda l, r: l == r,
                             'lt': lambda l, r: l < r,
@@ -61,24 +235,69 @@ class DataFlow():
             return {inst[1], inst[2]}, {inst[3]}
         elif op == 'literal':
             return set(), {inst[2]}
+        elif op == 'phi':
+            return {value for value, _ in inst[1] if value is not None}, {inst[2]}
         elif (op in self.values_ops and inst[0] != 'return_void') or op == 'cbranch':
             return {inst[1]}, set()
         elif op == 'call':
-            return set(), {inst[2]}
+            # the callee (or the function pointer)
+            # and the globals it may read
+            return {inst[1]} | self.global_vars, {inst[2]}
         elif op in ['read', 'alloc']:
             return set(), {inst[1]}
         else:
             return set(), set()
 
 
+    def __var_bits(self, names):
+        """
+            Bitset of a set of variables, numbering
+            the variables not seen yet.
+
+            :param names: set
+            :return: int
+        """
+        bits = 0
+        for name in names:
+            if name not in self.var_index:
+                self.var_index[name] = len(self.variables)
+                self.variables.append(name)
+            bits |= 1 << self.var_index[name]
+        return bits
+
+
+    def __count_uses(self, inst, step):
+        """
+            Update the use counts with the uses of
+            an instruction, step is 1 when it's added
+            and -1 when it's eliminated.
+
+            :param inst: tuple
+            :param step: int
+            :return: None
+        """
+        use, _ = self.__get_use_def(inst)
+        if inst[0].startswith('store') and '*' in inst[0]:
+            # a store through a pointer reads the pointer
+            use = use.union({inst[2]})
+        for name in use:
+            self.use_counts[name] = self.use_counts.get(name, 0) + step
+
+
     def __compute_lv_use_def(self, func):
         """
-            Compute LV use and def for
-            all blocks.
+            Compute LV use and def for all blocks, as
+            bitsets, and the use counts of the names
+            of the function, shared by the DCE passes.
 
             :param func: dict
             :return: None
         """
+        # number the variables of the function
+        self.variables = []
+        self.var_index = {}
+        self.use_counts = {}
+
         # for each block in function
         for block_lb in func:
             # get block obj
@@ -88,233 +307,169 @@ class DataFlow():
                 # get use and defs
                 use, defs = self.__get_use_def(inst=inst)
                 # make the union of all uses
-                block.lv.use = block.lv.use.union(use)
+                block.lv.use |= self.__var_bits(use)
                 # make the union of all defs
-                block.lv.defs = block.lv.defs.union(defs)
+                block.lv.defs |= self.__var_bits(defs)
+                # count the uses of each name
+                self.__count_uses(inst, 1)
 
 
-    def compute_lv_in_out(self, func, debug=False):
+    def __solve_order(self, func, func_name, forward):
+        """
+            Order of the worklist of a dataflow problem: reverse
+            postorder for the forward ones and postorder for the
+            backward ones, and then the unreachable blocks.
+
+            :param func: dict
+            :param func_name: str
+            :param forward: bool
+            :return: list
+        """
+        if forward:
+            order = self.blocks_control.reverse_postorder(func_name)
+        else:
+            order = list(self.blocks_control.postorder(func_name))
+        reached = set(order)
+        return order + [block_lb for block_lb in func if block_lb not in reached]
+
+
+    def compute_lv_in_out(self, func, func_name, debug=False):
         """
             Compute the LV in and out for all
             blocks following the algorithm given by
             https://www.cs.colostate.edu/~mstrout/CS553/slides/lecture03.pdf
 
             :param func: dict
+            :param func_name: str
             :param debug: bool
             :return: None
         """
         # first compute use
         # and def to all blocks
         self.__compute_lv_use_def(func)
-        changed = True
 
         # get blocks labels
-        cfg = CFG("teste")
-        block_labels = cfg.dfs_visit(
-            func['%entry'],
-            self.all_blocks
-        )
-
-        while changed:
-            # set changed to false
-            changed = False
-
-            # loop over all the blocks
-            # in reverse order
-            for block_lb in reversed(block_labels):
-
-                # get the block
-                if block_lb in func:
-                    block = func[block_lb]
-                else:
-                    continue
-
-                # get the actual in and
-                # out before update
-                old_in = block.lv.ins
-                old_out = block.lv.out
-
-                # update lv out following the rule:
-                # out[n] = \union_{s \in success[n]} in[s]
-                temp = set()
-                for success in block.successors:
-                    temp = temp.union(success.lv.ins)
-                block.lv.out = temp
-
-                # update lv in following the rule:
-                # in[n] = use[n] \union (out[n] - def[n])
-                block.lv.ins = block.lv.use.union(block.lv.out - block.lv.defs)
-
-                # if there is no change
-                # we can end the loop
-                if block.lv.out != old_out or block.lv.ins != old_in:
-                    changed = True
+        block_labels = self.__solve_order(func, func_name, forward=False)
+        blocks = [func[block_lb] for block_lb in block_labels]
+
+        # solve the backward problem following the rules:
+        # out[n] = \union_{s \in success[n]} in[s]
+        # in[n] = use[n] \union (out[n] - def[n])
+        solver = BitVectorSolver(forward=False, meet=union)
+        ins, out = solver.solve(blocks,
+                                [block.lv.use for block in blocks],
+                                [block.lv.defs for block in blocks])
+        self.stats.setdefault(func_name, {})['lv_iterations'] = solver.iterations
 
         # set globals as out to all nodes
         # according to professor spec since we
         # are not optimizing globals
-        for block_lb in block_labels:
-            if block_lb in func:
-                block = func[block_lb]
-            else:
-                continue
-            for global_inst in self.blocks_control.globals:
-                block.lv.out = block.lv.out.union({global_inst[1]})
+        global_vars = self.__var_bits({global_inst[1] for global_inst in self.blocks_control.globals})
+        for pos, block in enumerate(blocks):
+            block.lv.ins = ins[pos]
+            block.lv.out = out[pos] | global_vars
 
         # print LV in/out for all
         # blocks if in debug mode
         if debug:
             print()
             print('== Live Variable Analysis ==')
+            print('iterations:', solver.iterations)
             for block_lb in block_labels:
                 bb = func[block_lb]
                 print(bb.label)
-                print('\tuse:  ', sorted(bb.lv.use))
-                print('\tdef:  ', sorted(bb.lv.defs))
-                print('\tin :  ', sorted(bb.lv.ins))
-                print('\tout:  ', sorted(bb.lv.out))
+                print('\tuse:  ', sorted(to_set(bb.lv.use, self.variables)))
+                print('\tdef:  ', sorted(to_set(bb.lv.defs, self.variables)))
+                print('\tin :  ', sorted(to_set(bb.lv.ins, self.variables)))
+                print('\tout:  ', sorted(to_set(bb.lv.out, self.variables)))
 
 
-    def __compute_rd_defs(self, func, blocks_label):
+    def __compute_rd_gen_kill(self, blocks):
         """
-            Func to compute RD definitions
-            for all blocks.
+            Number the definitions of the function and
+            compute the gen kill of all blocks as bitsets.
 
-            :param func: dict
-            :param blocks_label: list
-            :return: dict
+            :param blocks: list
+            :return: list, list, list (definitions, gen and kill)
         """
-        # create an empty
-        # dict of definitions
-        defs = {}
-
-        # iterate over all blocks of a function
-        for block_counter, block_label in enumerate(blocks_label):
-            # get the block obj
-            block = func[block_label]
-            # iterate over all instructions
+        # an assignment instruction is any operation that
+        # defines a new var such as a load/store/add/etc ...
+        # each one is numbered as a definition, that is
+        # stored as a tuple with (block_pos, inst_pos)
+        definitions = []
+        targets = []
+        for block_counter, block in enumerate(blocks):
             for inst_counter, inst in enumerate(block.instructions[1:]):
-                # an assignment instruction is any
-                # operation that defines a new var
-                # such as a load/store/add/etc ...
                 if inst[0].split('_')[0] in self.assignment_op:
+                    definitions.append((block_counter, inst_counter + 1))
                     # tuple last element
                     # is the target
-                    target = inst[-1]
-                    # if target do not exist
-                    # in keys add it to the dict
-                    # else append it to the previous
-                    # we add a tuple with (block_pos, inst_pos)
-                    if target not in defs.keys():
-                        defs[target] = [(block_counter, inst_counter + 1)]
-                    else:
-                        defs[target].append((block_counter, inst_counter + 1))
-
-        return defs
-
-
-    def __compute_rd_gen_kill(self, func):
-        """
-            Compute the gen kill of all blocks.
-
-            :param func: dict
-            :return: None
-        """
-        # get the blocks labels as a list
-        blocks_label = list(func.keys())
-
-        # get all definitions for all blocks
-        defs = self.__compute_rd_defs(func=func,
-                                      blocks_label=blocks_label
-                                      )
-
-        # iterate over all blocks
-        for block_counter, block_label in enumerate(blocks_label):
-            # get block obj
-            block = func[block_label]
-            # iterate over all block instructions
-            for inst_counter, inst in enumerate(block.instructions[1:]):
-                # an assignment instruction is any
-                # operation that defines a new var
-                # such as a load/store/add/etc ...
-                if inst[0].split('_')[0] in self.assignment_op:
-                    # tuple last element
-                    # is the target
-                    target = inst[-1]
-                    # following Appel algorithm
-                    # kill = defs[target] - inst
-                    kills = set(defs[target]) - {(block_counter, inst_counter + 1)}
-                    # block kill is the union of all kills
-                    block.rd.kill = block.rd.kill.union(kills)
-                    # gen is the instruction by itself
-                    gen = {(block_counter, inst_counter + 1)}
-                    # block gen is the union of previous
-                    # gens minus the actual kills
-                    block.rd.gen = gen.union(block.rd.gen - kills)
-
+                    targets.append(inst[-1])
 
-    def compute_rd_in_out(self, func, debug=False):
+        # bitset of all definitions of each target
+        defs = {}
+        for def_counter, target in enumerate(targets):
+            defs[target] = defs.get(target, 0) | (1 << def_counter)
+
+        gen = [0] * len(blocks)
+        kill = [0] * len(blocks)
+        for def_counter, (block_counter, _) in enumerate(definitions):
+            target = targets[def_counter]
+            # following Appel algorithm
+            # kill = defs[target] - inst
+            kills = defs[target] & ~(1 << def_counter)
+            # block kill is the union of all kills
+            kill[block_counter] |= kills
+            # block gen is the instruction union
+            # the previous gens minus the actual kills
+            gen[block_counter] = (1 << def_counter) | (gen[block_counter] & ~kills)
+
+        return definitions, gen, kill
+
+
+    def compute_rd_in_out(self, func, func_name, debug=False):
         """
             Compute the RD in and out for all
             blocks following the algorithm given by
             https://www.cs.colostate.edu/~mstrout/CS553Fall07/Slides/lecture11-dataflow.pdf
 
             :param func: dict
+            :param func_name: str
             :param debug: bool
             :return: None
         """
+        # get a list of blocks
+        blocks = list(func.values())
+
         # first compute the gen/kill
-        self.__compute_rd_gen_kill(func=func)
+        self.definitions, gen, kill = self.__compute_rd_gen_kill(blocks)
 
-        # get a list of blocks
-        blocks_label = list(func.keys())
+        # solve the forward problem following the rules:
+        # in[n] = \union_{p \in predecessors[n]}{out[p]}
+        # out[n] = gen[n] \union (in[n] - kill[n])
+        solver = BitVectorSolver(forward=True, meet=union)
+        ins, out = solver.solve(blocks, gen, kill, self.__solve_order(func, func_name, forward=True))
+        self.stats.setdefault(func_name, {})['rd_iterations'] = solver.iterations
 
-        # create a set of changed nodes
-        changed_nodes = set(blocks_label)
-
-        # iterate while exists nodes
-        # in the changed_nodes set
-        while changed_nodes:
-            # get a block label from
-            # the set of block labels
-            block_label = changed_nodes.pop()
-            # get a Block object
-            block = func[block_label]
-
-            # first we calculate the in[n]
-            # by the following rule :
-            # in[n] = \union_{p \in predecessors[n]}{out[p]}
-            block.rd.ins = set()
-            for predecessor in block.predecessors:
-                block.rd.ins = block.rd.ins.union(predecessor.rd.out)
-
-            # store the old out value
-            old_out = block.rd.out
-
-            # now we calculate the new out[n] that
-            # is calculated according to the rule :
-            # out[n] = gen[n] \union (in[n] - kill[n])
-            block.rd.out = block.rd.gen.union(block.rd.ins - block.rd.kill)
-
-            # if out[n] has changed, we
-            # must update the changed nodes
-            # with the successors of n
-            if block.rd.out != old_out:
-                for success in block.successors:
-                    changed_nodes = changed_nodes.union({success.label})
+        for pos, block in enumerate(blocks):
+            block.rd.gen = gen[pos]
+            block.rd.kill = kill[pos]
+            block.rd.ins = ins[pos]
+            block.rd.out = out[pos]
 
         # print LV in/out for all
         # blocks if in debug mode
         if debug:
             print()
             print('==Reaching Definitions==')
+            print('iterations:', solver.iterations)
             for block_lb in func:
                 bb = func[block_lb]
                 print(bb.label)
-                print('\tgen:  ', sorted(bb.rd.gen))
-                print('\tkill: ', sorted(bb.rd.kill))
-                print('\tin :  ', sorted(bb.rd.ins))
-                print('\tout:  ', sorted(bb.rd.out))
+                print('\tgen:  ', sorted(to_set(bb.rd.gen, self.definitions)))
+                print('\tkill: ', sorted(to_set(bb.rd.kill, self.definitions)))
+                print('\tin :  ', sorted(to_set(bb.rd.ins, self.definitions)))
+                print('\tout:  ', sorted(to_set(bb.rd.out, self.definitions)))
 
 
     def dead_code_elimination(self, func, debug=False):
@@ -337,7 +492,7 @@ class DataFlow():
             dead_code = set()
             # get all live variables at a block
             # given by the \intersect{defs, block.lv.out}
-            live_variables = block.lv.defs.intersection(block.lv.out)
+            live_variables = to_set(block.lv.defs & block.lv.out, self.variables)
 
             # iterate over each instruction in block at reverse order
             for inst_pos, inst in reversed(list(enumerate(block.instructions))):
@@ -350,13 +505,16 @@ class DataFlow():
                     # is not in the live out set
                     if defs.intersection(live_variables) == set():
                         # check if not deals with globals
-                        # because it causes bugs
-                        if 'elem' in inst[0] or 'alloc' in inst[0] or '*' in inst[0]:
+                        # because it causes bugs, and keep the
+                        # calls and reads, that have side effects
+                        if 'elem' in inst[0] or 'alloc' in inst[0] or '*' in inst[0] \
+                                or inst[0].split('_')[0] in ('call', 'read'):
                             pass
                         else:
                             # remove the node from the CFG
                             dead_code.add(inst)
                             self.code_to_eliminate.add(inst)
+                            self.__count_uses(inst, -1)
                 # update the live variables
                 # adding the uses and eliminating
                 # the definitions
@@ -399,6 +557,8 @@ class DataFlow():
                         # if not, iterate over the next instructions
                         # appending them to the dead code list
                         for eliminate_pos in range(inst_pos + 1, len(block.instructions)):
+                            if eliminate_pos not in dead_code:
+                                self.__count_uses(block.instructions[eliminate_pos], -1)
                             dead_code.add(eliminate_pos)
                             self.code_to_eliminate.add(block.instructions[eliminate_pos])
 
@@ -425,48 +585,38 @@ class DataFlow():
             print()
             print('== Alloc Test ==')
 
+        # get the allocated vars that are never
+        # used, given by the use counts
+        dead_vars = set()
+        for block_lb in func:
+            for inst in func[block_lb].instructions:
+                if inst[0].split('_')[0] == 'alloc' and self.use_counts.get(inst[-1], 0) == 0:
+                    dead_vars.add(inst[-1])
+
+        # print if in debug mode
+        if debug:
+            for target in sorted(dead_vars):
+                print("=============")
+                print(target)
+                print("=============")
+
         # iterate over all blocks
         for block_lb in func:
             # get block obj
             block = func[block_lb]
-            # for each block create an
-            # empty set of dead code
-            dead_code = set()
 
-            # iterate over each instruction in block
-            for inst_pos, inst in enumerate(block.instructions):
-                # check if alloc operation
-                if 'alloc' in inst[0]:
-                    # get operation target
-                    target = inst[-1]
-                    # set a dead flag as True
-                    is_dead = True
-                    # iterate over all blocks
-                    # checking if the target is
-                    # any block.lv.use
-                    for block_temp in func:
-                        # get block
-                        bb_temp = func[block_temp]
-                        # if target in a block.lv.use
-                        # we cant eliminate it so
-                        # flag is False
-                        if target in bb_temp.lv.use:
-                            is_dead = False
-                    if is_dead:
-                        # print if in debug mode
-                        if debug:
-                            print("=============")
-                            print(target)
-                            print("=============")
-                        # appending them to the dead code list
-                        dead_code.add(inst_pos)
-                        self.code_to_eliminate.add(block.instructions[inst_pos])
-
-            # update block instructions
-            # by eliminate the dead codes
+            # update block instructions by eliminate the
+            # allocs of the dead vars and the stores to
+            # them, since they are never read
             updated_instructions = []
-            for inst_pos, inst in enumerate(block.instructions):
-                if inst_pos not in dead_code:
+            for inst in block.instructions:
+                op = inst[0].split('_')[0]
+                if op == 'alloc' and inst[-1] in dead_vars:
+                    self.code_to_eliminate.add(inst)
+                elif op == 'store' and '*' not in inst[0] and inst[-1] in dead_vars:
+                    self.__count_uses(inst, -1)
+                    self.code_to_eliminate.add(inst)
+                else:
                     updated_instructions.append(inst)
             block.instructions = updated_instructions
 
@@ -475,57 +625,60 @@ class DataFlow():
             print('=' * len('== Alloc Test =='))
 
 
-    def __set_constants(self, block, blocks_list):
+    def __fold(self, inst, values):
         """
-            Create a dict of constants to the block.
+            Lattice value of the temporary defined by a binary,
+            unary or conversion instruction, given the values of
+            its operands.
 
-            :param block: uc_block.Block
-            :param blocks_list: list
-            :return: dict
+            :param inst: tuple
+            :param values: dict
+            :return: constant, TOP or BOTTOM
         """
-        # create an empty
-        # dict of constants
-        constants = {}
-
-        # rd.out has a list of instructions
-        # stored as (block_pos, inst_pos)
-        # iterate over it
-        for block_pos, inst_pos in sorted(block.rd.out):
-            # get instruction
-            inst = blocks_list[block_pos].instructions[inst_pos]
-
-            # if dealing with a literal instruction
-            # if target not yet on dict, add it with the
-            # value, else, check if not sets a new value to
-            # target, if yes, cannot be a constant
-            if 'literal' in inst[0]:
-                if inst[-1] not in constants:
-                    constants[inst[-1]] = inst[1]
-                elif constants[inst[-1]] != inst[1]:
-                    constants[inst[-1]] = False
-            # if deals with a load, check if
-            # the source is a constant, if yes
-            # make the target a constant too
-            elif 'load' in inst[0]:
-                if inst[1] in constants and constants[inst[1]] is not False:
-                    constants[inst[-1]] = inst[1]
-            # if print ignore
-            elif 'print' in inst[0]:
-                pass
-            # if any other instruction
-            # target cannot be a constant
+        op = inst[0].split('_')[0]
+        operands = [values.get(name, TOP) for name in inst[1:-1]]
+
+        if BOTTOM in operands:
+            return BOTTOM
+        elif TOP in operands:
+            return TOP
+
+        # same semantics of the interpreter, a fold
+        # that fails is left to happen at run time
+        try:
+            if op == 'not':
+                result = not operands[0]
+            elif op == 'sitofp':
+                result = float(operands[0])
+            elif op == 'fptosi':
+                result = int(operands[0])
+            elif op == 'div' and inst[0] == 'div_float':
+                result = operands[0] / operands[1]
             else:
-                constants[inst[-1]] = False
+                result = self.binary_fold[op](operands[0], operands[1])
+        except (ArithmeticError, TypeError, ValueError):
+            return BOTTOM
 
-        return constants
+        # if result is a bool cast to int
+        return int(result) if isinstance(result, bool) else result
 
 
     def constant_propagation(self, func, func_name, debug=False):
         """
-            Function that implements a constant
-            optimization for the function being analysed
-            following the algorithm described at
-            https://www.cs.colostate.edu/~mstrout/CS553/slides/lecture01.pdf
+            Function that implements the sparse conditional
+            constant propagation of Wegman & Zadeck, "Constant
+            Propagation with Conditional Branches", over the
+            SSA form of the function being analysed.
+
+            The lattice value of each SSA name is TOP (no value
+            seen yet), a constant or BOTTOM (not a constant).  An
+            instruction is evaluated only when its block is found
+            executable and again when the value of one of its
+            operands goes down, and a cbranch only makes the edges
+            of its constant condition executable.  So the constants
+            are folded through the arithmetic, comparisons and
+            branches in one pass, and the blocks never reached
+            are removed from the function.
 
             :param func: dict
             :param func_name: str
@@ -537,156 +690,761 @@ class DataFlow():
             print()
             print('== Constant Propagation ==')
 
-        # get a list of blocks labels
-        blocks_label = list(func.keys())
-        # get a list of block objects
-        blocks_list = [func[block_lb] for block_lb in blocks_label]
-
-        # iterate over all blocks
-        for block_pos, block in enumerate(blocks_list):
-            # set blocks constants
-            constants = self.__set_constants(block, blocks_list)
-            # iterate over all instructions at a block
-            for inst_pos, inst in enumerate(block.instructions):
-                # get the instruction operation
-                op = inst[0].split('_')
-                # get the operation type
-                opt_type = op[1] if len(op) > 1 else ''
-
-                # deals if operation is a load/store or cbranch
-                if op[0] in ['load', 'store', 'cbranch']:
-                    # get the source
-                    # for instruction
-                    source = inst[1]
-
-                    # check if source is a constant
-                    if source in constants and constants[source] is not False:
-                        # optimize a cbranch when
-                        # the source, comparison value,
-                        # is a constant, so we can eliminate
-                        # one of the branches
-                        if op[0] == 'cbranch':
-                            # get comparison value
-                            comp_value = constants[source]
-                            # get actual block
-                            temp_block = blocks_list[block_pos]
-
-                            # create new Block
-                            new_block = Block('novo')
-                            new_block.label = temp_block.label
-                            new_block.instructions = temp_block.instructions
-                            new_block.predecessors = temp_block.predecessors
-                            new_block.rd = temp_block.rd
-
-                            # check which branch is taken
-                            # the True or False block
-                            if comp_value == 0:
-                                # update new block successors
-                                new_block.next_block = temp_block.fall_through
-                                new_block.successors = [temp_block.fall_through]
-
-                                # eliminate old blocks references
-                                temp_block.taken.predecessors = []
-                                for successor in temp_block.taken.successors:
-                                    successor.predecessors.remove(temp_block.taken)
-
-                                # delete the unused branch (taken)
-                                # from the list of blocks
-                                del func[temp_block.taken.label]
-
-                                # update the taken block references
-                                temp_block.fall_through.predecessors.remove(temp_block)
-                                temp_block.fall_through.predecessors.append(new_block)
+        ssa = SSAForm(self.blocks_control, func_name)
+
+        # uses of each SSA name by the phis and
+        # by the instructions of the blocks
+        uses = {}
+        for label in ssa.order:
+            for phi in ssa.phis[label]:
+                for name in phi.args.values():
+                    uses.setdefault(name, []).append((label, phi))
+            for inst_pos, inst in block_code(func[label]):
+                if (label, inst_pos) in ssa.loads:
+                    use = {ssa.loads[(label, inst_pos)]}
+                else:
+                    use, _ = self.__get_use_def(inst)
+                for name in use:
+                    uses.setdefault(name, []).append((label, inst_pos))
+
+        values = {}             # lattice value of each name, TOP if missing
+        executable = set()      # labels of the blocks executable
+        edges = set()           # (source, target) labels of the edges executable
+        flow_worklist = [(None, '%entry')]
+        ssa_worklist = []
+
+        def lower(name, value):
+            # values only go down the lattice
+            old = values.get(name, TOP)
+            if value is TOP or old is BOTTOM:
+                return
+            if old is TOP:
+                values[name] = value
+            elif value is BOTTOM or type(old) is not type(value) or old != value:
+                values[name] = BOTTOM
+            else:
+                return
+            ssa_worklist.append(name)
+
+        def visit_phi(label, phi):
+            value = TOP
+            for pred_label, name in phi.args.items():
+                if (pred_label, label) in edges:
+                    arg = values.get(name, TOP)
+                    if value is TOP:
+                        value = arg
+                    elif arg is not TOP and (arg is BOTTOM or type(arg) is not type(value) or arg != value):
+                        value = BOTTOM
+            lower(phi.target, value)
+
+        def visit_inst(label, inst_pos):
+            inst = func[label].instructions[inst_pos]
+            op = inst[0].split('_')[0]
+            if op == 'jump':
+                flow_worklist.append((label, inst[1]))
+            elif op == 'cbranch':
+                cond = values.get(inst[1], TOP)
+                if cond is BOTTOM or (cond is not TOP and cond):
+                    flow_worklist.append((label, inst[2]))
+                if cond is BOTTOM or (cond is not TOP and not cond):
+                    flow_worklist.append((label, inst[3]))
+            elif (label, inst_pos) in ssa.loads:
+                lower(inst[2], values.get(ssa.loads[(label, inst_pos)], TOP))
+            elif (label, inst_pos) in ssa.allocs:
+                # the alloc of the interpreter sets the var to 0
+                lower(ssa.allocs[(label, inst_pos)], 0)
+            elif op == 'store' and inst[2] in ssa.variables:
+                pass
+            elif op == 'literal':
+                lower(inst[2], inst[1])
+            elif op == 'define':
+                # the parameters are only known at run time
+                for _, name in inst[2]:
+                    lower(name, BOTTOM)
+            elif op in self.binary_fold or op in ('not', 'sitofp', 'fptosi'):
+                lower(inst[-1], self.__fold(inst, values))
+            else:
+                # calls, reads, elems, memory accesses, ...
+                _, defs = self.__get_use_def(inst)
+                for name in defs:
+                    lower(name, BOTTOM)
+
+        while flow_worklist:
+            while flow_worklist or ssa_worklist:
+                if flow_worklist:
+                    edge = flow_worklist.pop()
+                    if edge in edges:
+                        continue
+                    edges.add(edge)
+                    label = edge[1]
+                    for phi in ssa.phis[label]:
+                        visit_phi(label, phi)
+                    if label not in executable:
+                        executable.add(label)
+                        for inst_pos, _ in block_code(func[label]):
+                            visit_inst(label, inst_pos)
+                else:
+                    name = ssa_worklist.pop()
+                    for label, use in uses.get(name, []):
+                        if label in executable:
+                            if isinstance(use, Phi):
+                                visit_phi(label, use)
                             else:
-                                # update new block successors
-                                new_block.next_block = temp_block.taken
-                                new_block.successors = [temp_block.taken]
-
-                                # eliminate old blocks references
-                                temp_block.fall_through.predecessors = []
-                                for successor in temp_block.fall_through.successors:
-                                    successor.predecessors.remove(temp_block.fall_through)
-
-                                # delete the unused branch (fall
-                                # through) from the list of blocks
-                                del func[temp_block.fall_through.label]
-
-                                # update the taken block references
-                                temp_block.taken.predecessors.remove(temp_block)
-                                temp_block.taken.predecessors.append(new_block)
-
-                            # update the block list references
-                            blocks_list[block_pos] = new_block
-                            func[temp_block.label] = new_block
-                            self.blocks_control.functions[func_name][new_block.label] = new_block
-
-                            # add a new instruction to replace the cbranch
-                            new_block.instructions[-1] = ('jump', new_block.next_block.label)
+                                visit_inst(label, use)
+
+            # a condition still TOP is only reached through undefined
+            # values, so both of its branches are kept
+            for label in executable:
+                *_, (_, inst) = block_code(func[label])
+                if inst[0] == 'cbranch' and values.get(inst[1], TOP) is TOP:
+                    values[inst[1]] = BOTTOM
+                    flow_worklist += [(label, inst[2]), (label, inst[3])]
+
+        # replace the temporaries that are constants by
+        # literals and the constant cbranches by jumps
+        folded = 0
+        for label in executable:
+            block = func[label]
+            for inst_pos, inst in block_code(block):
+                opcode = inst[0].split('_')
+                if opcode[0] == 'cbranch' and values[inst[1]] is not BOTTOM:
+                    block.instructions[inst_pos] = ('jump', inst[2] if values[inst[1]] else inst[3])
+                    folded += 1
+                elif opcode[0] == 'literal' or (opcode[0] == 'load' and (label, inst_pos) not in ssa.loads):
+                    continue
+                elif opcode[0] in self.binary_fold or opcode[0] in ('load', 'not', 'sitofp', 'fptosi'):
+                    value = values.get(inst[-1], TOP)
+                    if value is not TOP and value is not BOTTOM:
+                        if opcode[0] == 'load':
+                            opt_type = opcode[1]
                         else:
-                            # if a load or store and
-                            # does not involve globals
-                            # change instruction by a literal
-                            if '*' not in inst[0]:
-                                block.instructions[inst_pos] = (f'literal_{opt_type}', constants[source], inst[2])
-                                constants[inst[-1]] = constants[source]
+                            opt_type = 'float' if isinstance(value, float) else \
+                                'char' if isinstance(value, str) else 'int'
+                        block.instructions[inst_pos] = (f"literal_{opt_type}", value, inst[-1])
+                        folded += 1
+
+                        # print if in debug mode
+                        if debug:
+                            print(f"    {label}: {inst} -> {block.instructions[inst_pos]}")
+
+        # remove the blocks never executed
+        # and link the blocks again
+        unreachable = [label for label in func if label not in executable]
+        for label in unreachable:
+            del func[label]
+        self.blocks_control.relink_blocks(func_name)
+
+        self.stats.setdefault(func_name, {}).update(sccp_folded=folded, sccp_unreachable=len(unreachable))
+
+        # print if in debug mode
+        if debug:
+            print(f"    Unreachable blocks: {unreachable}")
+            print('=' * len('== Constant Propagation =='))
+
+
+    def promote_variables(self, func, func_name, debug=False):
+        """
+            Function that promotes the scalar local vars whose
+            address is never taken to temporaries (like the mem2reg
+            of LLVM): the function is converted to the SSA form, so
+            their allocs, loads and stores are removed and the values
+            that reach a join point are merged by phis.
+
+            :param func: dict
+            :param func_name: str
+            :param debug: bool
+            :return: None
+        """
+        # print if in debug mode
+        if debug:
+            print()
+            print('== Promote Variables ==')
+
+        ssa = to_ssa(self.blocks_control, func_name)
+
+        phis = sum(len(ssa.phis[block_lb]) for block_lb in ssa.phis)
+        self.stats.setdefault(func_name, {}).update(promoted_vars=len(ssa.variables),
+                                                    promoted_loads=len(ssa.loads), phis=phis)
+
+        # print if in debug mode
+        if debug:
+            print(f"    Variables: {sorted(ssa.variables)}")
+            for block_lb in ssa.phis:
+                for phi in ssa.phis[block_lb]:
+                    print(f"    {block_lb}: {phi.target} = phi {phi.var} {phi.args}")
+            print('=' * len('== Promote Variables =='))
+
+
+    def __value_key(self, label, inst):
+        """
+            Key of the value computed by an instruction, the same
+            for the instructions that always compute the same value,
+            or None if the instruction can't be reused (memory
+            accesses, calls, reads, ...).
+
+            :param label: str
+            :param inst: tuple
+            :return: tuple
+        """
+        op = inst[0].split('_')[0]
+        if op == 'literal':
+            # 1 == 1.0 == True, but they aren't printed the same way
+            return inst[0], type(inst[1]).__name__, inst[1]
+        elif op in self.binary_fold:
+            if op in self.commutative_ops:
+                return (inst[0],) + tuple(sorted(inst[1:3]))
+            return inst[:3]
+        elif op in ('not', 'sitofp', 'fptosi', 'get', 'elem'):
+            return inst[:-1]
+        elif op == 'phi':
+            # the phis of the same block with the same arguments
+            return inst[0], label, tuple(inst[1])
+        return None
+
+
+    def value_numbering(self, func, func_name, debug=False):
+        """
+            Function that implements the dominator based value
+            numbering of Briggs, Cooper & Simpson, "Value Numbering",
+            over the SSA form of the function being analysed.
+
+            The dominator tree is walked keeping a table with the
+            value computed by each key (see __value_key) of the
+            dominators of the current block, so an instruction that
+            computes a value already in the table is removed and its
+            target is replaced by the temporary of the table.  The
+            phis whose arguments are all the same value are replaced
+            by this value too.
+
+            :param func: dict
+            :param func_name: str
+            :param debug: bool
+            :return: None
+        """
+        # print if in debug mode
+        if debug:
+            print()
+            print('== Value Numbering ==')
+
+        idom = dominators(self.blocks_control, func_name)
+        children = dominator_tree(self.blocks_control.reverse_postorder(func_name), idom)
+
+        # temporary that replaces each target removed
+        renamed = {}
+
+        def find(name):
+            while name in renamed:
+                name = renamed[name]
+            return name
+
+        def substitute(inst):
+            op = inst[0].split('_')[0]
+            if op == 'phi':
+                return inst[0], [(find(value), pred_label) for value, pred_label in inst[1]], inst[2]
+            elif op == 'cbranch':
+                return inst[0], find(inst[1]), inst[2], inst[3]
+            elif op in ('jump', 'define') or len(inst) == 1:
+                return inst
+            return tuple(find(arg) if isinstance(arg, str) else arg for arg in inst)
+
+        table = {}
+        removed = 0
+        # iterative walk of the dominator tree, the keys
+        # of a block are removed after its children
+        stack = [('%entry', None)]
+        while stack:
+            label, added = stack.pop()
+            if added is not None:
+                for key in added:
+                    del table[key]
+                continue
+
+            block = func[label]
+            added = []
+            instructions = []
+            for inst in block.instructions:
+                inst = substitute(inst)
+                if inst[0].startswith('phi'):
+                    values = {value for value, _ in inst[1]} - {inst[2]}
+                    if len(values) == 1 and None not in values:
+                        renamed[inst[2]] = values.pop()
+                        removed += 1
+                        continue
+
+                key = self.__value_key(label, inst)
+                if key is not None:
+                    if key in table:
+                        renamed[inst[-1]] = table[key]
+                        removed += 1
+
+                        # print if in debug mode
+                        if debug:
+                            print(f"    {label}: {inst} -> {table[key]}")
+                        continue
+                    table[key] = inst[-1]
+                    added.append(key)
+                instructions.append(inst)
+            block.instructions = instructions
+
+            stack.append((label, added))
+            for child in reversed(children[label]):
+                stack.append((child, None))
+
+        # the arguments of the phis that come from
+        # blocks visited after the phis
+        for block_lb in func:
+            block = func[block_lb]
+            block.instructions = [substitute(inst) if inst[0].startswith('phi') else inst
+                                  for inst in block.instructions]
+
+        self.stats.setdefault(func_name, {})['gvn_removed'] = removed
+
+        # print if in debug mode
+        if debug:
+            print('=' * len('== Value Numbering =='))
+
+
+    def __create_preheader(self, func, func_name, loop, label):
+        """
+            Create an empty preheader for a loop: a block with
+            only a jump to the header that is placed before it, so
+            the blocks out of the loop that enter the header (by a
+            jump, a cbranch or falling through) enter the preheader.
+            The arguments of the phis of the header from these blocks
+            become arguments from the preheader, merged by new phis
+            if there is more than one of these blocks.
+
+            :param func: dict
+            :param func_name: str
+            :param loop: uc_block.Loop
+            :param label: int
+            :return: int
+        """
+        preheader = f"%{label}"
+        header = func[loop.header]
+        outside = [pred.label for pred in header.predecessors if pred.label not in loop.blocks]
+        instructions = [(str(label),)]
+
+        for pred in header.predecessors:
+            *_, (last_pos, last) = block_code(pred)
+            op = last[0].split('_')[0]
+            if pred.label in loop.blocks:
+                # a latch must jump to the header, as
+                # the preheader is placed before it
+                if op not in terminators:
+                    pred.instructions.insert(last_pos + 1, ('jump', loop.header))
+            elif op == 'jump':
+                pred.instructions[last_pos] = ('jump', preheader)
+            elif op == 'cbranch':
+                pred.instructions[last_pos] = last[:2] + tuple(preheader if target == loop.header else target
+                                                               for target in last[2:])
+
+        for inst_pos, inst in enumerate(header.instructions):
+            if not inst[0].startswith('phi'):
+                continue
+            args = [(value, pred_label) for value, pred_label in inst[1] if pred_label in outside]
+            values = {value for value, _ in args}
+            if len(values) == 1:
+                value = values.pop()
+            else:
+                label += 1
+                value = f"%{label}"
+                instructions.append((inst[0], args, value))
+            header.instructions[inst_pos] = (inst[0], [(value, preheader)] +
+                                             [arg for arg in inst[1] if arg[1] not in outside], inst[2])
+
+        instructions.append(('jump', loop.header))
+        block = Block(preheader)
+        block.instructions = instructions
+
+        # place the preheader before the header
+        blocks = list(func.items())
+        func.clear()
+        for block_lb, other in blocks:
+            if block_lb == loop.header:
+                func[preheader] = block
+            func[block_lb] = other
+        self.blocks_control.relink_blocks(func_name)
+
+        loop.preheader = preheader
+        parent = loop.parent
+        while parent is not None:
+            parent.blocks.add(preheader)
+            parent = parent.parent
+
+        return label
+
+
+    def loop_invariant_code_motion(self, func, func_name, debug=False):
+        """
+            Function that moves the instructions whose value doesn't
+            change in a loop to its preheader, so they are executed
+            only once when the loop is entered, over the SSA form of
+            the function being analysed.
+
+            The loops are visited from the inner to the outer ones,
+            see ControlBlocks.find_loops, so an instruction can be
+            moved out of many loops.  An instruction is invariant if
+            its operands aren't defined in the loop, and only the
+            ones that can be executed even if the loop body is not
+            are moved: literals, the arithmetic (the div/mod only by
+            a literal not zero), the elem/get addresses and the loads
+            of vars that aren't written in the loop (a loop with a
+            call or a store/read through a pointer may write any var).
+            The loads through pointers are kept in the loop.
+
+            :param func: dict
+            :param func_name: str
+            :param debug: bool
+            :return: None
+        """
+        # print if in debug mode
+        if debug:
+            print()
+            print('== Loop Invariant Code Motion ==')
+
+        loops = self.blocks_control.find_loops(func_name)
+        label = last_temp(func)
+
+        # value of the literals, to check the divisors
+        literals = {inst[2]: inst[1] for block in func.values()
+                    for inst in block.instructions if inst[0].startswith('literal')}
+
+        hoisted = 0
+        for loop in loops:
+            if loop.preheader is None:
+                label = self.__create_preheader(func, func_name, loop, label + 1)
+
+            # names defined and vars written in the loop
+            defined = set()
+            written = set()
+            any_var = False
+            for block_lb in loop.blocks:
+                for _, inst in block_code(func[block_lb]):
+                    opcode = inst[0].split('_')
+                    _, defs = self.__get_use_def(inst)
+                    defined |= defs
+                    if opcode[0] == 'call' or (opcode[0] in ('store', 'read') and len(opcode) > 2):
+                        any_var = True
+                    elif opcode[0] == 'store':
+                        written.add(inst[2])
+                    elif opcode[0] == 'read':
+                        written.add(inst[1])
+
+            preheader = func[loop.preheader]
+            *_, (last_pos, last) = block_code(preheader)
+            if last[0].split('_')[0] in terminators:
+                code = preheader.instructions[last_pos:]
+                del preheader.instructions[last_pos:]
+            else:
+                code = []
+
+            for block_lb in self.blocks_control.reverse_postorder(func_name):
+                if block_lb not in loop.blocks:
+                    continue
+                block = func[block_lb]
+                executed = len(list(block_code(block)))
+                instructions = []
+                for inst_pos, inst in enumerate(block.instructions):
+                    opcode = inst[0].split('_')
+                    uses, defs = self.__get_use_def(inst)
+                    if inst_pos >= executed:
+                        invariant = False
+                    elif opcode[0] == 'literal':
+                        invariant = True
+                    elif opcode[0] in ('div', 'mod'):
+                        invariant = literals.get(inst[2], 0) != 0
+                    elif opcode[0] in self.binary_ops or opcode[0] in ('sitofp', 'elem', 'get'):
+                        invariant = True
+                    elif opcode[0] == 'load' and len(opcode) == 2:
+                        invariant = not any_var and inst[1] not in written
                     else:
-                        # if source is not a constant
-                        # set target as not a constant too
-                        constants[inst[-1]] = False
-                # deals with binary operation
-                elif op[0] in self.binary_ops:
-                    # get operands
-                    left_op = inst[1]
-                    right_op = inst[2]
-
-                    # check if constant value of operand
-                    # is a reference to another constant
-                    # happens when load %3 %4 do the check
-                    # for both left and right
-                    if left_op in constants:
-                        if isinstance(constants[left_op], str):
-                            if constants[left_op] in constants and constants[constants[left_op]] is not False:
-                                left_op = constants[constants[left_op]]
-                            elif left_op in constants:
-                                constants[left_op] = False
+                        invariant = False
+
+                    if invariant and not uses & defined:
+                        preheader.instructions.append(inst)
+                        defined -= defs
+                        hoisted += 1
+
+                        # print if in debug mode
+                        if debug:
+                            print(f"    {block_lb} -> {loop.preheader}: {inst}")
                     else:
-                        constants[inst[-1]] = False
-
-                    if right_op in constants:
-                        if isinstance(constants[right_op], str):
-                            if constants[right_op] in constants and constants[constants[right_op]] is not False:
-                                right_op = constants[constants[right_op]]
-                            elif right_op in constants:
-                                constants[right_op] = False
+                        instructions.append(inst)
+                block.instructions = instructions
+
+            preheader.instructions += code
+
+        self.stats.setdefault(func_name, {}).update(loops=len(loops), licm_hoisted=hoisted)
+
+        # print if in debug mode
+        if debug:
+            print('=' * len('== Loop Invariant Code Motion =='))
+
+
+    def strength_reduction(self, func, func_name, debug=False):
+        """
+            Function that implements the strength reduction of the
+            induction variables of the loops, over the SSA form of
+            the function being analysed.
+
+            A basic induction variable is a phi of the loop header
+            that is incremented by a loop invariant in its only
+            latch.  The int values computed in the loop as a * i + b
+            (a and b loop invariants) from a basic one i, like the
+            indexes of the elems of the arrays, are made induction
+            variables too: a phi of the header that starts with
+            a * init + b and is incremented by a * step in the
+            latch, so the multiplications by the loop counter are
+            replaced by an add.  The values with the same base and
+            multiplier share one of these variables, and a basic one
+            left only to test the end of the loop is replaced in the
+            test by a derived one.  The invariants are computed in the
+            preheader of the loop, see loop_invariant_code_motion.
+
+            A phi of the header costs a store and a load per iteration
+            when it is lowered, so a loop is only reduced if it computes
+            less per iteration.
+
+            :param func: dict
+            :param func_name: str
+            :param debug: bool
+            :return: None
+        """
+        # print if in debug mode
+        if debug:
+            print()
+            print('== Strength Reduction ==')
+
+        label = last_temp(func)
+        reduced = 0
+        created = 0
+
+        # value of the literals, to check the multipliers
+        literals = {inst[2]: inst[1] for block in func.values()
+                    for inst in block.instructions if inst[0] == 'literal_int'}
+
+        for loop in self.blocks_control.find_loops(func_name):
+            if loop.preheader is None or len(loop.latches) != 1:
+                continue
+            latch = loop.latches[0]
+
+            # definition of each name of the loop
+            defs = {}
+            for block_lb in loop.blocks:
+                for _, inst in block_code(func[block_lb]):
+                    for name in self.__get_use_def(inst)[1]:
+                        defs[name] = inst
+
+            # basic induction variables: i -> (init, step, next)
+            basics = {}
+            for inst in func[loop.header].instructions:
+                if inst[0] != 'phi_int':
+                    continue
+                args = {pred_label: value for value, pred_label in inst[1]}
+                if set(args) != {loop.preheader, latch}:
+                    continue
+                update = defs.get(args[latch])
+                if update is not None and update[0] == 'add_int' and inst[2] in update[1:3]:
+                    step = update[2] if update[1] == inst[2] else update[1]
+                    if step not in defs and args[loop.preheader] is not None:
+                        basics[inst[2]] = (args[loop.preheader], step, args[latch])
+
+            if not basics:
+                continue
+
+            # the invariants are computed at the end of the preheader
+            preheader = func[loop.preheader]
+            *_, (last_pos, last) = block_code(preheader)
+            if last[0].split('_')[0] in terminators:
+                code = preheader.instructions[last_pos:]
+                del preheader.instructions[last_pos:]
+            else:
+                code = []
+            mark = len(preheader.instructions)
+
+            def emit(op, left, right):
+                nonlocal label
+                label += 1
+                preheader.instructions.append((op, left, right, f"%{label}"))
+                return f"%{label}"
+
+            # derived induction variables: t -> (i, a, b),
+            # a and b are None when they are 1 and 0
+            families = {}
+            for block_lb in self.blocks_control.reverse_postorder(func_name):
+                if block_lb not in loop.blocks:
+                    continue
+                for _, inst in block_code(func[block_lb]):
+                    if inst[0] not in ('add_int', 'sub_int', 'mul_int'):
+                        continue
+                    left, right, target = inst[1:]
+                    if inst[0] != 'sub_int' and left not in basics and left not in families:
+                        left, right = right, left
+                    family = (left, None, None) if left in basics else families.get(left)
+                    if family is None or right in defs:
+                        continue
+
+                    base, mult, add = family
+                    if inst[0] == 'mul_int':
+                        families[target] = (base, right if mult is None else emit('mul_int', mult, right),
+                                            None if add is None else emit('mul_int', add, right))
+                    elif inst[0] == 'add_int':
+                        families[target] = (base, mult, right if add is None else emit('add_int', add, right))
                     else:
-                        constants[inst[-1]] = False
-
-                    # make sure both left and right operators are constants
-                    if left_op in constants and right_op in constants and\
-                            constants[left_op] is not False and constants[right_op] is not False:
-
-                        # get constants values and convert them to operation type
-                        left_value, right_value = str(constants[left_op]), str(constants[right_op])
-                        left_value, right_value = eval(opt_type + '(' + left_value + ')'),\
-                                                  eval(opt_type + '(' + right_value + ')')
-
-                        # create a binary operation
-                        # function instance
-                        func_op = self.binary_fold[op[0]]
-                        # make the operation
-                        result = func_op(left_value, right_value)
-                        # if result is a bool cast to int
-                        result = int(result) if op[0] in self.comparison_ops else result
-
-                        # convert binary operation to a literal
-                        block.instructions[inst_pos] = (f"literal_{opt_type}", result, inst[3])
-                        constants[inst[3]] = result
+                        if add is None:
+                            label += 1
+                            add = f"%{label}"
+                            preheader.instructions.append(('literal_int', 0, add))
+                        families[target] = (base, mult, emit('sub_int', add, right))
+
+            # only the values multiplied by the counter are reduced,
+            # the ones used just to compute other reduced values are
+            # removed, the others become induction variables
+            candidates = {name: family for name, family in families.items() if family[1] is not None}
+            users = {}
+            for block in func.values():
+                for inst in block.instructions:
+                    uses, targets = self.__get_use_def(inst)
+                    if not targets & set(candidates):
+                        for name in uses:
+                            users.setdefault(name, []).append(inst)
+
+            # the values with the same base and multiplier share
+            # an induction variable, the others add an offset to it
+            groups = {}
+            for name in families:
+                if name in candidates and name in users:
+                    base, mult, _ = candidates[name]
+                    groups.setdefault((base, mult), []).append(name)
+            reps = {key: min(names, key=lambda name: candidates[name][2] is not None)
+                    for key, names in groups.items()}
+
+            # a basic induction variable used only by its update and
+            # to compare with a loop invariant is replaced in the test
+            # by a reduced value with a positive multiplier (linear
+            # function test replacement), and its phi is removed.  The
+            # new bound a * bound + b is a value the program never
+            # computed, so the test is replaced only if the bound, the
+            # step and b are literals and the reduced value stays in
+            # the range of the ints until the loop ends
+            replaced = {}
+            for (base, mult), name in reps.items():
+                _, step, update = basics[base]
+                tests = [inst for inst in users.get(base, []) if inst[-1] != update]
+                if base in replaced or not isinstance(literals.get(mult), int) or literals[mult] <= 0 \
+                        or len(tests) != 1 or len(users.get(update, [])) != 1:
+                    continue
+                test = tests[0]
+                bound = test[2] if test[1] == base else test[1]
+                add = candidates[name][2]
+                values = [literals.get(bound), literals.get(step), 0 if add is None else literals.get(add)]
+                if not all(isinstance(value, int) for value in values):
+                    continue
+                last = literals[mult] * (values[0] + abs(values[1])) + values[2]
+                if test[0].split('_')[0] in self.comparison_ops - {'and', 'or'} and \
+                        test[-1] in defs and bound not in defs and INT_MIN <= last <= INT_MAX:
+                    replaced[base] = (mult, name, test, bound)
+
+            # each induction variable costs an add, and a store and
+            # a load per iteration when its phi is lowered, so the
+            # loop is changed only if it computes less per iteration
+            removed = [(block_lb, inst) for block_lb in loop.blocks for inst in func[block_lb].instructions
+                       if self.__get_use_def(inst)[1] & set(candidates)]
+            cost = sum(2 + len({candidates[name][2] for name in names}) for names in groups.values())
+            if not groups or cost > len(removed) + 3 * len(replaced):
+                del preheader.instructions[mark:]
+                preheader.instructions += code
+                continue
+
+            for block_lb in loop.blocks:
+                block = func[block_lb]
+                block.instructions = [inst for inst in block.instructions
+                                      if not self.__get_use_def(inst)[1] & set(candidates)]
+            reduced += len(removed)
+
+            header = func[loop.header]
+            renamed = {}
+            phis = []
+            offsets = []
+            updates = []
+            for (base, mult), names in groups.items():
+                name = reps[(base, mult)]
+                add = candidates[name][2]
+                init, step, _ = basics[base]
+                start = emit('mul_int', mult, init)
+                if add is not None:
+                    start = emit('add_int', start, add)
+                increment = emit('mul_int', mult, step)
+                label += 1
+                phis.append(('phi_int', [(start, loop.preheader), (f"%{label}", latch)], name))
+                updates.append(('add_int', name, increment, f"%{label}"))
+                created += 1
+
+                for other in names:
+                    other_add = candidates[other][2]
+                    if other == name:
+                        continue
+                    elif other_add == add:
+                        renamed[other] = name
                     else:
-                        constants[inst[-1]] = False
+                        delta = other_add if add is None else emit('sub_int', other_add, add)
+                        offsets.append(('add_int', name, delta, other))
+
+                # print if in debug mode
+                if debug:
+                    print(f"    {loop.header}: {names} = {base} * {mult} + ...")
+
+            for base, (mult, name, test, bound) in replaced.items():
+                new_bound = emit('mul_int', mult, bound)
+                if candidates[name][2] is not None:
+                    new_bound = emit('add_int', new_bound, candidates[name][2])
+                new_test = tuple(name if arg == base else new_bound if arg == bound else arg for arg in test)
+                update = basics[base][2]
+                for block_lb in loop.blocks:
+                    block = func[block_lb]
+                    block.instructions = [new_test if inst == test else inst for inst in block.instructions
+                                          if inst[-1] not in (base, update)]
+
+            preheader.instructions += code
+            header_pos = 1
+            while header_pos < len(header.instructions) and header.instructions[header_pos][0].startswith('phi'):
+                header_pos += 1
+            header.instructions[header_pos:header_pos] = phis + offsets
+            block = func[latch]
+            *_, (last_pos, last) = block_code(block)
+            if last[0].split('_')[0] not in terminators:
+                last_pos += 1
+            block.instructions[last_pos:last_pos] = updates
+
+            # the same values are computed by the same induction variable
+            if renamed:
+                for block in func.values():
+                    block.instructions = [(inst[0], [(renamed.get(value, value), pred_label)
+                                                     for value, pred_label in inst[1]], inst[2])
+                                          if inst[0].startswith('phi') else
+                                          tuple(renamed.get(arg, arg) if isinstance(arg, str) else arg
+                                                for arg in inst)
+                                          for inst in block.instructions]
+
+        self.stats.setdefault(func_name, {}).update(sr_reduced=reduced, sr_ivs=created)
 
         # print if in debug mode
         if debug:
-            print('=' * len('== Constant Propagation =='))
+            print('=' * len('== Strength Reduction =='))
+
+
+    def eliminate_phis(self, func, func_name, debug=False):
+        """
+            Function that lowers the phis of the function,
+            in SSA form, back to plain uCIR, see uc_ssa.from_ssa.
+
+            :param func: dict
+            :param func_name: str
+            :param debug: bool
+            :return: None
+        """
+        from_ssa(self.blocks_control, func_name)
 
 
     def eliminate_single_jumps(self, func, func_name, debug=False):
@@ -834,12 +1592,220 @@ class DataFlow():
         # remove block references
         for key in remove_from_func:
             del self.blocks_control.functions[func_name][key]
+        self.blocks_control.invalidate_order(func_name)
 
         # print if in debug mode
         if debug:
             print('=' * len("== Eliminate Single Jumps =="))
 
 
+    def __inline_call(self, func_name, block_lb, call_pos, params, callee_name, debug=False):
+        """
+            Replace a call of a block by a copy of the blocks of the
+            callee.  The temporaries and labels of the callee are
+            renamed to new ones of the caller, its vars get the number
+            of the call site as suffix and its args are replaced by
+            the values passed as params.  The returns store the value
+            in a var of the call, that is loaded to the target of the
+            call in a new block with the instructions after it.
+
+            :param func_name: str
+            :param block_lb: str
+            :param call_pos: int
+            :param params: list
+            :param callee_name: str
+            :param debug: bool
+            :return: None
+        """
+        func = self.blocks_control.functions[func_name]
+        callee = self.blocks_control.functions[callee_name]
+        block = func[block_lb]
+        call = block.instructions[call_pos]
+        uc_type = call[0].split('_')[1]
+        # the label of the block after the call also
+        # numbers the vars of the callee
+        site = last_temp(func) + 1
+        label = site
+        cont = f"%{site}"
+
+        # the args of the callee are the values of the params
+        names = {arg: block.instructions[param_pos][1]
+                 for (_, arg), param_pos in zip(callee['%entry'].instructions[1][2], params)}
+
+        def rename(name):
+            nonlocal label
+            if not isinstance(name, str) or not name.startswith('%'):
+                return name
+            if name not in names:
+                if re.match(r'%\d+$', name):
+                    label += 1
+                    names[name] = f"%{label}"
+                else:
+                    names[name] = f"{name}.{site}"
+            return names[name]
+
+        result = f"{call[2]}.ret"
+        allocs = [] if uc_type == 'void' else [(f"alloc_{uc_type}", result)]
+        blocks = []
+        for callee_lb, callee_block in callee.items():
+            instructions = []
+            for inst in callee_block.instructions:
+                opcode = inst[0].split('_')
+                if opcode[0] == 'return':
+                    if len(inst) > 1:
+                        instructions.append((f"store_{uc_type}", rename(inst[1]), result))
+                    instructions.append(('jump', cont))
+                elif callee_lb == '%entry' and (len(inst) == 1 or opcode[0] == 'define'):
+                    continue
+                elif len(inst) == 1:
+                    instructions.append((rename(f"%{inst[0]}")[1:],))
+                elif opcode[0] == 'literal':
+                    instructions.append((inst[0], inst[1], rename(inst[2])))
+                else:
+                    instructions.append(tuple(rename(arg) for arg in inst))
+            blocks.append(instructions)
+
+        # the code of the callee entry goes at the call, and
+        # the new blocks are placed after the block of the call
+        cont_block = Block(cont)
+        cont_block.instructions = [(cont[1:],)]
+        if uc_type != 'void':
+            cont_block.instructions.append((f"load_{uc_type}", result, call[2]))
+        cont_block.instructions += block.instructions[call_pos + 1:]
+        block.instructions = [inst for inst_pos, inst in enumerate(block.instructions[:call_pos])
+                              if inst_pos not in params] + blocks[0]
+
+        new_blocks = []
+        for instructions in blocks[1:]:
+            new_block = Block(f"%{instructions[0][0]}")
+            new_block.instructions = instructions
+            new_blocks.append(new_block)
+        new_blocks.append(cont_block)
+
+        old_blocks = list(func.items())
+        func.clear()
+        for label_name, old_block in old_blocks:
+            func[label_name] = old_block
+            if label_name == block_lb:
+                for new_block in new_blocks:
+                    func[new_block.label] = new_block
+        # the vars are allocated after the define
+        func['%entry'].instructions[2:2] = allocs
+
+        # print if in debug mode
+        if debug:
+            print(f"    {block_lb}: {call} -> {[new_block.label for new_block in new_blocks]}")
+
+
+    def inline_functions(self, debug=False):
+        """
+            Function that inlines the calls of the small functions,
+            with at most inline_budget instructions, that are not
+            recursive and have no local arrays.  The call graph is
+            visited from the callees to the callers, so the calls of
+            a callee are inlined before it's measured, and the
+            functions no longer used (called or named by a function
+            pointer) are removed.
+
+            :param debug: bool
+            :return: None
+        """
+        # print if in debug mode
+        if debug:
+            print()
+            print('== Inline Functions ==')
+
+        functions = self.blocks_control.functions
+        calls = {name: [inst[1][1:] for block in functions[name].values()
+                        for inst in block.instructions if inst[0].startswith('call')]
+                 for name in functions}
+
+        # the local arrays of a function are new (zeroed) at each
+        # call, an inlined copy would share them between the calls
+        arrays = {name for name in functions for block in functions[name].values()
+                  for inst in block.instructions
+                  if inst[0].startswith('alloc') and len(inst[0].split('_')) > 2}
+
+        # functions that can reach themselves
+        recursive = set()
+        for name in functions:
+            reached = set()
+            worklist = list(calls[name])
+            while worklist:
+                callee = worklist.pop()
+                if callee not in reached and callee in calls:
+                    reached.add(callee)
+                    worklist += calls[callee]
+            if name in reached:
+                recursive.add(name)
+
+        # postorder of the call graph
+        order = []
+        visited = set()
+        for name in functions:
+            stack = [(name, iter(calls[name]))]
+            visited.add(name)
+            while stack:
+                caller, callees = stack[-1]
+                for callee in callees:
+                    if callee not in visited and callee in calls:
+                        visited.add(callee)
+                        stack.append((callee, iter(calls[callee])))
+                        break
+                else:
+                    stack.pop()
+                    order.append(caller)
+
+        for func_name in order:
+            func = functions[func_name]
+            inlined = 0
+            labels = list(func)
+            block_pos = 0
+            while block_pos < len(labels):
+                block = func[labels[block_pos]]
+                params = []
+                for inst_pos, inst in enumerate(block.instructions):
+                    opcode = inst[0].split('_')
+                    if opcode[0] == 'param':
+                        params.append(inst_pos)
+                    elif opcode[0] == 'call':
+                        callee = inst[1][1:]
+                        size = sum(len(callee_block.instructions) for callee_block in functions[callee].values()) \
+                            if callee in functions else None
+                        if callee not in recursive and callee not in arrays and callee != 'main' and \
+                                size is not None and \
+                                size <= self.inline_budget and \
+                                len(params) == len(functions[callee]['%entry'].instructions[1][2]):
+                            self.__inline_call(func_name, labels[block_pos], inst_pos, params, callee, debug)
+                            inlined += 1
+                            labels = list(func)
+                            break
+                        params = []
+                    elif opcode[0] in terminators:
+                        break
+                block_pos += 1
+
+            if inlined:
+                self.blocks_control.relink_blocks(func_name)
+            self.stats.setdefault(func_name, {})['inlined'] = inlined
+
+        # remove the functions no longer used: called or with
+        # their address taken (stored in a function pointer)
+        used = {arg[1:] for func in functions.values() for block in func.values()
+                for inst in block.instructions if not inst[0].startswith('define')
+                for arg in inst[1:] if isinstance(arg, str) and arg.startswith('@')}
+        used |= {arg[1:] for inst in self.blocks_control.globals
+                 for arg in inst[2:] if isinstance(arg, str) and arg.startswith('@')}
+        for name in [name for name in functions if name != 'main' and name not in used]:
+            self.blocks_control.invalidate_order(name)
+            del functions[name]
+            self.stats.pop(name, None)
+
+        # print if in debug mode
+        if debug:
+            print('=' * len('== Inline Functions =='))
+
+
     def generate_opt_code(self):
         """
             Generate optimized code
@@ -876,15 +1842,27 @@ class DataFlow():
         """
         debug = False
 
+        # the calls are inlined before the passes of each function
+        if self.inline_budget > 0:
+            self.inline_functions(debug=False)
+
         for func in self.blocks_control.functions:
             self.all_blocks = self.blocks_control.create_block_list(func)
-            # make the reaching definitions analysis
-            self.compute_rd_in_out(self.blocks_control.functions[func], debug=False)
-            self.constant_propagation(self.blocks_control.functions[func], func,debug=False)
+            # the constant propagation works on the SSA
+            # form, it doesn't need the reaching definitions
+            self.constant_propagation(self.blocks_control.functions[func], func, debug=False)
+
+            # promote the scalar vars to temporaries, the passes
+            # between these two calls work on the SSA form
+            self.promote_variables(self.blocks_control.functions[func], func, debug=False)
+            self.value_numbering(self.blocks_control.functions[func], func, debug=False)
+            self.loop_invariant_code_motion(self.blocks_control.functions[func], func, debug=False)
+            self.strength_reduction(self.blocks_control.functions[func], func, debug=False)
+            self.eliminate_phis(self.blocks_control.functions[func], func, debug=False)
             self.all_blocks = self.blocks_control.create_block_list(func)
 
             # make the liveness analysis
-            self.compute_lv_in_out(self.blocks_control.functions[func], debug=False)
+            self.compute_lv_in_out(self.blocks_control.functions[func], func, debug=False)
             self.eliminate_unreachable_code(self.blocks_control.functions[func], debug=False)
             self.dead_code_elimination(self.blocks_control.functions[func], debug=False)
             self.eliminate_unnecessary_alloc(self.blocks_control.functions[func], debug=False)
@@ -7,7 +7,6 @@
 #                                                #
 # Authors: Marcio M Pereira - IC - MC921         #
 ##################################################
-from graphviz import Digraph
 
 
 def format_instruction(t):
@@ -53,20 +52,35 @@ class Label(object):
         self.lbl = {}
 
 
+# the sets of the analyses are bitsets (python int), see
+# uc_analysis.DataFlow for the numbering of the bits
 class ReachDefinitions(object):
     def __init__(self):
-        self.gen = set()
-        self.kill = set()
-        self.ins = set()
-        self.out = set()
+        self.gen = 0
+        self.kill = 0
+        self.ins = 0
+        self.out = 0
 
 
 class LiveVariable(object):
     def __init__(self):
-        self.use = set()
-        self.defs = set()
-        self.ins = set()
-        self.out = set()
+        self.use = 0
+        self.defs = 0
+        self.ins = 0
+        self.out = 0
+
+
+# a natural loop: the header dominates all blocks of the
+# loop and the latches are the sources of its back edges
+class Loop(object):
+    def __init__(self, header):
+        self.header = header
+        self.latches = []
+        self.blocks = {header}
+        self.parent = None
+        self.children = []
+        self.depth = 1
+        self.preheader = None
 
 
 class Block(object):
@@ -79,6 +93,9 @@ class Block(object):
         self.rd = ReachDefinitions()
         self.lv = LiveVariable()
         self.visited = False
+        # innermost natural loop of the block,
+        # see ControlBlocks.find_loops
+        self.loop = None
 
 
     def __iter__(self):
@@ -134,9 +151,18 @@ class CFG(object):
 
     def __init__(self, fname):
         self.fname = fname
-        self.g = Digraph('g', filename=fname + '.gv', node_attr={'shape': 'record'})
+        self._g = None
         self.labels = []
 
+    @property
+    def g(self):
+        # graphviz is imported only when the CFG is drawn,
+        # not when the CFG is just used for dfs_visit
+        if self._g is None:
+            from graphviz import Digraph
+            self._g = Digraph('g', filename=self.fname + '.gv', node_attr={'shape': 'record'})
+        return self._g
+
     def visit_Block(self, block):
         if block.visited is False:
             # Get the label as node name
@@ -5,7 +5,8 @@
 #                                                #
 # Authors: Luiz Cartolano && Erico Faustino      #
 ##################################################
-from uc_block import Block, ConditionBlock, CFG
+from uc_block import Block, ConditionBlock, CFG, Loop
+from uc_ssa import dominators
 
 
 class ControlBlocks():
@@ -20,6 +21,8 @@ class ControlBlocks():
         self.pre_blocks = dict()
         self.cfg_list = []
         self.non_opt_blocks = None
+        self.orders = dict()
+        self.loops = dict()
 
 
     def split_globals(self):
@@ -260,6 +263,68 @@ class ControlBlocks():
                         current_block.instructions.append(('jump', next_block.label))
 
 
+    def relink_blocks(self, func):
+        """
+            Link again the blocks of a function, after a pass
+            changed its jumps or removed blocks.  The successors
+            of a block are the targets of the jump/cbranch that
+            ends its executed code (the jumps after it are dead),
+            and a block is a ConditionBlock only if it ends with
+            a cbranch.
+
+            :param func: str
+            :return: None
+        """
+        func_blocks = self.functions[func]
+        block_labels_names = list(func_blocks.keys())
+
+        targets = {}
+        for counter, label in enumerate(block_labels_names):
+            block = func_blocks[label]
+            # get the first jump/cbranch/return
+            last = None
+            for code in block.instructions:
+                if code[0] in ('jump', 'cbranch') or code[0].startswith('return'):
+                    last = code
+                    break
+
+            if last is None:
+                # falls through to the next block
+                targets[label] = block_labels_names[counter + 1:counter + 2]
+            elif last[0] == 'jump':
+                targets[label] = [last[1]]
+            elif last[0] == 'cbranch':
+                targets[label] = [last[2], last[3]]
+            else:
+                targets[label] = []
+
+            # convert the block if its kind changed
+            if (last is not None and last[0] == 'cbranch') != isinstance(block, ConditionBlock):
+                new_block = ConditionBlock(label) if last[0] == 'cbranch' else Block(label)
+                new_block.instructions = block.instructions
+                new_block.rd = block.rd
+                new_block.lv = block.lv
+                func_blocks[label] = new_block
+
+        for label in block_labels_names:
+            block = func_blocks[label]
+            block.predecessors = []
+            block.successors = []
+            block.next_block = None
+
+        for label in block_labels_names:
+            block = func_blocks[label]
+            for target in targets[label]:
+                next_block = func_blocks[target]
+                block.successors.append(next_block)
+                next_block.predecessors.append(block)
+                block.next_block = next_block
+            if isinstance(block, ConditionBlock):
+                block.taken, block.fall_through = block.successors
+
+        self.invalidate_order(func)
+
+
     def create_block_list(self, func):
         """
             Create a list of blocks objects.
@@ -281,6 +346,140 @@ class ControlBlocks():
         return all_blocks
 
 
+    def postorder(self, func):
+        """
+            Labels of the blocks of a function in the postorder
+            of a DFS from the entry block (the blocks that can't
+            be reached are not in the list).  The order is cached
+            until the CFG of the function changes, see
+            invalidate_order.
+
+            :param func: str
+            :return: list
+        """
+        if func not in self.orders:
+            blocks = self.functions[func]
+            order = []
+            visited = {'%entry'}
+            # iterative DFS, so a long chain of blocks doesn't reach
+            # the recursion limit.  The successors are visited from
+            # the last one (the fall through of a loop condition is
+            # its exit), so in reverse postorder the body of a loop
+            # comes right after its header, before the loop exit
+            stack = [(blocks['%entry'], reversed(blocks['%entry'].successors))]
+            while stack:
+                block, successors = stack[-1]
+                for successor in successors:
+                    if successor.label not in visited and successor.label in blocks:
+                        visited.add(successor.label)
+                        stack.append((successor, reversed(successor.successors)))
+                        break
+                else:
+                    stack.pop()
+                    order.append(block.label)
+            self.orders[func] = order
+
+        return self.orders[func]
+
+
+    def reverse_postorder(self, func):
+        """
+            Labels of the blocks of a function in
+            reverse postorder, see postorder.
+
+            :param func: str
+            :return: list
+        """
+        return self.postorder(func)[::-1]
+
+
+    def find_loops(self, func):
+        """
+            Natural loops of a function.  An edge is a back edge
+            if its target (the header of the loop) dominates its
+            source (a latch), and the loop has the blocks that reach
+            a latch without passing by the header.  The loops with
+            the same header are merged.
+
+            The loops are nested in a forest (Loop.parent/children),
+            each block gets its innermost loop in block.loop and the
+            list has the inner loops first.  The preheader of a loop
+            is found if it already exists, see
+            DataFlow.loop_invariant_code_motion.  It's cached with the
+            order of the blocks, see invalidate_order.
+
+            :param func: str
+            :return: list
+        """
+        if func not in self.loops:
+            blocks = self.functions[func]
+            idom = dominators(self, func)
+
+            loops = {}
+            for label in self.reverse_postorder(func):
+                for successor in blocks[label].successors:
+                    # check if the successor dominates the block
+                    runner = label
+                    while runner not in (successor.label, '%entry'):
+                        runner = idom[runner]
+                    if runner != successor.label:
+                        continue
+
+                    loop = loops.setdefault(successor.label, Loop(successor.label))
+                    loop.latches.append(label)
+                    # walk back from the latch up to the header
+                    worklist = [label]
+                    while worklist:
+                        block_lb = worklist.pop()
+                        if block_lb not in loop.blocks:
+                            loop.blocks.add(block_lb)
+                            worklist += [pred.label for pred in blocks[block_lb].predecessors
+                                         if pred.label in idom]
+
+            # the parent of a loop is the smallest
+            # other loop that contains its header
+            by_size = sorted(loops.values(), key=lambda loop: len(loop.blocks))
+            for pos, loop in enumerate(by_size):
+                for outer in by_size[pos + 1:]:
+                    if loop.header in outer.blocks:
+                        loop.parent = outer
+                        outer.children.append(loop)
+                        break
+
+            # the preheader is the only block out of
+            # the loop that enters it, if it has no
+            # other successor
+            for loop in by_size:
+                outside = [pred for pred in blocks[loop.header].predecessors
+                           if pred.label in idom and pred.label not in loop.blocks]
+                if len(outside) == 1 and len(outside[0].successors) == 1:
+                    loop.preheader = outside[0].label
+
+            for block in blocks.values():
+                block.loop = None
+            for loop in reversed(by_size):
+                if loop.parent is not None:
+                    loop.depth = loop.parent.depth + 1
+                for block_lb in loop.blocks:
+                    blocks[block_lb].loop = loop
+
+            self.loops[func] = sorted(by_size, key=lambda loop: -loop.depth)
+
+        return self.loops[func]
+
+
+    def invalidate_order(self, func):
+        """
+            Drop the cached order (and loops) of the blocks of a
+            function, must be called by the passes that change its CFG.
+
+            :param func: str
+            :return: None
+        """
+        self.orders.pop(func, None)
+        self.loops.pop(func, None)
+
+
     def create_basic_blocks(self):
         """
             Function that controls the CFG creation.
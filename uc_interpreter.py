@@ -11,6 +11,201 @@
 # permitted but the source code must retain the above copyright notice.
 # ---------------------------------------------------------------------------------
 import sys
+from array import array
+from bisect import bisect_right
+
+
+class MemoryOverflow(Exception):
+    """ The program needs more memory cells than the memory limit. """
+    pass
+
+
+class Memory(list):
+    """
+    Memory for the global & local vars of the interpreter.  It is a flat
+    list of cells indexed by the absolute address of the vars, that
+    starts with size cells and grows on demand (doubling its size) up to
+    limit cells.  The interpreter reserves the cells before using them,
+    so a program that needs more than limit cells stops with a clear
+    MemoryOverflow instead of an IndexError in the middle of the run.
+
+    The arrays are stored in the cells of the stack, like any other var.
+    See TypedMemory for a memory with typed regions for the arrays.
+    """
+
+    def __init__(self, size=10000, limit=1 << 24):
+        super(Memory, self).__init__(min(size, limit) * [None])
+        self.limit = limit      # Max number of cells of the memory
+        self.heap_size = 0      # Number of cells in the typed regions
+
+    def _overflow(self):
+        raise MemoryOverflow("Memory overflow: the program needs more than %d cells." % self.limit)
+
+    def reserve(self, top):
+        # Make sure the cells below the address top exist
+        if top > len(self):
+            if top + self.heap_size > self.limit:
+                self._overflow()
+            _size = min(max(top, 2 * len(self)), self.limit - self.heap_size)
+            self.extend((_size - len(self)) * [None])
+
+    def alloc_array(self, size, uc_type):
+        # The plain memory doesn't have typed regions, so the
+        # interpreter allocates the arrays in the stack
+        return None
+
+    def mark(self):
+        return None
+
+    def release(self, mark):
+        pass
+
+
+class TypedMemory(Memory):
+    """
+    Memory where the int & float arrays are stored in typed regions,
+    array('q') & array('d'), instead of one boxed object per cell.  The
+    regions live in a separate address space, the heap, that starts at
+    the address HEAP and is handled as a stack of segments: the arrays
+    allocated by a function are released when it returns (see mark and
+    release).  The addresses under HEAP are list cells as in Memory.
+
+    Note that every access goes through __getitem__/__setitem__, so the
+    typed memory saves space for large data sets at the cost of time.  A
+    value that doesn't fit in its typed region (an int out of 64 bits)
+    turns the region into a list, like the cells of Memory.
+    """
+
+    HEAP = 1 << 48
+    typecodes = {'int': 'q', 'float': 'd'}
+
+    def __init__(self, size=10000, limit=1 << 24):
+        super(TypedMemory, self).__init__(size, limit)
+        self.bases = []         # Base address of each region
+        self.regions = []       # Typed array (or list) of each region
+
+    def _locate(self, address):
+        _idx = bisect_right(self.bases, address) - 1
+        return _idx, address - self.bases[_idx]
+
+    def _widen(self, idx):
+        # the region holds any value from now on
+        self.regions[idx] = self.regions[idx].tolist()
+        return self.regions[idx]
+
+    def __getitem__(self, address):
+        if isinstance(address, slice):
+            if address.start < self.HEAP:
+                return list.__getitem__(self, address)
+            _idx, _offset = self._locate(address.start)
+            return self.regions[_idx][_offset:_offset + address.stop - address.start]
+        if address < self.HEAP:
+            return list.__getitem__(self, address)
+        _idx, _offset = self._locate(address)
+        return self.regions[_idx][_offset]
+
+    def __setitem__(self, address, value):
+        if isinstance(address, slice):
+            if address.start < self.HEAP:
+                list.__setitem__(self, address, value)
+                return
+            _idx, _offset = self._locate(address.start)
+            _region = self.regions[_idx]
+            _end = _offset + address.stop - address.start
+            if isinstance(_region, list):
+                _region[_offset:_end] = list(value)
+                return
+            try:
+                _region[_offset:_end] = array(_region.typecode, value)
+            except OverflowError:
+                self._widen(_idx)[_offset:_end] = list(value)
+        elif address < self.HEAP:
+            list.__setitem__(self, address, value)
+        else:
+            _idx, _offset = self._locate(address)
+            try:
+                self.regions[_idx][_offset] = value
+            except OverflowError:
+                self._widen(_idx)[_offset] = value
+
+    def alloc_array(self, size, uc_type):
+        if uc_type not in self.typecodes:
+            return None
+        if len(self) + self.heap_size + size > self.limit:
+            self._overflow()
+        _address = self.HEAP + self.heap_size
+        self.bases.append(_address)
+        self.regions.append(array(self.typecodes[uc_type], bytes(8 * size)))
+        self.heap_size += size
+        return _address
+
+    def mark(self):
+        return len(self.regions)
+
+    def release(self, mark):
+        if mark < len(self.regions):
+            self.heap_size = self.bases[mark] - self.HEAP
+            del self.bases[mark:]
+            del self.regions[mark:]
+
+
+class InputReader(object):
+    """
+    Tokenized input of the read instructions.  The input is read in
+    chunks of chunk_size bytes (or is given at once as data) and split
+    in tokens, that are handed out by an index, so reading a token
+    doesn't copy the rest of the line.  A token cut at the end of a
+    chunk is kept until the next chunk is read.
+    """
+
+    def __init__(self, stream=None, data=None, chunk_size=1 << 16):
+        self.stream = stream    # Stream with the input, when data is not given
+        self.chunk_size = chunk_size
+        self.tokens = []        # Tokens of the last chunk read
+        self.index = 0          # Index of the next token
+        self.partial = b''      # Token cut at the end of the last chunk
+        self.given = data is not None   # All the input was given as data
+        if self.given:
+            if isinstance(data, str):
+                data = data.encode()
+            self.tokens = data.split()
+
+    def empty(self):
+        # there are no more tokens without reading the stream
+        return self.index >= len(self.tokens)
+
+    def _read_chunk(self):
+        if self.given:
+            return b''
+        stream = self.stream if self.stream is not None else sys.stdin
+        stream = getattr(stream, 'buffer', stream)
+        if hasattr(stream, 'read1'):
+            # read1 returns what is available (a line, in a terminal)
+            # instead of waiting for the whole chunk
+            chunk = stream.read1(self.chunk_size)
+        else:
+            chunk = stream.read(self.chunk_size)
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        return chunk
+
+    def next_token(self):
+        while self.index >= len(self.tokens):
+            chunk = self._read_chunk()
+            if not chunk:
+                if not self.partial:
+                    raise EOFError("Unexpected end of input file.")
+                self.tokens = [self.partial]
+                self.partial = b''
+            else:
+                chunk = self.partial + chunk
+                self.tokens = chunk.split()
+                self.partial = b''
+                if self.tokens and not chunk[-1:].isspace():
+                    self.partial = self.tokens.pop()
+            self.index = 0
+        self.index += 1
+        return self.tokens[self.index - 1].decode()
 
 
 class Interpreter(object):
@@ -40,18 +235,21 @@ class Interpreter(object):
            code as a parameter
     """
 
-    def __init__(self):
-        global inputline, M
-        inputline = []
-        M = 10000 * [None]      # Memory for global & local vars
+    def __init__(self, memory=None, interactive=False, buffer_size=1 << 16, input_data=None,
+                 stdin=None, stdout=None):
+        self.M = memory if memory is not None else Memory()  # Memory for global & local vars
 
         self.globals = {}       # Dictionary of address of global vars & constants
         self.vars = {}          # Dictionary of address of local vars relative to sp
+        self.labels = {}        # Dictionary of pc of labels of the current function
+        self.function_labels = {}   # Dictionary of the labels of each function
 
         self.offset = 0         # offset (index) of local & global vars. Note that
                                 # each instance of var has absolute address in Memory
         self.stack = []         # Stack to save address of vars between calls
+        self.label_stack = []   # Stack to save the labels of the caller
         self.sp = []            # Stack to save & restore the last offset
+        self.heap_marks = []    # Stack to release the arrays allocated in the callee
 
         self.params = []        # List of parameters from caller (address)
         self.result = None      # Result Value (address) from the callee
@@ -63,6 +261,14 @@ class Interpreter(object):
         self.start = 0          # PC of the main function
         self.code = None
 
+        self.output = []        # Buffer of the text printed by the program
+        self.output_size = 0    # Number of chars in the output buffer
+        self.buffer_size = buffer_size  # Flush the output buffer when it passes this size
+        self.interactive = interactive  # Flush the output at each print, as a terminal
+        self.input = InputReader(stdin, input_data)     # Tokens of the read instructions
+        self.stdout = stdout if stdout is not None else sys.stdout  # Stream of the output
+        self.exit_code = 0      # Value returned by the main function
+
     def _extract_operation(self, source):
         _modifier = {}
         _aux = source.split('_')
@@ -78,6 +284,36 @@ class Interpreter(object):
             _opcode = _aux[0]
         return (_opcode, _modifier)
 
+    def _extract_modifier(self, modifier):
+        # Fold the dimension & pointer modifiers into the total size of
+        # the data (product of the dimensions) and the reference level.
+        _dim = 1
+        _ref = 0
+        for _val in modifier.values():
+            if _val.isdigit():
+                _dim *= int(_val)
+            elif _val == '*':
+                _ref += 1
+        return (_dim, _ref)
+
+    def _decode(self, op):
+        # Decode an instruction tuple into a (handler, args) pair.  This is
+        # done once, at load time, so the run loop doesn't need to split the
+        # opcode and look up the run_ method for every executed instruction.
+        if len(op) == 1 and op[0] != 'return_void':
+            # labels are just jump targets, there is nothing to execute
+            return (self._run_nop, ())
+        opcode, modifier = self._extract_operation(op[0])
+        if not hasattr(self, "run_" + opcode):
+            return (self._run_missing, (opcode,))
+        if not modifier:
+            return (getattr(self, "run_" + opcode), op[1:])
+        return (getattr(self, "run_" + opcode + '_'),
+                op[1:] + self._extract_modifier(modifier))
+
+    def _decode_program(self, ircode):
+        return [self._decode(op) for op in ircode]
+
     def _copy_data(self, address, size, value):
         if isinstance(value, str):
             _value = list(value)
@@ -85,90 +321,96 @@ class Interpreter(object):
             _value = [item for sublist in value for item in sublist]
         else:
             _value = value
-        M[address:address+size] = _value
+        self.M[address:address+size] = _value
 
     def run(self, ircode):
         """
         Run intermediate code in the interpreter.  ircode is a list
         of instruction tuples.  Each instruction (opcode, *args) is
-        dispatched to a method self.run_opcode(*args)
+        decoded once into a bound method self.run_opcode and its
+        arguments, and then dispatched as handler(*args).  Returns
+        the exit code of the program, the value returned by main.
         """
 
-        # First, store the global vars & constants
-        # Also, set the start pc to the main function entry
+        # First, store the global vars & constants and the labels of each
+        # function, decode every instruction and set the start pc to the
+        # main function entry
         self.code = ircode
         self.pc = 0
         self.offset = 0
+        _labels = {}
         while True:
             try:
                 op = ircode[self.pc]
             except IndexError:
                 break
-            if len(op) > 1:  # that is, not label
+            if len(op) == 1:
+                if op[0] != 'return_void':
+                    # labels don't go to memory, just store the pc on dictionary
+                    # labels appears as name:, so we need to extract just the name
+                    _labels['%' + op[0]] = self.pc + 1
+            else:
                 opcode, modifier = self._extract_operation(op[0])
                 if opcode.startswith('global'):
-                    self.globals[op[1]] = self.offset
-                    # get the size of global var
-                    if not modifier:
-                        # size equals 1 or is a constant, so we use only
-                        # one slot in the memory to make it simple.
-                        if len(op) == 3:
-                            M[self.offset] = op[2]
-                        self.offset += 1
-                    else:
-                        _len = 1
-                        for args in modifier.values():
-                            if args.isdigit():
-                                _len *= int(args)
-                        if len(op) == 3:
-                            self._copy_data(self.offset, _len, op[2])
-                        self.offset += _len
+                    self._alloc_global(op, opcode, modifier)
                 elif opcode.startswith('define'):
+                        self.M.reserve(self.offset + 1)
                         self.globals[op[1]] = self.offset
-                        M[self.offset] = self.pc
+                        self.M[self.offset] = self.pc
                         self.offset += 1
                         if op[1] == '@main':
                             self.start = self.pc
+                        # the labels are computed once per function and
+                        # shared by all of its calls
+                        _labels = {}
+                        self.function_labels[op[1]] = _labels
             self.pc += 1
+        self.program = self._decode_program(ircode)
 
         # Now, running the program starting from the main function
+        program = self.program
         self.pc = self.start
-        while True:
-            try:
-                op = ircode[self.pc]
-            except IndexError:
-                break
-            self.pc += 1
-            if len(op) > 1 or op[0] == 'return_void':
-                opcode, modifier = self._extract_operation(op[0])
-                if hasattr(self, "run_" + opcode):
-                    if not modifier:
-                        getattr(self, "run_" + opcode)(*op[1:])
-                    else:
-                        getattr(self, "run_" + opcode + '_')(*op[1:], **modifier)
-                else:
-                    print("Warning: No run_" + opcode + "() method", flush=True)
+        try:
+            while True:
+                try:
+                    handler, args = program[self.pc]
+                except IndexError:
+                    break
+                self.pc += 1
+                handler(*args)
+        finally:
+            # the program output must be written even when it stops
+            # on an error or exits from the main function
+            self._flush()
+        return self.exit_code
 
     #
     # Auxiliary methods
     #
-    def _alloc_labels(self):
-        # Alloc labels for current function definition. Due to the uCIR and due to
-        # the chosen memory model, this is done every time we enter a function.
-        _lpc = self.pc
-        while True:
-            try:
-                _op = self.code[_lpc]
-                _opcode = _op[0]
-                _lpc += 1
-                if _opcode.startswith('define'):
-                    break
-                elif len(_op) == 1 and _opcode != 'return_void':
-                    # labels don't go to memory, just store the pc on dictionary
-                    # labels appears as name:, so we need to extract just the name
-                    self.vars['%' + _opcode] = _lpc
-            except IndexError:
-                break
+    def _alloc_global(self, op, opcode, modifier):
+        # Alloc space in memory for a global var or constant, and
+        # save its address in the dictionary of globals
+        self.globals[op[1]] = self.offset
+        # get the size of global var
+        if not modifier:
+            # size equals 1 or is a constant, so we use only
+            # one slot in the memory to make it simple.
+            self.M.reserve(self.offset + 1)
+            if len(op) == 3:
+                self.M[self.offset] = op[2]
+            self.offset += 1
+        else:
+            _len, _ref = self._extract_modifier(modifier)
+            _address = None
+            if _ref == 0:
+                _address = self.M.alloc_array(_len, opcode.split('_')[1])
+            if _address is None:
+                _address = self.offset
+                self.offset += _len
+                self.M.reserve(self.offset)
+            self.globals[op[1]] = _address
+            if len(op) == 3:
+                self._copy_data(_address, _len, op[2])
 
     def _alloc_reg(self, target):
         # Alloc space in memory and save the offset in the dictionary
@@ -176,6 +418,18 @@ class Interpreter(object):
         if target not in self.vars:
             self.vars[target] = self.offset
             self.offset += 1
+            self.M.reserve(self.offset)
+
+    def _alloc_array(self, varname, dim, uc_type):
+        # Alloc the array in a typed region of the memory, if it has
+        # them, or else in the stack like the other vars.
+        _address = self.M.alloc_array(dim, uc_type)
+        if _address is None:
+            _address = self.offset
+            self.offset += dim
+            self.M.reserve(self.offset)
+            self.M[_address:_address + dim] = dim * [0]
+        self.vars[varname] = _address
 
     def _get_address(self, source):
         if source.startswith('@'):
@@ -183,109 +437,132 @@ class Interpreter(object):
         else:
             return self.vars[source]
 
+    def _flush(self):
+        # write the buffered output of the program
+        if self.output:
+            self.stdout.write("".join(self.output))
+            self.output = []
+            self.output_size = 0
+        self.stdout.flush()
+
     def _get_input(self):
-        global inputline
-        while True:
-            if len(inputline) > 0:
-                break
-            inputline = sys.stdin.readline()
-            if not inputline:
-                print("Unexpected end of input file.", flush=True)
-            inputline = inputline[:-1].strip().split()
+        if self.input.empty():
+            # the prompts printed by the program must be shown before it waits for the input
+            self._flush()
+        return self.input.next_token()
 
     def _get_value(self, source):
         if source.startswith('@'):
-            return M[self.globals[source]]
+            return self.M[self.globals[source]]
         else:
-            return M[self.vars[source]]
+            return self.M[self.vars[source]]
 
     def _load_multiple_values(self, size, varname, target):
         self.vars[target] = self.offset
         self.offset += size
+        self.M.reserve(self.offset)
         self._store_multiple_values(size, target, varname)
 
     def _push(self, locs):
-        # save the addresses of the vars from caller & their last offset
+        # save the addresses of the vars & labels from caller & their last offset
         self.stack.append(self.vars)
+        self.label_stack.append(self.labels)
         self.sp.append(self.offset)
+        self.heap_marks.append(self.M.mark())
 
         # clear the dictionary of caller local vars and their offsets in memory
         # and copy the parameters passed to the callee in their local vars.
         # Finally, cleanup the parameters list used to transfer these vars
         self.vars = {}
+        self.M.reserve(self.offset + len(self.params))
         for idx, val in enumerate(self.params):
             # Note that arrays (size >=1) are passed by reference only.
             self.vars[locs[idx]] = self.offset
-            M[self.offset] = M[val]
+            self.M[self.offset] = self.M[val]
             self.offset += 1
         self.params = []
-        self._alloc_labels()
 
     def _pop(self, target):
         if self.returns:
-            # get the return value
-            _value = M[target]
-            # restore the vars of the caller
+            # get the return value (None if the function returns void)
+            _value = self.M[target] if target is not None else None
+            # restore the vars & labels of the caller
             self.vars = self.stack.pop()
+            self.labels = self.label_stack.pop()
             # store in the caller return register the _value
-            M[self.vars[self.registers.pop()]] = _value
-            # restore the last offset from the caller
+            _register = self.registers.pop()
+            if target is not None:
+                self.M[self.vars[_register]] = _value
+            # restore the last offset from the caller and release
+            # the arrays allocated by the callee
             self.offset = self.sp.pop()
+            self.M.release(self.heap_marks.pop())
             # jump to the return point in the caller
             self.pc = self.returns.pop()
         else:
-            # We reach the end of main function, so return to system
+            # We reach the end of main function, so stop the program
             # with the code returned by main in the return register.
-            print(end="", flush=True)
             if target is None:
                 # void main () was defined, so exit with value 0
-                sys.exit(0)
+                self.exit_code = 0
             else:
-                sys.exit(M[target])
+                self.exit_code = self.M[target]
+            self.pc = len(self.program)
+
+    def _run_missing(self, opcode):
+        self._write("Warning: No run_" + opcode + "() method\n")
+
+    def _run_nop(self):
+        pass
 
     def _store_deref(self, target, value):
         if target.startswith('@'):
-            M[M[self.globals[target]]] = value
+            self.M[self.M[self.globals[target]]] = value
         else:
-            M[M[self.vars[target]]] = value
+            self.M[self.M[self.vars[target]]] = value
 
     def _store_multiple_values(self, dim, target, value):
         _left = self._get_address(target)
         _right = self._get_address(value)
         if value.startswith('@'):
-            if isinstance(M[_right], str):
-                _value = list(M[_right])
-                M[_left:_left+dim] = _value
+            if isinstance(self.M[_right], str):
+                _value = list(self.M[_right])
+                self.M[_left:_left+dim] = _value
                 return
-        M[_left:_left+dim] = M[_right:_right+dim]
+        self.M[_left:_left+dim] = self.M[_right:_right+dim]
 
     def _store_value(self, target, value):
         if target.startswith('@'):
-            M[self.globals[target]] = value
+            self.M[self.globals[target]] = value
         else:
-            M[self.vars[target]] = value
+            self.M[self.vars[target]] = value
+
+    def _write(self, text):
+        # append the text to the output buffer, that is written
+        # at the end of the program, before a read or when it's full
+        self.output.append(text)
+        self.output_size += len(text)
+        if self.interactive or self.output_size > self.buffer_size:
+            self._flush()
 
     #
     # Run Operations, except Binary, Relational & Cast
     #
     def run_alloc_int(self, varname):
         self._alloc_reg(varname)
-        M[self.vars[varname]] = 0
+        self.M[self.vars[varname]] = 0
 
     run_alloc_float = run_alloc_int
     run_alloc_char = run_alloc_int
 
-    def run_alloc_int_(self, varname, **kwargs):
-        _dim = 1
-        for arg in kwargs.values():
-            if arg.isdigit():
-                _dim *= int(arg)
-        self.vars[varname] = self.offset
-        M[self.offset:self.offset + _dim] = _dim * [0]
-        self.offset += _dim
+    def run_alloc_int_(self, varname, _dim, _ref):
+        self._alloc_array(varname, _dim, 'int')
 
-    run_alloc_float_ = run_alloc_int_
-    run_alloc_char_ = run_alloc_int_
+    def run_alloc_float_(self, varname, _dim, _ref):
+        self._alloc_array(varname, _dim, 'float')
+
+    def run_alloc_char_(self, varname, _dim, _ref):
+        self._alloc_array(varname, _dim, 'char')
 
     def run_call(self, source, target):
         # alloc register to return and append it to register stack
@@ -295,15 +572,15 @@ class Interpreter(object):
         self.returns.append(self.pc)
         # jump to the calle function
         if source.startswith('@'):
-            self.pc = M[self.globals[source]]
+            self.pc = self.M[self.globals[source]]
         else:
-            self.pc = M[self.vars[source]]
+            self.pc = self.M[self.vars[source]]
 
     def run_cbranch(self, expr_test, true_target, false_target):
-        if M[self.vars[expr_test]]:
-            self.pc = self.vars[true_target]
+        if self.M[self.vars[expr_test]]:
+            self.pc = self.labels[true_target]
         else:
-            self.pc = self.vars[false_target]
+            self.pc = self.labels[false_target]
 
     # Enter the function
     def run_define(self, source, args):
@@ -311,12 +588,12 @@ class Interpreter(object):
             # alloc register to the return value but not initialize it.
             # We use the "None" value to check if main function returns void.
             self._alloc_reg('%0')
-            # alloc the labels with respective pc's
-            self._alloc_labels()
         else:
             # extract the location names of function args
             _locs = [el[1] for el in args]
             self._push(_locs)
+        # the labels with respective pc's were computed in the first pass
+        self.labels = self.function_labels[source]
 
     def run_elem_int(self, source, index, target):
         self._alloc_reg(target)
@@ -332,20 +609,20 @@ class Interpreter(object):
         # We never generate this code without * (ref) but we need to define it
         pass
 
-    def run_get_int_(self, source, target, **kwargs):
-        # kwargs always contain * (ref), so we ignore it.
+    def run_get_int_(self, source, target, _dim, _ref):
+        # the modifier is always * (ref), so we ignore it.
         self._store_value(target, self._get_address(source))
 
     run_get_float_ = run_get_int_
     run_get_char_ = run_get_int_
 
     def run_jump(self, target):
-        self.pc = self.vars[target]
+        self.pc = self.labels[target]
 
     # load literals into registers
     def run_literal_int(self, value, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = value
+        self.M[self.vars[target]] = value
 
     run_literal_float = run_literal_int
     run_literal_char = run_literal_int
@@ -353,25 +630,18 @@ class Interpreter(object):
     # Load/stores
     def run_load_int(self, varname, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = self._get_value(varname)
+        self.M[self.vars[target]] = self._get_value(varname)
 
     run_load_float = run_load_int
     run_load_char = run_load_int
     run_load_bool = run_load_int
 
-    def run_load_int_(self, varname, target, **kwargs):
-        _ref = 0
-        _dim = 1
-        for arg in kwargs.values():
-            if arg.isdigit():
-                _dim *= int(arg)
-            elif arg == '*':
-                _ref += 1
+    def run_load_int_(self, varname, target, _dim, _ref):
         if _ref == 0:
             self._load_multiple_values(_dim, varname, target)
         elif _dim == 1 and _ref == 1:
             self._alloc_reg(target)
-            M[self.vars[target]] = M[self._get_value(varname)]
+            self.M[self.vars[target]] = self.M[self._get_value(varname)]
 
     run_load_float_ = run_load_int_
     run_load_char_ = run_load_int_
@@ -382,78 +652,74 @@ class Interpreter(object):
     run_param_float = run_param_int
     run_param_char = run_param_int
 
+    def _print(self, value):
+        self._write(str(value))
+
+    def _print_string(self, value):
+        self._write("".join(str(c) for c in value))
+
+    def _print_void(self):
+        self._write("\n")
+
     def run_print_string(self, source):
-        _res = list(self._get_value((source)))
-        for c in _res:
-            print(c, end="", flush=True)
+        self._print_string(self._get_value(source))
 
     def run_print_int(self, source):
-        print(self._get_value(source), end="", flush=True)
+        self._print(self._get_value(source))
 
     run_print_float = run_print_int
     run_print_char = run_print_int
     run_print_bool = run_print_int
 
-    def run_print_void(self):
-        print(end="\n", flush=True)
+    def run_print_void(self, *args):
+        # the code generator emits print_void with an empty operand
+        self._print_void()
 
     def _read_int(self):
-        global inputline
-        self._get_input()
+        v1 = self._get_input()
         try:
-            v1 = inputline[0]
-            inputline = inputline[1:]
-            try:
-                v2 = int(v1)
-            except:
-                v2 = v1
-        except:
-            print("Illegal input value.", flush=True)
+            v2 = int(v1)
+        except ValueError:
+            v2 = v1
         return v2
 
     def run_read_int(self, source):
+        self._alloc_reg(source)
         _value = self._read_int()
         self._store_value(source, _value)
 
-    def run_read_int_(self, source, **kwargs):
+    def run_read_int_(self, source, _dim, _ref):
         _value = self._read_int()
         self._store_deref(source, _value)
 
     def _read_float(self):
-        global inputline
-        self._get_input()
+        v1 = self._get_input()
         try:
-            v1 = inputline[0]
-            inputline = inputline[1:]
-            try:
-                v2 = float(v1)
-            except:
-                v2 = v1
-        except:
-            print("Illegal input value.", flush=True)
+            v2 = float(v1)
+        except ValueError:
+            v2 = v1
         return v2
 
     def run_read_float(self, source):
+        self._alloc_reg(source)
         _value = self._read_float()
         self._store_value(source, _value)
 
-    def run_read_float_(self, source, **kwargs):
+    def run_read_float_(self, source, _dim, _ref):
         _value = self._read_float()
         self._store_deref(source, _value)
 
+    def _read_char(self):
+        return self._get_input()
+
     def run_read_char(self, source):
-        global inputline
-        self._get_input()
-        v1 = inputline[0]
-        inputline = inputline[1:]
-        self._store_value(source, v1)
-
-    def run_read_char_(self, source, **kwargs):
-        global inputline
-        self._get_input()
-        v1 = inputline[0]
-        inputline = inputline[1:]
-        self._store_deref(source, v1)
+        self._alloc_reg(source)
+        _value = self._read_char()
+        self._store_value(source, _value)
+
+    def run_read_char_(self, source, _dim, _ref):
+        _value = self._read_char()
+        self._store_deref(source, _value)
 
     def run_return_int(self, target):
         self._pop(self.vars[target])
@@ -462,7 +728,7 @@ class Interpreter(object):
     run_return_char = run_return_int
 
     def run_return_void(self):
-        self._pop(M[self.vars['%0']])
+        self._pop(None)
 
     def run_store_int(self, source, target):
         self._store_value(target, self._get_value(source))
@@ -471,14 +737,7 @@ class Interpreter(object):
     run_store_char = run_store_int
     run_store_bool = run_store_int
 
-    def run_store_int_(self, source, target, **kwargs):
-        _ref = 0
-        _dim = 1
-        for arg in kwargs.values():
-            if arg.isdigit():
-                _dim *= int(arg)
-            elif arg == '*':
-                _ref += 1
+    def run_store_int_(self, source, target, _dim, _ref):
         if _ref == 0:
             self._store_multiple_values(_dim, target, source)
         elif _dim == 1 and _ref == 1:
@@ -492,27 +751,27 @@ class Interpreter(object):
     #
     def run_add_int(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] + M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] + self.M[self.vars[right]]
 
     def run_sub_int(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] - M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] - self.M[self.vars[right]]
 
     def run_mul_int(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] * M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] * self.M[self.vars[right]]
 
     def run_mod_int(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] % M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] % self.M[self.vars[right]]
 
     def run_div_int(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] // M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] // self.M[self.vars[right]]
 
     def run_div_float(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] / M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] / self.M[self.vars[right]]
 
     # Floating point ops (same as int)
     run_add_float = run_add_int
@@ -522,27 +781,27 @@ class Interpreter(object):
     # Integer comparisons
     def run_lt_int(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] < M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] < self.M[self.vars[right]]
 
     def run_le_int(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] <= M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] <= self.M[self.vars[right]]
 
     def run_gt_int(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] > M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] > self.M[self.vars[right]]
 
     def run_ge_int(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] >= M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] >= self.M[self.vars[right]]
 
     def run_eq_int(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] == M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] == self.M[self.vars[right]]
 
     def run_ne_int(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] != M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] != self.M[self.vars[right]]
 
     # Float comparisons
     run_lt_float = run_lt_int
@@ -566,20 +825,386 @@ class Interpreter(object):
 
     def run_and_bool(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] and M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] and self.M[self.vars[right]]
 
     def run_or_bool(self, left, right, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] or M[self.vars[right]]
+        self.M[self.vars[target]] = self.M[self.vars[left]] or self.M[self.vars[right]]
 
     def run_not_bool(self, source, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = not self._get_value(source)
+        self.M[self.vars[target]] = not self._get_value(source)
 
     def run_sitofp(self, source, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = float(self._get_value(source))
+        self.M[self.vars[target]] = float(self._get_value(source))
 
     def run_fptosi(self, source, target):
         self._alloc_reg(target)
-        M[self.vars[target]] = int(self._get_value(source))
+        self.M[self.vars[target]] = int(self._get_value(source))
+
+
+class FrameInterpreter(Interpreter):
+    """
+    Runs the uC intermediate code like the Interpreter, but the names
+    used by each function (temporaries, locals and args, such as '%1'
+    or '%x') are numbered once, at load time, into slots relative to
+    the frame pointer, the globals ('@g') are resolved to their absolute
+    addresses and the labels to the pc they jump to.  So the code:
+
+         ('literal_int', 1, '%1'),
+         ('add_int', '%1', '%1', '%2'),
+         ('store_int', '%2', '@g'),
+
+    is decoded and executed as:
+
+             self.run_literal_int(1, 0)
+             self.run_add_int(0, 0, 1)
+             self.run_store_int(1, ~address_of_g)
+
+    where the handlers index the memory directly, as self.M[self.fp + slot],
+    instead of going through the self.vars dictionary.  Local slots are
+    non negative and globals are encoded as the (negative) ~address,
+    so the operands that may be a global are resolved by _get_address.
+    Binary & relational operands are always temporaries in the uCIR.
+    The local arrays are stored in the frame, so only the global arrays
+    use the typed regions of a TypedMemory.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(FrameInterpreter, self).__init__(*args, **kwargs)
+        self.fp = 0             # Frame pointer (address of the slot 0)
+        self.slots = {}         # Slots of the names of the function being decoded
+        self.frame_size = 0     # Number of slots of the function being decoded
+
+    def _decode_program(self, ircode):
+        program = []
+        for pc, op in enumerate(ircode):
+            if op[0].startswith('define'):
+                self._frame_layout(ircode, pc)
+            program.append(self._decode(op))
+        return program
+
+    def _decode(self, op):
+        if len(op) == 1 and op[0] != 'return_void':
+            return (self._run_nop, ())
+        opcode, modifier = self._extract_operation(op[0])
+        if not hasattr(self, "run_" + opcode):
+            return (self._run_missing, (opcode,))
+        if opcode == 'define':
+            # the frame size, the slots of the args and the constants
+            _args = (self.frame_size,
+                     tuple(self.slots[el[1]] for el in op[2]),
+                     tuple((_slot, _name) for _name, _slot in self.slots.items()
+                           if not isinstance(_name, str)))
+        elif opcode == 'jump':
+            _args = (self.labels[op[1]],)
+        elif opcode == 'cbranch':
+            _args = (self.slots[op[1]], self.labels[op[2]], self.labels[op[3]])
+        elif opcode.startswith('literal'):
+            _args = (op[1], self.slots[op[2]])
+        else:
+            _args = tuple(self._resolve(_name) for _name in op[1:])
+        if not modifier:
+            return (getattr(self, "run_" + opcode), _args)
+        return (getattr(self, "run_" + opcode + '_'),
+                _args + self._extract_modifier(modifier))
+
+    def _frame_layout(self, ircode, start):
+        # Number the names used by the function defined at ircode[start]
+        # into frame slots, args first.  Arrays take as many slots as
+        # their size.  The labels were mapped in the first pass of run.
+        _sizes = {}
+        self.labels = self.function_labels[ircode[start][1]]
+        for _, _loc in ircode[start][2]:
+            _sizes[_loc] = 1
+        for _pc in range(start + 1, len(ircode)):
+            op = ircode[_pc]
+            if op[0].startswith('define'):
+                break
+            elif len(op) == 1:
+                continue
+            opcode, modifier = self._extract_operation(op[0])
+            if opcode == 'jump':
+                continue
+            elif opcode == 'cbranch':
+                _names = op[1:2]
+            elif opcode.startswith('literal'):
+                _names = op[2:]
+            else:
+                _names = op[1:]
+            for _name in _names:
+                if not (isinstance(_name, str) and _name.startswith('@')):
+                    _sizes.setdefault(_name, 1)
+            if modifier and opcode.startswith(('alloc', 'load')):
+                _dim, _ref = self._extract_modifier(modifier)
+                if _ref == 0:
+                    _sizes[op[-1]] = max(_sizes[op[-1]], _dim)
+        self.slots = {}
+        self.frame_size = 0
+        for _name, _size in _sizes.items():
+            self.slots[_name] = self.frame_size
+            self.frame_size += _size
+
+    def _resolve(self, name):
+        if isinstance(name, str) and name.startswith('@'):
+            return ~self.globals[name]
+        return self.slots[name]
+
+    #
+    # Auxiliary methods
+    #
+    def _get_address(self, source):
+        if source >= 0:
+            return self.fp + source
+        return ~source
+
+    def _get_value(self, source):
+        if source >= 0:
+            return self.M[self.fp + source]
+        return self.M[~source]
+
+    def _load_multiple_values(self, size, varname, target):
+        self._store_multiple_values(size, target, varname)
+
+    def _pop(self, target):
+        if self.returns:
+            # get the return value and restore the frame of the caller
+            _register = self.registers.pop()
+            if target is not None:
+                self.M[_register] = self.M[target]
+            self.fp = self.stack.pop()
+            self.offset = self.sp.pop()
+            self.pc = self.returns.pop()
+        else:
+            # We reach the end of main function, so stop the program
+            # with the code returned by main in the return register.
+            if target is None:
+                self.exit_code = 0
+            else:
+                self.exit_code = self.M[target]
+            self.pc = len(self.program)
+
+    def _store_deref(self, target, value):
+        self.M[self.M[self._get_address(target)]] = value
+
+    def _store_multiple_values(self, dim, target, value):
+        _left = self._get_address(target)
+        _right = self._get_address(value)
+        if value < 0 and isinstance(self.M[_right], str):
+            self.M[_left:_left+dim] = list(self.M[_right])
+        else:
+            self.M[_left:_left+dim] = self.M[_right:_right+dim]
+
+    def _store_value(self, target, value):
+        if target >= 0:
+            self.M[self.fp + target] = value
+        else:
+            self.M[~target] = value
+
+    #
+    # Run Operations, except Binary, Relational & Cast
+    #
+    def run_alloc_int(self, varname):
+        self.M[self.fp + varname] = 0
+
+    run_alloc_float = run_alloc_int
+    run_alloc_char = run_alloc_int
+
+    def run_alloc_int_(self, varname, _dim, _ref):
+        _address = self.fp + varname
+        self.M[_address:_address + _dim] = _dim * [0]
+
+    run_alloc_float_ = run_alloc_int_
+    run_alloc_char_ = run_alloc_int_
+
+    def run_call(self, source, target):
+        # save the return register and the return pc, then
+        # jump to the callee function
+        self.registers.append(self.fp + target)
+        self.returns.append(self.pc)
+        self.pc = self._get_value(source)
+
+    def run_cbranch(self, expr_test, true_target, false_target):
+        if self.M[self.fp + expr_test]:
+            self.pc = true_target
+        else:
+            self.pc = false_target
+
+    # Enter the function
+    def run_define(self, size, locs, consts):
+        # save the frame of the caller and alloc the frame of the
+        # callee on the top of it, then copy the parameters passed
+        # to the callee and the constants used by it in their slots
+        self.stack.append(self.fp)
+        self.sp.append(self.offset)
+        self.fp = _fp = self.offset
+        self.offset += size
+        self.M.reserve(self.offset)
+        for idx, val in enumerate(self.params):
+            self.M[_fp + locs[idx]] = self.M[val]
+        self.params = []
+        for _slot, _value in consts:
+            self.M[_fp + _slot] = _value
+
+    def run_elem_int(self, source, index, target):
+        self.M[self.fp + target] = self._get_address(source) + self.M[self.fp + index]
+
+    run_elem_float = run_elem_int
+    run_elem_char = run_elem_int
+
+    def run_jump(self, target):
+        self.pc = target
+
+    # load literals into registers
+    def run_literal_int(self, value, target):
+        self.M[self.fp + target] = value
+
+    run_literal_float = run_literal_int
+    run_literal_char = run_literal_int
+
+    # Load/stores
+    def run_load_int(self, varname, target):
+        if varname >= 0:
+            self.M[self.fp + target] = self.M[self.fp + varname]
+        else:
+            self.M[self.fp + target] = self.M[~varname]
+
+    run_load_float = run_load_int
+    run_load_char = run_load_int
+    run_load_bool = run_load_int
+
+    def run_load_int_(self, varname, target, _dim, _ref):
+        if _ref == 0:
+            self._load_multiple_values(_dim, varname, target)
+        elif _dim == 1 and _ref == 1:
+            self.M[self.fp + target] = self.M[self._get_value(varname)]
+
+    run_load_float_ = run_load_int_
+    run_load_char_ = run_load_int_
+
+    def run_param_int(self, source):
+        self.params.append(self.fp + source)
+
+    run_param_float = run_param_int
+    run_param_char = run_param_int
+
+    # the slot of the target is already in the frame
+    def run_read_int(self, source):
+        self._store_value(source, self._read_int())
+
+    def run_read_float(self, source):
+        self._store_value(source, self._read_float())
+
+    def run_read_char(self, source):
+        self._store_value(source, self._read_char())
+
+    def run_return_int(self, target):
+        self._pop(self.fp + target)
+
+    run_return_float = run_return_int
+    run_return_char = run_return_int
+
+    def run_return_void(self):
+        self._pop(None)
+
+    def run_store_int(self, source, target):
+        self._store_value(target, self._get_value(source))
+
+    run_store_float = run_store_int
+    run_store_char = run_store_int
+    run_store_bool = run_store_int
+
+    #
+    # perform binary, relational & cast operations
+    #
+    def run_add_int(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] + self.M[_fp + right]
+
+    def run_sub_int(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] - self.M[_fp + right]
+
+    def run_mul_int(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] * self.M[_fp + right]
+
+    def run_mod_int(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] % self.M[_fp + right]
+
+    def run_div_int(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] // self.M[_fp + right]
+
+    def run_div_float(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] / self.M[_fp + right]
+
+    # Floating point ops (same as int)
+    run_add_float = run_add_int
+    run_sub_float = run_sub_int
+    run_mul_float = run_mul_int
+
+    # Integer comparisons
+    def run_lt_int(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] < self.M[_fp + right]
+
+    def run_le_int(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] <= self.M[_fp + right]
+
+    def run_gt_int(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] > self.M[_fp + right]
+
+    def run_ge_int(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] >= self.M[_fp + right]
+
+    def run_eq_int(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] == self.M[_fp + right]
+
+    def run_ne_int(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] != self.M[_fp + right]
+
+    # Float comparisons
+    run_lt_float = run_lt_int
+    run_le_float = run_le_int
+    run_gt_float = run_gt_int
+    run_ge_float = run_ge_int
+    run_eq_float = run_eq_int
+    run_ne_float = run_ne_int
+
+    # String comparisons
+    run_lt_char = run_lt_int
+    run_le_char = run_le_int
+    run_gt_char = run_gt_int
+    run_ge_char = run_ge_int
+    run_eq_char = run_eq_int
+    run_ne_char = run_ne_int
+
+    # Bool comparisons
+    run_eq_bool = run_eq_int
+    run_ne_bool = run_ne_int
+
+    def run_and_bool(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] and self.M[_fp + right]
+
+    def run_or_bool(self, left, right, target):
+        _fp = self.fp
+        self.M[_fp + target] = self.M[_fp + left] or self.M[_fp + right]
+
+    def run_not_bool(self, source, target):
+        self.M[self.fp + target] = not self._get_value(source)
+
+    def run_sitofp(self, source, target):
+        self.M[self.fp + target] = float(self._get_value(source))
+
+    def run_fptosi(self, source, target):
+        self.M[self.fp + target] = int(self._get_value(source))
@@ -5,10 +5,17 @@
 #                                                #
 # Authors: Luiz Cartolano && Erico Faustino      #
 ##################################################
+import os
+import glob
+import hashlib
+import subprocess
 from ctypes import CFUNCTYPE, c_int
 
+import llvmlite
 from llvmlite import ir, binding
 
+from uc_ssa import to_ssa
+
 bool_type = ir.IntType(1)
 llvm_false = ir.Constant(bool_type, False)
 llvm_true = ir.Constant(bool_type, True)
@@ -29,6 +36,14 @@ llvm_type_dict = {
     'string': charptr_ty,
 }
 
+# the instructions without side effects, the
+# prints are delayed (and merged) across them
+pure_opcodes = {'literal', 'load', 'elem', 'get', 'alloc', 'param', 'print', 'phi', 'add', 'sub',
+                'mul', 'and', 'or', 'ge', 'le', 'gt', 'lt', 'eq', 'ne', 'sitofp', 'fptosi'}
+
+# directory of the objects cached by the JIT, inside the package
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__ucjit__')
+
 
 def extract_operation(inst):
     """
@@ -74,12 +89,20 @@ def extract_operation(inst):
 
 class LLVMBuilder:
 
-    def __init__(self, module):
+    def __init__(self, module, strings=None):
         self.builder = None
         self.functions = None
         self.location = {}
         self.module = module
         self.params = []
+        # pool of the format strings of the module,
+        # shared by the builders of its functions
+        self.strings = strings if strings is not None else {}
+        # (text, format, value) of the prints not built yet
+        self.pending_prints = []
+        # (phi, args) of the phis, their incoming values
+        # are added after all the blocks are built
+        self.phis = []
 
     def get_location(self, target):
         """
@@ -120,6 +143,10 @@ class LLVMBuilder:
             self.functions = self.module.get_global(func_name[1:])
         else:
             uc_type = operand.split('_')[1]
+            # a void main returns 0 to the C runtime, which
+            # uses its return as the status of the executable
+            if func_name == '@main' and uc_type == 'void':
+                uc_type = 'int'
             args_types = [llvm_type_dict[arg] for arg in [item[0] for item in func_args]]
             func_type = ir.FunctionType(llvm_type_dict[uc_type], args_types)
             self.functions = ir.Function(self.module, func_type, name=func_name[1:])
@@ -127,6 +154,33 @@ class LLVMBuilder:
         for arg_id, arg_target in enumerate([item[1] for item in func_args]):
             self.location[arg_target] = self.functions.args[arg_id]
 
+    def string_constant(self, text):
+        """
+            The method that returns a pointer to a constant string,
+            the strings are pooled so each one is a single global
+
+            ...
+
+            Parameters
+            ----------
+                text :
+                    The string.
+
+        """
+        if text not in self.strings:
+            byte_array = bytearray((text + "\00").encode('utf-8'))
+            len_byte_array = len(byte_array)
+            fmt_bytes = ir.Constant(ir.ArrayType(char_type, len_byte_array), byte_array)
+
+            data = ir.GlobalVariable(self.module, fmt_bytes.type, name=self.module.get_unique_name('.fmt'))
+            data.linkage = 'internal'
+            data.global_constant = True
+            data.unnamed_addr = True
+            data.initializer = fmt_bytes
+            self.strings[text] = data
+
+        return self.builder.bitcast(self.strings[text], charptr_ty)
+
     def cio(self, func_name, string_format, *target):
         """
             The method cio
@@ -143,21 +197,39 @@ class LLVMBuilder:
                     The instruction type.
 
         """
-        byte_array = bytearray((string_format + "\00").encode('ascii'))
-        len_byte_array = len(byte_array)
-        fmt_bytes = ir.Constant(ir.ArrayType(char_type, len_byte_array), byte_array)
+        fn = self.builder.module.get_global(func_name)
+        ptr_fmt = self.string_constant(string_format)
+        return self.builder.call(fn, [ptr_fmt] + list(target))
 
-        mod = self.builder.module
+    def flush_prints(self):
+        """
+            The method that builds the prints pending, merged in a
+            single call: putchar for a char, puts for a text that
+            ends with a new line and printf for the others
 
-        data = ir.GlobalVariable(mod, fmt_bytes.type, name=mod.get_unique_name('.fmt'))
-        data.linkage = 'internal'
-        data.global_constant = True
-        data.initializer = fmt_bytes
-        global_fmt = data
+            ...
 
-        fn = self.builder.module.get_global(func_name)
-        ptr_fmt = self.builder.bitcast(global_fmt, charptr_ty)
-        return self.builder.call(fn, [ptr_fmt] + list(target))
+            Parameters
+            ----------
+                None
+
+        """
+        if not self.pending_prints:
+            return
+
+        text = ''.join(piece for piece, _, _ in self.pending_prints)
+        string_format = ''.join(piece.replace('%', '%%') + fmt for piece, fmt, _ in self.pending_prints)
+        values = [value for _, _, value in self.pending_prints if value is not None]
+        self.pending_prints = []
+
+        if not values and len(text) == 1 and ord(text) < 128:
+            self.builder.call(self.module.get_global('putchar'), [ir.Constant(int_type, ord(text))])
+        elif not values and text.endswith('\n'):
+            self.builder.call(self.module.get_global('puts'), [self.string_constant(text[:-1])])
+        elif string_format == '%c':
+            self.builder.call(self.module.get_global('putchar'), [self.builder.zext(values[0], int_type)])
+        else:
+            self.cio('printf', string_format, *values)
 
     def build_alloc(self, uc_type, target, **kwargs):
         """
@@ -283,10 +355,11 @@ class LLVMBuilder:
                     The instruction target.
 
         """
-        if var_type == 'char':
-            literal_val = llvm_type_dict[var_type](ord(constant))
-        else:
-            literal_val = llvm_type_dict[var_type](constant)
+        # the initial 0 of the vars lowered to registers (--llvm-ssa)
+        # is an int for every type, as in the memory of the interpreter
+        if var_type == 'char' and isinstance(constant, str):
+            constant = ord(constant)
+        literal_val = llvm_type_dict[var_type](constant)
         literal_location = self.get_location(target)
         if literal_location:
             self.builder.store(literal_val, literal_location)
@@ -331,9 +404,56 @@ class LLVMBuilder:
         """
         self.params.append(self.get_location(param_source))
 
+    def build_phi(self, uc_type, args, target):
+        """
+            The method that builds a phi, with no incoming values yet
+
+            ...
+
+            Parameters
+            ----------
+                uc_type :
+                    The phi type.
+                args :
+                    The (value, predecessor label) pairs.
+                target :
+                    The instruction target.
+
+        """
+        target_location = self.builder.phi(llvm_type_dict[uc_type])
+        self.phis.append((target_location, args))
+
+        self.location[target] = target_location
+
+    def link_phis(self):
+        """
+            The method that adds the incoming values of the phis,
+            once for each edge of the predecessor to the block
+
+            ...
+
+            Parameters
+            ----------
+                None
+
+        """
+        for phi, args in self.phis:
+            for value, pred_label in args:
+                pred_block = self.location[pred_label]
+                if value is None:
+                    # the var isn't defined on this edge
+                    value_location = ir.Constant(phi.type, 0)
+                else:
+                    value_location = self.get_location(value)
+                for operand in pred_block.terminator.operands:
+                    if operand is phi.parent:
+                        phi.add_incoming(value_location, pred_block)
+
     def build_print(self, val_type, target):
         """
-            The method that builds a print
+            The method that builds a print, it's delayed until
+            an instruction with side effects, so the consecutive
+            prints are merged
 
             ...
 
@@ -347,16 +467,25 @@ class LLVMBuilder:
         """
         if target:
             value_to_print = self.get_location(target)
-            if val_type == 'int':
-                self.cio('printf', '%d', value_to_print)
+            if val_type == 'string' and isinstance(value_to_print, ir.GlobalVariable) \
+                    and value_to_print.global_constant:
+                # the constant strings are part of the format
+                text = bytes(value_to_print.initializer.constant).decode('utf-8').rstrip('\00')
+                self.pending_prints.append((text, '', None))
+            elif val_type == 'string' and isinstance(value_to_print, ir.Constant) \
+                    and value_to_print.type == char_type:
+                # a string of one char is a char literal
+                self.pending_prints.append((chr(value_to_print.constant), '', None))
+            elif val_type == 'int':
+                self.pending_prints.append(('', '%d', value_to_print))
             elif val_type == 'float':
-                self.cio('printf', '%f', value_to_print)
+                self.pending_prints.append(('', '%f', value_to_print))
             elif val_type == 'char':
-                self.cio('printf', '%c', value_to_print)
+                self.pending_prints.append(('', '%c', value_to_print))
             elif val_type == 'string':
-                self.cio('printf', '%s', value_to_print)
+                self.pending_prints.append(('', '%s', value_to_print))
         else:
-            self.cio('printf', '\n')
+            self.pending_prints.append(('\n', '', None))
 
     def build_read(self, var_type, target):
         """
@@ -372,13 +501,19 @@ class LLVMBuilder:
                     The instruction target.
 
         """
-        read_target = self.get_location(target)
+        # scanf reads to a var of the entry (an alloca in a
+        # loop grows the stack), the register is a load of it
+        block = self.builder.block
+        self.builder.position_at_start(self.functions.entry_basic_block)
+        read_target = self.builder.alloca(llvm_type_dict[var_type])
+        self.builder.position_at_end(block)
         if var_type == 'int':
             self.cio('scanf', '%d', read_target)
         elif var_type == 'float':
             self.cio('scanf', '%lf', read_target)
         elif var_type == 'char':
             self.cio('scanf', '%c', read_target)
+        self.location[target] = self.builder.load(read_target)
 
     def build_store(self, uc_type, source, target, **kwargs):
         """
@@ -832,6 +967,8 @@ class LLVMBuilder:
         """
         if target:
             self.builder.ret(self.get_location(target))
+        elif self.functions.name == 'main':
+            self.builder.ret(ir.Constant(int_type, 0))
         else:
             self.builder.ret_void()
 
@@ -890,6 +1027,9 @@ class LLVMBuilder:
 
         args = inst[1:] if len(inst) > 1 else (None,)
 
+        if opcode not in pure_opcodes:
+            self.flush_prints()
+
         getattr(self, f"build_{opcode}")(uc_type, *inst[1:], **modifier)
 
     def create_blocks(self, func_blocks_dict):
@@ -935,20 +1075,29 @@ class LLVMBuilder:
                 for inst in block.instructions[1:]:
                     self.build(inst)
 
+        self.link_phis()
+
 
 class LLVMCodeGenerator:
-    def __init__(self, control_blocks, opt):
-        # get dict with IR functions and blocks
-        if opt:
+    def __init__(self, control_blocks, opt, opt_level=0, ssa=False):
+        # get dict with IR functions and blocks, without
+        # blocks only the cached objects are executed
+        if control_blocks is None:
+            self.functions = {}
+        elif opt:
             self.functions = control_blocks.functions
         else:
             self.functions = control_blocks.non_opt_blocks
         # get IR globals
-        self.global_codes = control_blocks.globals
-        # import binding from llvmlite
-        # and initialize it
+        self.global_codes = control_blocks.globals if control_blocks is not None else []
+        # lower the scalar vars to SSA registers
+        # (and phis) instead of allocas
+        self.control_blocks = control_blocks
+        self.ssa = ssa
+        # import binding from llvmlite and initialize
+        # the native target (the core of LLVM is
+        # initialized by llvmlite itself)
         self.binding = binding
-        self.binding.initialize()
         self.binding.initialize_native_target()
         self.binding.initialize_native_asmprinter()
 
@@ -956,13 +1105,44 @@ class LLVMCodeGenerator:
         self.module = ir.Module(name=__file__)
         self.module.triple = self.binding.get_default_triple()
 
-        # create an execution engine
+        # create a target machine for the host cpu
+        # and an execution engine that uses it
+        self.opt_level = opt_level
+        self.target_machine = self.__create_target_machine()
         self.engine = self.__create_execution_engine()
 
+        # pool of the format strings
+        self.strings = {}
+
         # declare printf / scanf functions
         self.__declare_printf_function()
         self.__declare_scanf_function()
 
+    def __create_target_machine(self, reloc='default', codemodel='jitdefault'):
+        """
+            The method that creates the target machine, tuned
+            for the cpu (and its features) of the host
+
+            ...
+
+            Parameters
+            ----------
+                reloc :
+                    The relocation model, 'pic' for the objects
+                    linked by the system cc.
+                codemodel :
+                    The code model.
+
+        """
+        target = self.binding.Target.from_default_triple()
+        target_machine = target.create_target_machine(cpu=self.binding.get_host_cpu_name(),
+                                                      features=self.binding.get_host_cpu_features().flatten(),
+                                                      opt=self.opt_level,
+                                                      reloc=reloc,
+                                                      codemodel=codemodel)
+
+        return target_machine
+
     def __create_execution_engine(self):
         """
             The method that creates the execution engine
@@ -974,10 +1154,8 @@ class LLVMCodeGenerator:
                 None
 
         """
-        target = self.binding.Target.from_default_triple()
-        target_machine = target.create_target_machine()
         backing_mod = binding.parse_assembly("")
-        engine = binding.create_mcjit_compiler(backing_mod, target_machine)
+        engine = binding.create_mcjit_compiler(backing_mod, self.target_machine)
 
         return engine
 
@@ -996,6 +1174,12 @@ class LLVMCodeGenerator:
         printf = ir.Function(self.module, printf_ty, name="printf")
         self.printf = printf
 
+        # the prints without values are specialised
+        puts_ty = ir.FunctionType(int_type, [charptr_ty])
+        self.puts = ir.Function(self.module, puts_ty, name="puts")
+        putchar_ty = ir.FunctionType(int_type, [int_type])
+        self.putchar = ir.Function(self.module, putchar_ty, name="putchar")
+
     def __declare_scanf_function(self):
         """
             The method that declares the scanf functions
@@ -1011,9 +1195,9 @@ class LLVMCodeGenerator:
         scanf = ir.Function(self.module, scanf_ty, name="scanf")
         self.scanf = scanf
 
-    def __compile_ir(self):
+    def __parse_ir(self):
         """
-            The method that compiles the IR
+            The method that parses and verifies the IR
 
             ...
 
@@ -1025,13 +1209,73 @@ class LLVMCodeGenerator:
         llvm_ir = str(self.module)
         mod = self.binding.parse_assembly(llvm_ir)
         mod.verify()
+        # the passes need the data layout of the target
+        mod.data_layout = str(self.target_machine.target_data)
+
+        return mod
+
+    def __optimize_ir(self, mod, opt):
+        """
+            The method that runs the optimization passes on the
+            module: the default pipeline of the opt level (mem2reg,
+            GVN, LICM, loop unroll, vectorize, ...) and then the
+            passes chosen by -p
+
+            ...
+
+            Parameters
+            ----------
+                mod :
+                    The parsed module.
+                opt :
+                    The passes chosen by -p (ctm, dce, cfg or all).
 
+        """
+        pto = self.binding.create_pipeline_tuning_options(speed_level=self.opt_level)
+        # like clang, loops are unrolled and vectorized from -O2
+        pto.loop_unrolling = self.opt_level >= 2
+        pto.loop_interleaving = self.opt_level >= 2
+        pto.loop_vectorization = self.opt_level >= 2
+        pto.slp_vectorization = self.opt_level >= 2
+        pb = self.binding.create_pass_builder(self.target_machine, pto)
+
+        if self.opt_level > 0:
+            pm = pb.getModulePassManager()
+            pm.run(mod, pb)
+
+        if opt:
+            pm = self.binding.create_new_module_pass_manager()
+            if opt == 'ctm' or opt == 'all':
+                # Sparse conditional constant propagation and merging
+                pm.add_sccp_pass()
+                # Merges duplicate global constants together
+                pm.add_constant_merge_pass()
+                # Combine inst to form fewer, simple inst
+                # This pass also does algebraic simplification
+                pm.add_instruction_combine_pass()
+            if opt == 'dce' or opt == 'all':
+                pm.add_dead_code_elimination_pass()
+            if opt == 'cfg' or opt == 'all':
+                # Performs dead code elimination and basic block merging
+                pm.add_simplify_cfg_pass()
+            pm.run(mod, pb)
+
+    def __compile_ir(self, mod):
+        """
+            The method that compiles the IR
+
+            ...
+
+            Parameters
+            ----------
+                mod :
+                    The parsed (and optimized) module.
+
+        """
         self.engine.add_module(mod)
         self.engine.finalize_object()
         self.engine.run_static_constructors()
 
-        return mod
-
     def save_ir(self, output_file):
         """
             The method that saves the IR on an output file
@@ -1050,45 +1294,32 @@ class LLVMCodeGenerator:
             for key, value in self.module.globals.items():
                 print(key, value)
 
-    def execute_ir(self, opt, opt_file):
+    def __load_object(self, object_code):
         """
-            The method that executes the IR
+            The method that loads a compiled object in the engine
 
             ...
 
             Parameters
             ----------
-                None
-                :param opt_file: arg q o marzio tirou do cu dele
-                :param opt: arg q o marzio tirou do cu dele
+                object_code :
+                    The bytes of the object.
 
         """
-        mod = self.__compile_ir()
+        self.engine.add_object_file(self.binding.ObjectFileRef.from_data(object_code))
+        self.engine.finalize_object()
 
-        if opt:
-            # apply some optimization passes on module
-            pmb = self.binding.create_pass_manager_builder()
-            pm = self.binding.create_module_pass_manager()
+    def __run_main(self):
+        """
+            The method that runs the main function compiled by the engine
 
-            pmb.opt_level = 0
-            if opt == 'ctm' or opt == 'all':
-                # Sparse conditional constant propagation and merging
-                pm.add_sccp_pass()
-                # Merges duplicate global constants together
-                pm.add_constant_merge_pass()
-                # Combine inst to form fewer, simple inst
-                # This pass also does algebraic simplification
-                pm.add_instruction_combining_pass()
-            if opt == 'dce' or opt == 'all':
-                pm.add_dead_code_elimination_pass()
-            if opt == 'cfg' or opt == 'all':
-                # Performs dead code elimination and basic block merging
-                pm.add_cfg_simplification_pass()
+            ...
 
-            pmb.populate(pm)
-            pm.run(mod)
-            opt_file.write(str(mod))
+            Parameters
+            ----------
+                None
 
+        """
         # Obtain a pointer to the compiled 'main' - it's the address of its JITed code in memory.
         main_ptr = self.engine.get_function_address('main')
         # To convert an address to an actual callable thing we have to use
@@ -1097,6 +1328,111 @@ class LLVMCodeGenerator:
         # Now 'main_function' is an actual callable we can invoke
         res = main_function()
 
+    def execute_ir(self, opt, opt_file, cache=None, cache_key=None):
+        """
+            The method that executes the IR, it's optimized
+            before the JIT compiles it
+
+            ...
+
+            Parameters
+            ----------
+                opt :
+                    The passes chosen by -p (ctm, dce, cfg or all).
+                opt_file :
+                    The output file of the optimized IR, or None.
+                cache :
+                    The JITCache that saves the compiled object, or None.
+                cache_key :
+                    The signature of the program in the cache.
+
+        """
+        mod = self.__parse_ir()
+
+        if opt or self.opt_level > 0:
+            self.__optimize_ir(mod, opt)
+            if opt_file is not None:
+                opt_file.write(str(mod))
+
+        if cache is None:
+            self.__compile_ir(mod)
+        else:
+            # the object is saved and loaded like the ones found in the cache
+            object_code = self.target_machine.emit_object(mod)
+            cache.save(cache_key, object_code)
+            self.__load_object(object_code)
+
+        self.__run_main()
+
+    def execute_object(self, object_code):
+        """
+            The method that executes an object compiled before
+            (found in the cache), without building the IR
+
+            ...
+
+            Parameters
+            ----------
+                object_code :
+                    The bytes of the object.
+
+        """
+        self.__load_object(object_code)
+        self.__run_main()
+
+    def emit_object(self, opt, opt_file, object_filename):
+        """
+            The method that compiles ahead of time the IR, it's
+            optimized and then saved as a native object file
+
+            ...
+
+            Parameters
+            ----------
+                opt :
+                    The passes chosen by -p (ctm, dce, cfg or all).
+                opt_file :
+                    The output file of the optimized IR, or None.
+                object_filename :
+                    The name of the object file.
+
+        """
+        mod = self.__parse_ir()
+
+        if opt or self.opt_level > 0:
+            self.__optimize_ir(mod, opt)
+            if opt_file is not None:
+                opt_file.write(str(mod))
+
+        # the object is linked in a position
+        # independent executable by the cc
+        target_machine = self.__create_target_machine(reloc='pic', codemodel='default')
+        object_code = target_machine.emit_object(mod)
+        # the object is renamed only when complete, so a failed
+        # compilation never leaves an empty or partial file
+        temp_filename = '%s.%d.tmp' % (object_filename, os.getpid())
+        with open(temp_filename, 'wb') as object_file:
+            object_file.write(object_code)
+        os.replace(temp_filename, object_filename)
+
+    @staticmethod
+    def link_executable(object_filename, executable_filename):
+        """
+            The method that links the object in an executable
+            through the system cc (main and the libc)
+
+            ...
+
+            Parameters
+            ----------
+                object_filename :
+                    The name of the object file.
+                executable_filename :
+                    The name of the executable.
+
+        """
+        subprocess.run(['cc', object_filename, '-o', executable_filename], check=True)
+
     def __generate_global_instructions(self, global_inst):
         """
             The method to generate the global instructions
@@ -1144,8 +1480,9 @@ class LLVMCodeGenerator:
             else:
                 # normal global var like int x = 2
                 ir_global_var = ir.GlobalVariable(self.module, llvm_type, var_name)
-                if var_value:
-                    ir_global_var.initializer = ir.Constant(llvm_type, var_value)
+                # without an initializer (None is zeroinitializer) the
+                # global is an external declaration that cc can't link
+                ir_global_var.initializer = ir.Constant(llvm_type, var_value or None)
 
     def build(self):
         """
@@ -1162,7 +1499,136 @@ class LLVMCodeGenerator:
         self.__generate_global_instructions(self.global_codes)
 
         for func in self.functions:
+            if self.ssa:
+                to_ssa(self.control_blocks, func)
             func_dict = self.functions[func]
-            llvm_block = LLVMBuilder(self.module)
+            llvm_block = LLVMBuilder(self.module, self.strings)
             llvm_block.create_blocks(func_dict)
             llvm_block.build_blocks(func_dict)
+
+
+class JITCache:
+    """
+        An on disk cache of the objects compiled by the JIT, named
+        by a signature of the program and of the compiler.  The least
+        recently used objects are evicted when the cache is bigger
+        than its size limit.
+
+        ...
+
+        Methods
+        -------
+            signature(source, *options)
+                A hash of the uC source, the compiler and the options.
+
+            load(self, key)
+                Returns the object of the key, or None.
+
+            save(self, key, object_code)
+                Saves the object of the key and evicts the old ones.
+    """
+
+    def __init__(self, size_limit, directory=cache_dir):
+        self.size_limit = size_limit
+        self.directory = directory
+
+    @staticmethod
+    def signature(source, *options):
+        """
+            The method that hashes the uC source, the version of the
+            compiler (its modules and llvm), the host cpu and the
+            options that change the compiled code
+
+            ...
+
+            Parameters
+            ----------
+                source :
+                    The uC source code.
+                options :
+                    The options of the compilation (-o, -O, -p, ...).
+
+        """
+        parts = [source, repr(options), llvmlite.__version__, repr(binding.llvm_version_info),
+                 binding.get_host_cpu_name(), binding.get_host_cpu_features().flatten()]
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for module in sorted(glob.glob(os.path.join(package_dir, 'uc*.py'))):
+            with open(module, 'r') as module_file:
+                parts.append(module_file.read())
+        return hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+    def load(self, key):
+        """
+            The method that returns the object of the key, or None
+
+            ...
+
+            Parameters
+            ----------
+                key :
+                    The signature of the program.
+
+        """
+        object_filename = os.path.join(self.directory, key + '.o')
+        try:
+            with open(object_filename, 'rb') as object_file:
+                object_code = object_file.read()
+            # the mtime marks the recently used objects
+            os.utime(object_filename)
+        except OSError:
+            return None
+        return object_code
+
+    def save(self, key, object_code):
+        """
+            The method that saves the object of the key and
+            evicts the least recently used objects
+
+            ...
+
+            Parameters
+            ----------
+                key :
+                    The signature of the program.
+                object_code :
+                    The bytes of the object.
+
+        """
+        object_filename = os.path.join(self.directory, key + '.o')
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # the object is renamed only when complete, so
+            # other compilers never load a partial file
+            temp_filename = '%s.%d.tmp' % (object_filename, os.getpid())
+            with open(temp_filename, 'wb') as object_file:
+                object_file.write(object_code)
+            os.replace(temp_filename, object_filename)
+            self.__evict()
+        except OSError:
+            # the cache is only an optimization
+            pass
+
+    def __evict(self):
+        """
+            The method that removes the least recently used
+            objects while the cache is bigger than its limit
+
+            ...
+
+            Parameters
+            ----------
+                None
+
+        """
+        entries = []
+        for object_filename in glob.glob(os.path.join(self.directory, '*.o')):
+            stat = os.stat(object_filename)
+            entries.append((stat.st_mtime, stat.st_size, object_filename))
+        entries.sort()
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, object_filename in entries:
+            if total_size <= self.size_limit:
+                break
+            os.remove(object_filename)
+            total_size -= size
@@ -7,14 +7,21 @@
 #################################################
 
 
+# import os & hash modules, for the cached tables
+import os
+import pickle
+import hashlib
 # import the AST classes
 import uc_ast
 # import the lexer class
 from uc_lex import UCLexer
 # import the yacc lib
-from ply.yacc import yacc
+import ply
+from ply.yacc import yacc, LRTable, LRParser, VersionError
 # get the list of tokens
 tokens = UCLexer.tokens
+# directory of the cached parse tables, inside the package
+tables_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__uctables__')
 
 
 # define a print function because the lexer receives one as argument
@@ -52,7 +59,7 @@ class UCParser():
                 The parser rules extracted from the BNF language.
     """
 
-    def __init__(self, error_function=print_error):
+    def __init__(self, error_function=print_error, cached_tables=True):
         # get the tokens list
         self.tokens = UCLexer.tokens
         # create lexer object
@@ -60,7 +67,50 @@ class UCParser():
         # build the lexer
         self.lexer.build()
         # build the parser
-        self.parser = yacc(module=self,)
+        if cached_tables:
+            self.parser = self._load_parser()
+        else:
+            self.parser = yacc(module=self,)
+
+
+    def _grammar_signature(self):
+        """
+            A hash of the grammar (tokens, precedence & rules) and of the
+            version of ply, that names the file of the cached tables.
+        """
+        parts = [ply.__version__, ' '.join(self.tokens), repr(self.precedence)]
+        for name in sorted(dir(self)):
+            if name.startswith('p_') and name != 'p_error':
+                parts.append(getattr(self, name).__doc__ or '')
+        return hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+
+    def _load_parser(self):
+        """
+            Builds the parser from the tables cached in tables_dir.  The
+            tables are loaded in optimize mode, without the checks of the
+            grammar and without writing them back.  They are generated
+            (and saved) only when there are no tables for this grammar,
+            and only kept in memory if tables_dir can't be written.
+        """
+        picklefile = os.path.join(tables_dir, 'parsetab-%s.pickle' % self._grammar_signature())
+        try:
+            lr = LRTable()
+            lr.read_pickle(picklefile)
+        except (ImportError, OSError, EOFError, pickle.UnpicklingError, VersionError):
+            # no tables for this grammar yet, or a damaged file
+            try:
+                os.makedirs(tables_dir, exist_ok=True)
+            except OSError:
+                pass
+            if not os.access(tables_dir, os.W_OK):
+                # a read-only install, the tables are only built in memory
+                return yacc(module=self, debug=False, write_tables=False)
+            return yacc(module=self, debug=False, picklefile=picklefile)
+
+        lr.bind_callables({name: getattr(self, name) for name in dir(self)
+                           if name.startswith('p_')})
+        return LRParser(lr, self.p_error)
 
 
     def _token_coord(self, p, token_idx, set_col=False):
@@ -209,6 +259,9 @@ class UCParser():
             :return: an AST for the code
                 
         """
+        # the parser & lexer are reused, so start again from the first line
+        self.lexer.filename = filename
+        self.lexer.reset_lineno()
         return self.parser.parse(
                 input=text,
                 lexer=self.lexer,
@@ -1125,3 +1178,18 @@ class UCParser():
         ('left', 'PLUS', 'MINUS', 'PLUSPLUS', 'MINUSMINUS'),
         ('left', 'TIMES', 'DIVIDE', 'MOD'),
     )
+
+
+# the parser shared by the compiles of a process
+_shared_parser = None
+
+
+def get_parser():
+    """
+        Returns the parser (and its lexer) shared by all compiles,
+        built at the first call.
+    """
+    global _shared_parser
+    if _shared_parser is None:
+        _shared_parser = UCParser()
+    return _shared_parser
@@ -0,0 +1,391 @@
+##################################################
+# uc_pyjit.py                                    #
+#                                                #
+# Execution engine that compiles the basic       #
+# blocks of the uCIR to Python functions.        #
+#                                                #
+# Authors: Luiz Cartolano && Erico Faustino      #
+##################################################
+import sys
+
+from uc_interpreter import Interpreter, MemoryOverflow
+
+
+class PyJIT(Interpreter):
+    """
+        Engine that runs the uCIR by compiling it to Python.
+
+        Each function of the ControlBlocks is translated to the source
+        of a Python function.  Its temporaries and scalar locals become
+        Python variables and its basic blocks become the branches of a
+        dispatch on the block index, inside a loop, so a jump is just
+        an assignment to the block index:
+
+            def uc_main():
+                ...
+                _b = 0
+                while True:
+                    if _b < 1:
+                        v1 = 0
+                        ...
+                        _b = 2 if v5 else 1
+                        continue
+                    else:
+                        ...
+
+        The source is built with compile()/exec() once, so each block
+        runs as a single bytecode sequence instead of one handler call
+        per instruction.  The arrays, the vars whose address is taken
+        and the globals stay in the memory of the Interpreter, with
+        the same layout, and the print/read instructions use its I/O
+        methods, so the output is the same of the Interpreter.
+    """
+
+    # Python operators of the binary instructions
+    binary_ops = {
+        'add': '+', 'sub': '-', 'mul': '*', 'mod': '%',
+        'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>=', 'eq': '==', 'ne': '!=',
+        'and': 'and', 'or': 'or',
+    }
+
+    # max depth of the uC calls, they are Python calls
+    max_depth = 1 << 16
+
+    def __init__(self, *args, **kwargs):
+        super(PyJIT, self).__init__(*args, **kwargs)
+        self.source = None      # The generated Python source
+        self.pyfuncs = {}       # The compiled Python function of each uC function
+
+        # per function state, used while generating its source
+        self.names = {}         # Python variable of each name
+        self.slots = {}         # Frame slot of each name stored in memory
+        self.block_index = {}   # Index of each block label
+        self.frame_size = 0
+
+    def __memory_names(self, func_blocks):
+        """
+            Find the names that must be stored in memory: the
+            arrays and the vars whose address is taken.
+
+            :param func_blocks: dict
+            :return: dict
+        """
+        sizes = {}
+        for block in func_blocks.values():
+            for inst in block.instructions:
+                if len(inst) == 1:
+                    continue
+                opcode, modifier = self._extract_operation(inst[0])
+                op = opcode.split('_')[0]
+                _dim, _ref = self._extract_modifier(modifier)
+                if op in ('elem', 'get'):
+                    sizes.setdefault(inst[1], 1)
+                elif modifier and _ref == 0 and op in ('alloc', 'load', 'store'):
+                    for name in inst[1:]:
+                        sizes.setdefault(name, 1)
+                    if op != 'store':
+                        sizes[inst[-1]] = max(sizes[inst[-1]], _dim)
+        return {name: size for name, size in sizes.items() if name.startswith('%')}
+
+    def __layout(self, func_blocks):
+        """
+            Map the names of a function to Python variables or to
+            frame slots, and its blocks to their indexes.
+
+            :param func_blocks: dict
+            :return: None
+        """
+        self.names = {}
+        self.slots = {}
+        self.frame_size = 0
+        self.block_index = {label: idx for idx, label in enumerate(func_blocks)}
+
+        for name, size in self.__memory_names(func_blocks).items():
+            self.slots[name] = self.frame_size
+            self.frame_size += size
+
+        for block in func_blocks.values():
+            for inst in block.instructions:
+                if inst[0].startswith('define'):
+                    names = [arg[1] for arg in inst[2]]
+                elif inst[0].startswith('literal'):
+                    names = inst[2:]
+                elif inst[0] in ('jump', 'cbranch'):
+                    names = inst[1:2] if inst[0] == 'cbranch' else []
+                else:
+                    names = inst[1:]
+                for name in names:
+                    if isinstance(name, str) and name.startswith('%') and \
+                            name not in self.slots and name not in self.names:
+                        self.names[name] = f"v{len(self.names)}"
+
+    def __address(self, name):
+        """
+            Python expression of the address of a name.
+
+            :param name: str
+            :return: str
+        """
+        if name.startswith('@'):
+            return str(self.globals[name])
+        return f"_fp + {self.slots[name]}"
+
+    def __value(self, name):
+        """
+            Python expression of the value of a name or constant.
+
+            :param name: str
+            :return: str
+        """
+        if not isinstance(name, str):
+            return repr(name)
+        elif name in self.names:
+            return self.names[name]
+        return f"M[{self.__address(name)}]"
+
+    def __assign(self, name, expr):
+        """
+            Python statement that assigns expr to a name.
+
+            :param name: str
+            :param expr: str
+            :return: str
+        """
+        if name in self.names:
+            return f"{self.names[name]} = {expr}"
+        return f"M[{self.__address(name)}] = {expr}"
+
+    def __return(self, expr):
+        """
+            Python statements to return from the function.
+
+            :param expr: str
+            :return: list
+        """
+        code = []
+        if self.frame_size:
+            code.append("vm.offset = _fp")
+        code.append(f"return {expr}")
+        return code
+
+    def __translate(self, inst, params):
+        """
+            Translate an instruction to Python statements.
+
+            :param inst: tuple
+            :param params: list
+            :return: list
+        """
+        opcode, modifier = self._extract_operation(inst[0])
+        op = opcode.split('_')[0]
+        _dim, _ref = self._extract_modifier(modifier)
+        args = inst[1:]
+
+        if op == 'alloc':
+            if modifier and _ref == 0:
+                return [f"M[{self.__address(args[0])}:{self.__address(args[0])} + {_dim}] = {_dim} * [0]"]
+            return [self.__assign(args[0], "0")]
+        elif op == 'literal':
+            return [self.__assign(args[1], repr(args[0]))]
+        elif op in ('load', 'store') and modifier and _ref == 0:
+            source, target = args
+            return [f"vm._copy({_dim}, {self.__address(target)}, {self.__address(source)}, "
+                    f"{source.startswith('@')})"]
+        elif op == 'load' and _ref:
+            return [self.__assign(args[1], f"M[{self.__value(args[0])}]")]
+        elif op == 'store' and _ref:
+            return [f"M[{self.__value(args[1])}] = {self.__value(args[0])}"]
+        elif op in ('load', 'store'):
+            return [self.__assign(args[1], self.__value(args[0]))]
+        elif op == 'elem':
+            return [self.__assign(args[2], f"{self.__address(args[0])} + {self.__value(args[1])}")]
+        elif op == 'get':
+            return [self.__assign(args[1], self.__address(args[0]))]
+        elif op == 'div':
+            div = '//' if opcode == 'div_int' else '/'
+            return [self.__assign(args[2], f"{self.__value(args[0])} {div} {self.__value(args[1])}")]
+        elif op in self.binary_ops:
+            return [self.__assign(args[2], f"{self.__value(args[0])} {self.binary_ops[op]} "
+                                           f"{self.__value(args[1])}")]
+        elif op == 'not':
+            return [self.__assign(args[1], f"not {self.__value(args[0])}")]
+        elif op == 'sitofp':
+            return [self.__assign(args[1], f"float({self.__value(args[0])})")]
+        elif op == 'fptosi':
+            return [self.__assign(args[1], f"int({self.__value(args[0])})")]
+        elif opcode == 'print_void':
+            return ["vm._print_void()"]
+        elif opcode == 'print_string':
+            return [f"vm._print_string({self.__value(args[0])})"]
+        elif op == 'print':
+            return [f"vm._print({self.__value(args[0])})"]
+        elif op == 'read':
+            value = f"vm._read_{opcode.split('_')[1]}()"
+            if _ref:
+                return [f"M[{self.__value(args[0])}] = {value}"]
+            return [self.__assign(args[0], value)]
+        elif op == 'param':
+            params.append(self.__value(args[0]))
+            return []
+        elif op == 'call':
+            source, target = args
+            call_args = ", ".join(params)
+            params.clear()
+            if source[1:] in self.blocks_control.functions:
+                return [self.__assign(target, f"uc_{source[1:]}({call_args})")]
+            return [self.__assign(target, f"vm._call_pointer({self.__value(source)}, [{call_args}])")]
+        elif op == 'return':
+            if opcode == 'return_void':
+                return self.__return("None")
+            return self.__return(self.__value(args[0]))
+        elif op == 'jump':
+            return [f"_b = {self.block_index[args[0]]}", "continue"]
+        elif op == 'cbranch':
+            return [f"_b = {self.block_index[args[1]]} if {self.__value(args[0])} "
+                    f"else {self.block_index[args[2]]}", "continue"]
+        return [f"vm._run_missing({opcode!r})"]
+
+    def __translate_block(self, block, block_pos, last_pos):
+        """
+            Translate a basic block to Python statements.  The code
+            after the first jump/return is never executed, and a block
+            without them falls through to the next one.
+
+            :param block: uc_block.Block
+            :param block_pos: int
+            :param last_pos: int
+            :return: list
+        """
+        code = []
+        params = []
+        for inst in block.instructions:
+            if len(inst) == 1 and inst[0] != 'return_void':
+                continue
+            if inst[0].startswith('define'):
+                continue
+            code += self.__translate(inst, params)
+            if code and code[-1] == "continue" or inst[0].startswith('return'):
+                return code
+        if block_pos < last_pos:
+            return code + [f"_b = {block_pos + 1}", "continue"]
+        return code + self.__return("None")
+
+    def __dispatch(self, blocks, low, high, indent):
+        """
+            Python source of a balanced if/else tree that selects
+            the block _b among blocks[low:high].
+
+            :param blocks: list
+            :param low: int
+            :param high: int
+            :param indent: str
+            :return: list
+        """
+        if high - low == 1:
+            return [indent + line for line in blocks[low]]
+        middle = (low + high) // 2
+        return [indent + f"if _b < {middle}:"] + \
+            self.__dispatch(blocks, low, middle, indent + "    ") + \
+            [indent + "else:"] + \
+            self.__dispatch(blocks, middle, high, indent + "    ")
+
+    def __translate_function(self, func_name, func_blocks):
+        """
+            Generate the source of the Python function of a uC function.
+
+            :param func_name: str
+            :param func_blocks: dict
+            :return: list
+        """
+        self.__layout(func_blocks)
+        define = func_blocks['%entry'].instructions[1]
+        args = [f"p{idx}" for idx in range(len(define[2]))]
+
+        code = [f"def uc_{func_name}({', '.join(args)}):"]
+        if self.frame_size:
+            code.append("    _fp = vm.offset")
+            code.append(f"    vm.offset = _fp + {self.frame_size}")
+            code.append("    M.reserve(vm.offset)")
+        for var in self.names.values():
+            code.append(f"    {var} = None")
+        for arg, (_, name) in zip(args, define[2]):
+            code.append(f"    {self.__assign(name, arg)}")
+
+        blocks = list(func_blocks.values())
+        bodies = [self.__translate_block(block, pos, len(blocks) - 1)
+                  for pos, block in enumerate(blocks)]
+        code.append("    _b = 0")
+        code.append("    while True:")
+        code += self.__dispatch(bodies, 0, len(bodies), "        ")
+        return code
+
+    def _copy(self, dim, left, right, global_source):
+        # same as Interpreter._store_multiple_values, with addresses
+        if global_source and isinstance(self.M[right], str):
+            self.M[left:left + dim] = list(self.M[right])
+        else:
+            self.M[left:left + dim] = self.M[right:right + dim]
+
+    def _call_pointer(self, source, args):
+        # the value of a function pointer is the name of the function
+        return self.pyfuncs[source](*args)
+
+    def compile(self, blocks_control):
+        """
+            Generate and compile the Python source of all functions.
+
+            :param blocks_control: uc_blocks_control.ControlBlocks
+            :return: None
+        """
+        self.blocks_control = blocks_control
+        self.offset = 0
+        for inst in blocks_control.globals:
+            opcode, modifier = self._extract_operation(inst[0])
+            self._alloc_global(inst, opcode, modifier)
+        # the functions are values too (of the function
+        # pointers), a cell with the name of the function
+        for func_name in blocks_control.functions:
+            self.globals['@' + func_name] = self.offset
+            self.M.reserve(self.offset + 1)
+            self.M[self.offset] = func_name
+            self.offset += 1
+
+        code = []
+        for func_name, func_blocks in blocks_control.functions.items():
+            if func_blocks:
+                code += self.__translate_function(func_name, func_blocks) + [""]
+        self.source = "\n".join(code)
+
+        namespace = {'vm': self, 'M': self.M}
+        exec(compile(self.source, "<uc_pyjit>", "exec"), namespace)
+        self.pyfuncs = {name[3:]: func for name, func in namespace.items()
+                        if name.startswith('uc_')}
+
+    def run(self, blocks_control):
+        """
+            Run the program given by the ControlBlocks, starting
+            from the main function, and return its exit code.
+
+            :param blocks_control: uc_blocks_control.ControlBlocks
+            :return: exit code
+        """
+        self.compile(blocks_control)
+
+        # the uC calls are Python calls, so a deep recursion in
+        # the uC program needs a higher (but bounded) recursion
+        # limit, past it the program overflows like in the other
+        # engines
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, self.max_depth))
+        try:
+            value = self.pyfuncs['main']()
+        except RecursionError:
+            raise MemoryOverflow("Memory overflow: the program needs more than %d nested calls."
+                                 % self.max_depth)
+        finally:
+            sys.setrecursionlimit(limit)
+            self._flush()
+
+        if value is not None:
+            self.exit_code = value
+        return self.exit_code
@@ -0,0 +1,457 @@
+##################################################
+# uc_ssa.py                                      #
+#                                                #
+# Code for the SSA form of the CFG: dominators,  #
+# phi placement, construction & destruction.     #
+#                                                #
+# Authors: Luiz Cartolano && Erico Faustino      #
+##################################################
+import re
+
+
+# instructions that end a block, the
+# ones after them are never executed
+terminators = ('jump', 'cbranch', 'return')
+
+
+def block_code(block):
+    """
+        Positions and instructions of a block that are
+        executed: up to the first jump/cbranch/return.
+
+        :param block: uc_block.Block
+        :return: generator
+    """
+    for inst_pos, inst in enumerate(block.instructions):
+        yield inst_pos, inst
+        if inst[0].split('_')[0] in terminators:
+            return
+
+
+def last_temp(func):
+    """
+        Number of the last temporary (or label, they share
+        the same counter) used by a function.
+
+        :param func: dict
+        :return: int
+    """
+    number = re.compile(r'%(\d+)$')
+    names = list(func)
+    for block in func.values():
+        for inst in block.instructions:
+            for arg in inst[1:]:
+                if isinstance(arg, list):
+                    # args of a define or of a phi
+                    names += [name for pair in arg for name in pair]
+                else:
+                    names.append(arg)
+
+    matches = [number.match(name) for name in names if isinstance(name, str)]
+    return max([int(match.group(1)) for match in matches if match], default=0)
+
+
+def dominators(blocks_control, func_name):
+    """
+        Immediate dominator of each block of a function reached
+        from the entry, following the algorithm of Cooper, Harvey
+        & Kennedy, "A Simple, Fast Dominance Algorithm".  The idom
+        of the entry block is itself.
+
+        :param blocks_control: uc_blocks_control.ControlBlocks
+        :param func_name: str
+        :return: dict
+    """
+    func = blocks_control.functions[func_name]
+    order = blocks_control.reverse_postorder(func_name)
+    rank = {label: pos for pos, label in enumerate(order)}
+
+    def intersect(left, right):
+        # walk up the tree from the deepest
+        # block until both fingers meet
+        while left != right:
+            while rank[left] > rank[right]:
+                left = idom[left]
+            while rank[right] > rank[left]:
+                right = idom[right]
+        return left
+
+    idom = {'%entry': '%entry'}
+    changed = True
+    while changed:
+        changed = False
+        for label in order[1:]:
+            new_idom = None
+            for pred in func[label].predecessors:
+                # only the predecessors already processed
+                if pred.label not in idom or pred.label not in rank:
+                    continue
+                new_idom = pred.label if new_idom is None else intersect(pred.label, new_idom)
+            if idom.get(label) != new_idom:
+                idom[label] = new_idom
+                changed = True
+
+    return idom
+
+
+def dominator_tree(order, idom):
+    """
+        Children of each block on the dominator tree,
+        in the order of the blocks given.
+
+        :param order: list
+        :param idom: dict
+        :return: dict
+    """
+    children = {label: [] for label in order}
+    for label in order:
+        if label != '%entry':
+            children[idom[label]].append(label)
+
+    return children
+
+
+def dominance_frontiers(func, idom):
+    """
+        Dominance frontier of each block reached from the
+        entry, given the immediate dominators.
+
+        :param func: dict
+        :param idom: dict
+        :return: dict
+    """
+    frontiers = {label: set() for label in idom}
+    for label in idom:
+        preds = {pred.label for pred in func[label].predecessors if pred.label in idom}
+        if len(preds) < 2:
+            continue
+        for pred in preds:
+            runner = pred
+            while runner != idom[label]:
+                frontiers[runner].add(label)
+                runner = idom[runner]
+
+    return frontiers
+
+
+class Phi():
+    """
+        A phi of a var at the start of a block: its target takes
+        the value args[label] when the block is entered from the
+        predecessor with that label.
+    """
+    def __init__(self, var, uc_type, target):
+        self.var = var
+        self.type = uc_type
+        self.target = target
+        self.args = {}
+
+
+class SSAForm():
+    """
+        SSA form of a function of the ControlBlocks.
+
+        The temporaries of the uCIR are already assigned only
+        once, so only the scalar local vars (an alloc without
+        dimensions, used only by plain loads and stores, so their
+        address is never taken) are renamed.  A store makes the
+        stored temporary the current value of the var, an alloc
+        defines a new temporary (the initial 0 of the var) and the
+        phis of the var are placed at the iterated dominance
+        frontier of these definitions.  Then each load is mapped to
+        the temporary (or phi) that reaches it.
+
+        The instructions of the blocks are not changed, the SSA
+        form is given by phis, loads and allocs, until rewrite
+        is called, see to_ssa.
+    """
+    def __init__(self, blocks_control, func_name):
+        self.func = blocks_control.functions[func_name]
+        self.order = blocks_control.reverse_postorder(func_name)
+        self.idom = dominators(blocks_control, func_name)
+        self.frontiers = dominance_frontiers(self.func, self.idom)
+
+        self.children = dominator_tree(self.order, self.idom)
+
+        self.variables = {}     # type of each var renamed
+        self.phis = {label: [] for label in self.order}
+        self.loads = {}         # (label, inst_pos) of a load -> name of its value
+        self.allocs = {}        # (label, inst_pos) of an alloc -> temporary it defines
+        self.last_temp = last_temp(self.func)
+
+        self.__find_variables()
+        self.__place_phis()
+        self.__rename()
+
+
+    def new_temp(self):
+        """
+            Create a temporary not used by the function.
+
+            :return: str
+        """
+        self.last_temp += 1
+        return f"%{self.last_temp}"
+
+
+    def __find_variables(self):
+        """
+            Find the vars that can be renamed.
+
+            :return: None
+        """
+        candidates = {}
+        blocked = set()
+        for block in self.func.values():
+            for inst in block.instructions:
+                opcode = inst[0].split('_')
+                plain = len(opcode) == 2
+                for arg_pos, arg in enumerate(inst[1:]):
+                    if isinstance(arg, list):
+                        # args of a define or of a phi
+                        arg = [name for pair in arg for name in pair]
+                    for name in arg if isinstance(arg, list) else [arg]:
+                        if not isinstance(name, str):
+                            continue
+                        if opcode[0] == 'alloc' and plain:
+                            candidates[name] = opcode[1]
+                        elif not (plain and (opcode[0], arg_pos) in (('load', 0), ('store', 1))):
+                            blocked.add(name)
+
+        self.variables = {var: uc_type for var, uc_type in candidates.items() if var not in blocked}
+
+
+    def __live_in(self, def_blocks):
+        """
+            Blocks where each var is live at the start: the ones
+            that load it before any store, and the predecessors
+            of a live block that don't define the var.
+
+            :param def_blocks: dict
+            :return: dict
+        """
+        live_in = {var: set() for var in self.variables}
+        for label in self.order:
+            defined = set()
+            for _, inst in block_code(self.func[label]):
+                op = inst[0].split('_')[0]
+                if op == 'load' and inst[1] in self.variables and inst[1] not in defined:
+                    live_in[inst[1]].add(label)
+                elif op in ('alloc', 'store') and inst[-1] in self.variables:
+                    defined.add(inst[-1])
+
+        for var, labels in live_in.items():
+            worklist = list(labels)
+            while worklist:
+                label = worklist.pop()
+                for pred in self.func[label].predecessors:
+                    if pred.label in self.idom and pred.label not in def_blocks[var] \
+                            and pred.label not in labels:
+                        labels.add(pred.label)
+                        worklist.append(pred.label)
+
+        return live_in
+
+
+    def __place_phis(self):
+        """
+            Place the phis of each var at the iterated dominance
+            frontier of its definitions, only where the var is
+            live (pruned SSA), so there are no dead phis.
+
+            :return: None
+        """
+        def_blocks = {var: set() for var in self.variables}
+        for label in self.order:
+            for _, inst in block_code(self.func[label]):
+                op = inst[0].split('_')[0]
+                if op in ('alloc', 'store') and inst[-1] in self.variables:
+                    def_blocks[inst[-1]].add(label)
+
+        live_in = self.__live_in(def_blocks)
+
+        for var, labels in def_blocks.items():
+            has_phi = set()
+            worklist = list(labels)
+            while worklist:
+                label = worklist.pop()
+                for frontier in self.frontiers[label]:
+                    if frontier not in has_phi and frontier in live_in[var]:
+                        has_phi.add(frontier)
+                        self.phis[frontier].append(Phi(var, self.variables[var], self.new_temp()))
+                        if frontier not in labels:
+                            worklist.append(frontier)
+
+
+    def __rename(self):
+        """
+            Map the loads of the vars to the names of their
+            values and set the arguments of the phis, with a
+            walk on the dominator tree.
+
+            :return: None
+        """
+        # stack of the current value of each var, None
+        # while the var isn't defined
+        current = {var: [None] for var in self.variables}
+
+        # iterative walk, so a deep tree doesn't reach the
+        # recursion limit: a block is visited when pushed and
+        # its definitions are popped after its children
+        stack = [('%entry', None)]
+        while stack:
+            label, defined = stack.pop()
+            if defined is not None:
+                for var in defined:
+                    current[var].pop()
+                continue
+
+            block = self.func[label]
+            defined = []
+            for phi in self.phis[label]:
+                current[phi.var].append(phi.target)
+                defined.append(phi.var)
+
+            for inst_pos, inst in block_code(block):
+                op = inst[0].split('_')[0]
+                if op == 'alloc' and inst[1] in self.variables:
+                    self.allocs[(label, inst_pos)] = self.new_temp()
+                    current[inst[1]].append(self.allocs[(label, inst_pos)])
+                    defined.append(inst[1])
+                elif op == 'store' and inst[2] in self.variables:
+                    current[inst[2]].append(inst[1])
+                    defined.append(inst[2])
+                elif op == 'load' and inst[1] in self.variables:
+                    self.loads[(label, inst_pos)] = current[inst[1]][-1]
+
+            for successor in block.successors:
+                for phi in self.phis.get(successor.label, []):
+                    phi.args[label] = current[phi.var][-1]
+
+            stack.append((label, defined))
+            for child in reversed(self.children[label]):
+                stack.append((child, None))
+
+
+    def rewrite(self):
+        """
+            Rewrite the instructions of the function to the SSA
+            form: the phis become phi instructions at the start of
+            their blocks,
+
+                ('phi_int', [(value, pred_label), ...], target)
+
+            where value is None if the var isn't defined on that
+            edge, the loads and stores of the vars renamed are
+            removed (the uses of a load use the value that reaches
+            it) and their allocs become literals with the initial 0.
+
+            :return: None
+        """
+        # value of the targets of the loads removed, a
+        # value may be the target of another load
+        renamed = {}
+        for (label, inst_pos), value in self.loads.items():
+            if value is not None:
+                renamed[self.func[label].instructions[inst_pos][2]] = value
+
+        def find(name):
+            while name in renamed:
+                name = renamed[name]
+            return name
+
+        for label in self.order:
+            block = self.func[label]
+            instructions = [block.instructions[0]]
+            for phi in self.phis[label]:
+                args = [(find(phi.args[pred.label]) if phi.args.get(pred.label) else None, pred.label)
+                        for pred in block.predecessors if pred.label in self.idom]
+                instructions.append((f"phi_{phi.type}", args, phi.target))
+
+            for inst_pos, inst in block_code(block):
+                opcode = inst[0].split('_')
+                if inst_pos == 0:
+                    continue
+                elif (label, inst_pos) in self.allocs:
+                    inst = (f"literal_{opcode[1]}", 0, self.allocs[(label, inst_pos)])
+                elif (label, inst_pos) in self.loads:
+                    if self.loads[(label, inst_pos)] is not None:
+                        continue
+                    # a load of a var never defined
+                    inst = (f"literal_{opcode[1]}", 0, inst[2])
+                elif opcode[0] == 'store' and inst[2] in self.variables:
+                    continue
+                elif opcode[0] == 'cbranch':
+                    inst = (inst[0], find(inst[1]), inst[2], inst[3])
+                elif opcode[0] not in ('jump', 'define'):
+                    inst = tuple(find(arg) if isinstance(arg, str) else arg for arg in inst)
+                instructions.append(inst)
+            block.instructions = instructions
+
+
+def to_ssa(blocks_control, func_name):
+    """
+        Convert a function of the ControlBlocks to the (pruned)
+        SSA form.  The blocks that can't be reached are removed
+        first, so the phis have an argument for each predecessor.
+
+        :param blocks_control: uc_blocks_control.ControlBlocks
+        :param func_name: str
+        :return: SSAForm
+    """
+    func = blocks_control.functions[func_name]
+    # the dead jumps of the blocks may link blocks never reached
+    blocks_control.relink_blocks(func_name)
+    reached = set(blocks_control.postorder(func_name))
+    for label in [label for label in func if label not in reached]:
+        del func[label]
+    blocks_control.relink_blocks(func_name)
+
+    ssa = SSAForm(blocks_control, func_name)
+    ssa.rewrite()
+    return ssa
+
+
+def from_ssa(blocks_control, func_name):
+    """
+        Lower the phi instructions of a function back to plain
+        uCIR.  Each phi gets a var of its own, that is stored at
+        the end of each predecessor (before its jump/cbranch) and
+        loaded at the start of the block of the phi.  All stores of
+        an edge are done before the loads, so the phis of a block
+        still read their arguments at the same time, and a store
+        made on an edge that doesn't enter the block is just
+        overwritten before the block is entered.
+
+        :param blocks_control: uc_blocks_control.ControlBlocks
+        :param func_name: str
+        :return: None
+    """
+    func = blocks_control.functions[func_name]
+    allocs = []
+    stores = {}
+    for block in func.values():
+        loads = []
+        instructions = []
+        for inst in block.instructions:
+            if not inst[0].startswith('phi'):
+                instructions.append(inst)
+                continue
+            uc_type = inst[0].split('_')[1]
+            var = f"{inst[2]}.phi"
+            allocs.append((f"alloc_{uc_type}", var))
+            loads.append((f"load_{uc_type}", var, inst[2]))
+            for value, pred_label in inst[1]:
+                if value is not None:
+                    stores.setdefault(pred_label, []).append((f"store_{uc_type}", value, var))
+        block.instructions = instructions[:1] + loads + instructions[1:]
+
+    for pred_label, code in stores.items():
+        block = func[pred_label]
+        *_, (last_pos, last) = block_code(block)
+        if last[0].split('_')[0] not in terminators:
+            last_pos += 1
+        block.instructions[last_pos:last_pos] = code
+
+    # the vars are allocated after the define
+    func['%entry'].instructions[2:2] = allocs